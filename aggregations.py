@@ -0,0 +1,129 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+
+def as_datetime(value, end_of_day=False):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.max.time() if end_of_day else datetime.min.time())
+    return value
+
+
+LOG_DEFAULTS = {
+    "api": "unknown_api",
+    "user_id": "unknown_user",
+    "status_code": 200,
+    "country": "Unknown",
+    "api_version": "v1.0",
+    "endpoint": "/default",
+    "latency_ms": 50.0,
+}
+
+
+def log_value(log, field):
+    # Missing and explicit None both fall back to the default, matching $ifNull in the pipelines.
+    value = log.get(field)
+    return LOG_DEFAULTS[field] if value is None else value
+
+
+def build_log_query(start_date=None, end_date=None, field="timestamp"):
+    query = {}
+    if start_date:
+        query[field] = {"$gte": as_datetime(start_date)}
+    if end_date:
+        if field not in query:
+            query[field] = {}
+        query[field]["$lte"] = as_datetime(end_date, end_of_day=True)
+    return query
+
+
+def build_match_stage(start_date=None, end_date=None, api_name=None, field="timestamp"):
+    query = build_log_query(start_date, end_date, field)
+    if api_name:
+        query["api"] = api_name
+    else:
+        query["api"] = {"$nin": [None, "unknown_api"]}
+    return {"$match": query}
+
+
+def run_pipeline(collection, pipeline, columns):
+    rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def api_totals_pipeline(start_date=None, end_date=None):
+    return [
+        build_match_stage(start_date, end_date),
+        {"$group": {
+            "_id": "$api",
+            "Calls": {"$sum": 1},
+            "Latency Sum": {"$sum": {"$ifNull": ["$latency_ms", LOG_DEFAULTS["latency_ms"]]}},
+        }},
+        {"$project": {"_id": 0, "API": "$_id", "Calls": 1, "Latency Sum": 1}},
+        {"$sort": {"Calls": -1}},
+    ]
+
+
+def aggregate_api_totals(collection, start_date=None, end_date=None):
+    return run_pipeline(collection, api_totals_pipeline(start_date, end_date), ["API", "Calls", "Latency Sum"])
+
+
+def daily_usage_pipeline(start_date=None, end_date=None, api_name=None):
+    return [
+        build_match_stage(start_date, end_date, api_name),
+        {"$group": {
+            "_id": {"day": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}}, "api": "$api"},
+            "Count": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "timestamp": "$_id.day", "api": "$_id.api", "Count": 1}},
+        {"$sort": {"timestamp": 1, "api": 1}},
+    ]
+
+
+def aggregate_daily_usage(collection, start_date=None, end_date=None, api_name=None):
+    pipeline = daily_usage_pipeline(start_date, end_date, api_name)
+    df = run_pipeline(collection, pipeline, ["timestamp", "api", "Count"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def endpoint_daily_usage_pipeline(start_date=None, end_date=None, api_name=None):
+    return [
+        build_match_stage(start_date, end_date, api_name),
+        {"$group": {
+            "_id": {
+                "day": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}},
+                "api": "$api",
+                "endpoint": {"$ifNull": ["$endpoint", LOG_DEFAULTS["endpoint"]]},
+            },
+            "calls": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "timestamp": "$_id.day", "api": "$_id.api", "endpoint": "$_id.endpoint", "calls": 1}},
+        {"$sort": {"timestamp": 1, "api": 1, "endpoint": 1}},
+    ]
+
+
+def aggregate_endpoint_daily_usage(collection, start_date=None, end_date=None, api_name=None):
+    pipeline = endpoint_daily_usage_pipeline(start_date, end_date, api_name)
+    df = run_pipeline(collection, pipeline, ["timestamp", "api", "endpoint", "calls"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def top_values_pipeline(field, start_date=None, end_date=None, limit=None, default="Unknown"):
+    pipeline = [
+        build_match_stage(start_date, end_date),
+        {"$group": {"_id": {"$ifNull": [f"${field}", default]}, "Calls": {"$sum": 1}}},
+        {"$sort": {"Calls": -1, "_id": 1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {"_id": 0, field: "$_id", "Calls": 1}})
+    return pipeline
+
+
+def aggregate_top_values(collection, field, start_date=None, end_date=None, limit=None, default="Unknown"):
+    pipeline = top_values_pipeline(field, start_date, end_date, limit, default)
+    return run_pipeline(collection, pipeline, [field, "Calls"])
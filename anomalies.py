@@ -0,0 +1,214 @@
+import argparse
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from numpy.lib.stride_tricks import sliding_window_view
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReplaceOne
+
+from aggregations import LOG_DEFAULTS, run_pipeline
+from rollups import ROLLUP_COLLECTIONS, rollup_match, truncate_timestamp
+
+ANOMALY_COLLECTION = "anomalies"
+SERIES_KEYS = ["api", "user_id", "country"]
+SERIES_LEVELS = [("api",), ("api", "country"), ("api", "user_id", "country")]
+ALL_VALUES = "*"
+ANOMALY_KEY_FIELDS = ["granularity", "bucket"] + SERIES_KEYS + ["metric"]
+ANOMALY_COLUMNS = ["bucket", "granularity"] + SERIES_KEYS + ["metric", "value", "expected", "score", "direction", "calls"]
+BASELINE_BUCKETS = {"day": 28, "hour": 168}
+DETECT_BUCKETS = {"day": 7, "hour": 24}
+BUCKET_FREQ = {"day": "D", "hour": "h"}
+MAD_SCALE = 1.4826
+SCORE_THRESHOLD = 4.0
+MIN_CALLS = 20
+MIN_ERRORS = 5
+MAX_NAMED_SERIES = 5
+MIN_ERROR_RATE_SCALE = 0.02
+SERIES_CHUNK_SIZE = 2000
+
+
+def series_usage_pipeline(start_date=None, end_date=None):
+    return [
+        rollup_match(start_date, end_date),
+        {"$group": {
+            "_id": {"bucket": "$bucket", "api": "$api", "user_id": "$user_id", "country": "$country"},
+            "calls": {"$sum": "$calls"},
+            "errors": {"$sum": {"$cond": [{"$gte": ["$status_code", 500]}, "$calls", 0]}},
+        }},
+        {"$project": {
+            "_id": 0, "bucket": "$_id.bucket", "api": "$_id.api",
+            "user_id": {"$ifNull": ["$_id.user_id", LOG_DEFAULTS["user_id"]]},
+            "country": {"$ifNull": ["$_id.country", LOG_DEFAULTS["country"]]},
+            "calls": 1, "errors": 1,
+        }},
+    ]
+
+
+def load_series_usage(db, granularity="day", start_date=None, end_date=None):
+    df = run_pipeline(db[ROLLUP_COLLECTIONS[granularity]], series_usage_pipeline(start_date, end_date),
+                      ["bucket"] + SERIES_KEYS + ["calls", "errors"])
+    df["bucket"] = pd.to_datetime(df["bucket"])
+    return df
+
+
+def series_matrices(usage, level, buckets):
+    # One row per series at this level (omitted keys read "*"), one column per bucket, zeros where idle.
+    grouped = usage.groupby(list(level) + ["bucket"], sort=False)[["calls", "errors"]].sum()
+    calls = grouped["calls"].unstack("bucket", fill_value=0).reindex(columns=buckets, fill_value=0)
+    errors = grouped["errors"].unstack("bucket", fill_value=0).reindex(index=calls.index, columns=buckets, fill_value=0)
+    keys = calls.index.to_frame(index=False)
+    for field in SERIES_KEYS:
+        if field not in keys:
+            keys[field] = ALL_VALUES
+    return keys[SERIES_KEYS], calls.to_numpy(dtype=float), errors.to_numpy(dtype=float)
+
+
+def rolling_robust_scores(matrix, baseline, detect, min_scale):
+    # Robust z-scores of the last `detect` columns against the median/MAD of the `baseline` columns
+    # before each one. Series are processed in row chunks so the (rows, detect, baseline) windows stay bounded.
+    windows_start = matrix.shape[1] - detect - baseline
+    expected = np.empty((len(matrix), detect))
+    scale = np.empty((len(matrix), detect))
+    for row in range(0, len(matrix), SERIES_CHUNK_SIZE):
+        chunk = matrix[row:row + SERIES_CHUNK_SIZE, windows_start:-1]
+        windows = sliding_window_view(chunk, baseline, axis=1)
+        with warnings.catch_warnings():
+            # Error-rate windows without any traffic are all NaN and stay NaN.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(windows, axis=2)
+            mad = np.nanmedian(np.abs(windows - median[:, :, None]), axis=2)
+        expected[row:row + SERIES_CHUNK_SIZE] = median
+        scale[row:row + SERIES_CHUNK_SIZE] = np.maximum(MAD_SCALE * np.nan_to_num(mad), min_scale(median))
+    return expected, (matrix[:, -detect:] - expected) / scale
+
+
+def suppress_covered(anomalies):
+    # An outage (a drop or an error spike) at the API or country level also shows up in every user
+    # series beneath it. When more than a handful of finer series share it, keep only the coarse one;
+    # a few finer series still name the culprits. Volume spikes stay at every level.
+    keep = np.ones(len(anomalies), dtype=bool)
+    outage = (anomalies["direction"] == "drop") | (anomalies["metric"] == "error_rate")
+    for level in SERIES_LEVELS[:-1]:
+        omitted = [field for field in SERIES_KEYS if field not in level]
+        at_level = outage & (anomalies[omitted] == ALL_VALUES).all(axis=1)
+        finer = outage & (anomalies[omitted] != ALL_VALUES).any(axis=1)
+        match = ["bucket", "metric", "direction"] + list(level)
+        covered = anomalies[match].merge(anomalies.loc[at_level, match].drop_duplicates(), how="left", indicator=True)["_merge"] == "both"
+        shared = anomalies[finer].groupby(match)["value"].transform("size").reindex(anomalies.index, fill_value=0)
+        keep &= ~(finer & covered.to_numpy() & (shared > MAX_NAMED_SERIES)).to_numpy()
+    return anomalies[keep].reset_index(drop=True)
+
+
+def detect_anomalies(usage, granularity="day", end=None, baseline=None, detect=None, threshold=SCORE_THRESHOLD):
+    # `end` is the last complete bucket; the buckets before the detection range only form the baseline.
+    baseline = baseline or BASELINE_BUCKETS[granularity]
+    detect = detect or DETECT_BUCKETS[granularity]
+    end = pd.Timestamp(end or truncate_timestamp(datetime.utcnow(), granularity) - pd.Timedelta(1, BUCKET_FREQ[granularity]))
+    buckets = pd.date_range(end=end, periods=baseline + detect, freq=BUCKET_FREQ[granularity])
+    if usage.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    frames = []
+    for level in SERIES_LEVELS:
+        keys, calls, errors = series_matrices(usage, level, buckets)
+        # Counts get a Poisson floor on their spread; error rates are undefined without traffic and
+        # only compared when the bucket has enough calls to be meaningful.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = np.where(calls >= MIN_CALLS, errors / calls, np.nan)
+        metrics = {
+            "calls": (calls, rolling_robust_scores(calls, baseline, detect, lambda median: np.sqrt(np.maximum(median, 1)))),
+            "error_rate": (rates, rolling_robust_scores(rates, baseline, detect, lambda median: np.full(median.shape, MIN_ERROR_RATE_SCALE))),
+        }
+        for metric, (values, (expected, scores)) in metrics.items():
+            flagged = np.abs(scores) >= threshold
+            if metric == "calls":
+                # A drop only signals an outage when the series normally has traffic.
+                flagged &= (scores > 0) | (expected >= MIN_CALLS)
+            else:
+                flagged &= (scores > 0) & (errors[:, baseline:] >= MIN_ERRORS)
+            rows, columns = np.nonzero(flagged)
+            if not len(rows):
+                continue
+            frame = keys.iloc[rows].reset_index(drop=True)
+            frame.insert(0, "bucket", buckets[baseline + columns])
+            frame.insert(1, "granularity", granularity)
+            frame["metric"] = metric
+            frame["value"] = values[rows, baseline + columns]
+            frame["expected"] = expected[rows, columns]
+            frame["score"] = scores[rows, columns]
+            frame["direction"] = np.where(scores[rows, columns] > 0, "spike", "drop")
+            frame["calls"] = calls[rows, baseline + columns]
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    anomalies = suppress_covered(pd.concat(frames, ignore_index=True)[ANOMALY_COLUMNS])
+    order = anomalies.assign(magnitude=anomalies["score"].abs()).sort_values(["bucket", "magnitude"], ascending=False).index
+    return anomalies.loc[order].reset_index(drop=True)
+
+
+def ensure_anomaly_indexes(db):
+    db[ANOMALY_COLLECTION].create_index([(field, ASCENDING) for field in ANOMALY_KEY_FIELDS], unique=True, name="anomaly_key")
+    db[ANOMALY_COLLECTION].create_index([("granularity", ASCENDING), ("bucket", DESCENDING)], name="granularity_bucket")
+
+
+def write_anomalies(db, anomalies, detected_at=None):
+    if anomalies.empty:
+        return 0
+    ensure_anomaly_indexes(db)
+    detected_at = detected_at or datetime.utcnow()
+    docs = anomalies.assign(detected_at=detected_at).to_dict("records")
+    result = db[ANOMALY_COLLECTION].bulk_write(
+        [ReplaceOne({field: doc[field] for field in ANOMALY_KEY_FIELDS}, doc, upsert=True) for doc in docs],
+        ordered=False,
+    )
+    return result.upserted_count + result.modified_count
+
+
+def last_complete_bucket(granularity, now=None):
+    return truncate_timestamp(now or datetime.utcnow(), granularity) - pd.Timedelta(1, BUCKET_FREQ[granularity]).to_pytimedelta()
+
+
+def detection_start(granularity, now=None):
+    # First bucket the latest run scores; anything older is baseline.
+    end = last_complete_bucket(granularity, now)
+    return end - pd.Timedelta(DETECT_BUCKETS[granularity] - 1, BUCKET_FREQ[granularity]).to_pytimedelta()
+
+
+def run_anomaly_detection(db, granularity="day", now=None, threshold=SCORE_THRESHOLD):
+    freq = BUCKET_FREQ[granularity]
+    end = last_complete_bucket(granularity, now)
+    start = end - pd.Timedelta(BASELINE_BUCKETS[granularity] + DETECT_BUCKETS[granularity] - 1, freq).to_pytimedelta()
+    anomalies = detect_anomalies(load_series_usage(db, granularity, start, end), granularity, end, threshold=threshold)
+    write_anomalies(db, anomalies)
+    return anomalies
+
+
+def load_anomalies(db, granularity="day", since=None, limit=200):
+    query = {"granularity": granularity}
+    if since:
+        query["bucket"] = {"$gte": since}
+    docs = db[ANOMALY_COLLECTION].find(query, {"_id": 0}).sort("bucket", DESCENDING).limit(limit)
+    return pd.DataFrame(list(docs), columns=ANOMALY_COLUMNS + ["detected_at"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag unusual call volumes and error rates per API, user and country.")
+    parser.add_argument("--granularity", choices=["hour", "day", "all"], default="all")
+    parser.add_argument("--threshold", type=float, default=SCORE_THRESHOLD)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    granularities = ("hour", "day") if args.granularity == "all" else (args.granularity,)
+    for granularity in granularities:
+        anomalies = run_anomaly_detection(db, granularity, threshold=args.threshold)
+        print(f"{granularity}: {len(anomalies):,} anomalies across {anomalies['api'].nunique() if len(anomalies) else 0} APIs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+KEY_PROJECTION = {"_id": 0, "key_id": 1, "api_key": 1, "user_id": 1, "api": 1, "created_at": 1, "expires_at": 1, "status": 1}
+
+
+def keys_for_users_query(user_ids):
+    return {"user_id": {"$in": list(user_ids)}}
+
+
+def load_keys_by_user(collection, user_ids):
+    keys_by_user = {user_id: [] for user_id in user_ids}
+    if not keys_by_user:
+        return keys_by_user
+    for key in collection.find(keys_for_users_query(keys_by_user), KEY_PROJECTION):
+        keys_by_user.setdefault(key["user_id"], []).append(key)
+    return keys_by_user
@@ -0,0 +1,155 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from bson import decode_all, encode
+
+from log_generator import columns_to_documents, generate_log_columns
+from log_loader import PyMongoArrowContext, compact_log_frame, load_log_frame
+from pricing import price_usage
+from usage_metrics import (
+    calculate_current_daily_usage, calculate_daily_usage, country_counts, daily_api_counts,
+    daily_endpoint_counts, top_consumers,
+)
+
+DEFAULT_SIZES = "50000,1000000,10000000"
+CONVERSION_BATCH_SIZE = 10000
+
+
+class _RawBatchSource:
+    def __init__(self, docs, batch_size):
+        self.batches = [
+            b"".join(encode(doc) for doc in docs[i:i + batch_size])
+            for i in range(0, len(docs), batch_size)
+        ]
+
+    def find_raw_batches(self, query, projection, batch_size):
+        return iter(self.batches)
+
+
+def measure(func, repeat):
+    # Timed runs are untraced; tracemalloc slows object-heavy code several times over, so the
+    # peak comes from one extra traced run.
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(min(timings), 5), "peak_mb": round(peak / 1024 ** 2, 2)}
+
+
+def synthetic_frame(size, seed, compact):
+    end_time = datetime.utcnow()
+    columns = generate_log_columns(size, seed=seed, start_time=end_time - timedelta(days=90), end_time=end_time)
+    columns["timestamp"] = columns["timestamp"].astype("datetime64[ns]")
+    df = pd.DataFrame(columns)
+    return compact_log_frame(df) if compact else df
+
+
+def conversion_cases(size, seed):
+    docs = columns_to_documents(generate_log_columns(size, seed=seed))
+    source = _RawBatchSource(docs, CONVERSION_BATCH_SIZE)
+    # Every case starts from the same raw BSON batches, so BSON decoding is always part of the cost.
+    cases = {
+        "conversion_dicts_to_frame": lambda: pd.DataFrame([doc for batch in source.batches for doc in decode_all(batch)]),
+        "conversion_raw_dicts": lambda: load_log_frame(source, use_arrow=False),
+        "conversion_raw_dicts_compact": lambda: load_log_frame(source, use_arrow=False, compact=True),
+    }
+    if PyMongoArrowContext is not None:
+        cases["conversion_arrow"] = lambda: load_log_frame(source)
+        cases["conversion_arrow_compact"] = lambda: load_log_frame(source, compact=True)
+    return cases
+
+
+def compute_cases(df):
+    api_name = "Image API"
+    return {
+        "calculate_daily_usage": lambda: calculate_daily_usage(df, api_name),
+        "calculate_current_daily_usage": lambda: calculate_current_daily_usage(df, api_name),
+        "overview_cost": lambda: price_usage(daily_endpoint_counts(df))["Cost"].sum(),
+        "price_raw_logs": lambda: price_usage(df)["Cost"].sum(),
+        "daily_api_counts": lambda: daily_api_counts(df),
+        "top_consumers": lambda: top_consumers(df),
+        "country_counts": lambda: country_counts(df),
+    }
+
+
+def run(sizes, repeat, seed, conversion_max_rows):
+    results = []
+    for size in sizes:
+        if size <= conversion_max_rows:
+            for name, func in conversion_cases(size, seed).items():
+                results.append({"case": name, "rows": size, "layout": "bson", **measure(func, repeat)})
+                print(json.dumps(results[-1]))
+        for layout in ("object", "compact"):
+            df = synthetic_frame(size, seed, compact=layout == "compact")
+            frame_mb = round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2)
+            for name, func in compute_cases(df).items():
+                results.append({"case": name, "rows": size, "layout": layout, "frame_mb": frame_mb, **measure(func, repeat)})
+                print(json.dumps(results[-1]))
+            del df
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r["rows"], r["layout"]): r for r in json.load(f)["results"]}
+    for result in results:
+        previous = baseline.get((result["case"], result["rows"], result["layout"]))
+        if previous and previous["seconds"]:
+            ratio = result["seconds"] / previous["seconds"]
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"{result['case']:<32} {result['rows']:>10,} {result['layout']:<8} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dashboard data functions. Run from the repo root: python -m benchmarks.bench_dashboard"
+    )
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--conversion-max-rows", type=int, default=1000000,
+                        help="Skip the BSON conversion cases above this size; encoding the input is slow.")
+    parser.add_argument("--output", default=None, help="JSON results file. Defaults to benchmarks/results/<timestamp>.json.")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(sizes, args.repeat, args.seed, args.conversion_max_rows)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"dashboard-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "run_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from aggregations import build_log_query
+from log_loader import DEFAULT_BATCH_SIZE, PyMongoArrowContext, load_log_frame
+
+
+def load_with_dicts(collection, query, batch_size):
+    return pd.DataFrame(list(collection.find(query).batch_size(batch_size)))
+
+
+def load_raw_dicts(collection, query, batch_size):
+    return load_log_frame(collection, query, batch_size=batch_size, use_arrow=False)
+
+
+def load_arrow(collection, query, batch_size):
+    if PyMongoArrowContext is None:
+        raise ImportError("pymongoarrow is not installed")
+    return load_log_frame(collection, query, batch_size=batch_size, use_arrow=True)
+
+
+LOADERS = {
+    "dicts": load_with_dicts,
+    "raw_dicts": load_raw_dicts,
+    "arrow": load_arrow,
+}
+
+
+def measure(loader, collection, query, batch_size):
+    # Tracing allocations slows object-heavy code several times over, so time an untraced run
+    # and take the peak from a separate traced one.
+    started = time.perf_counter()
+    df = loader(collection, query, batch_size)
+    elapsed = time.perf_counter() - started
+    rows = len(df)
+    del df
+    tracemalloc.start()
+    df = loader(collection, query, batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "peak_mb": round(peak / 1024 ** 2, 2),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare api_usage_logs loaders. Run from the repo root: python -m benchmarks.bench_log_loader"
+    )
+    parser.add_argument("--days", type=int, default=90, help="Size of the timestamp window to load.")
+    parser.add_argument("--batch-sizes", default=f"1000,{DEFAULT_BATCH_SIZE},50000")
+    parser.add_argument("--loaders", default=",".join(LOADERS))
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    collection = MongoClient(os.getenv("MONGODB_URI"))["apiman"]["api_usage_logs"]
+    end_date = datetime.utcnow().date()
+    query = build_log_query(end_date - timedelta(days=args.days - 1), end_date)
+
+    results = []
+    for loader_name in args.loaders.split(","):
+        for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+            result = {"loader": loader_name, "batch_size": batch_size}
+            try:
+                result.update(measure(LOADERS[loader_name], collection, query, batch_size))
+            except ImportError as e:
+                result["skipped"] = str(e)
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"run_at": datetime.utcnow().isoformat(), "days": args.days, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
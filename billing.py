@@ -0,0 +1,183 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, ReplaceOne
+
+from aggregations import LOG_DEFAULTS, build_match_stage
+from pricing import price_usage
+from rollups import ROLLUP_COLLECTIONS
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+INVOICE_COLLECTION = "invoices"
+INVOICE_KEY_FIELDS = ["month", "user_id"]
+INVOICE_TIER_KEYS = ("user_id", "api")
+LINE_ITEM_COLUMNS = ["month", "user_id", "api", "api_key", "calls", "cost"]
+DEFAULT_CHUNK_DAYS = 7
+NO_API_KEY = "-"
+
+
+def month_bounds(month):
+    start = datetime.strptime(month, "%Y-%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def month_chunks(month, chunk_days=DEFAULT_CHUNK_DAYS):
+    start, end = month_bounds(month)
+    chunks = []
+    while start < end:
+        chunk_end = min(start + timedelta(days=chunk_days), end)
+        chunks.append((start, chunk_end - timedelta(microseconds=1)))
+        start = chunk_end
+    return chunks
+
+
+def ensure_invoice_indexes(db):
+    db[INVOICE_COLLECTION].create_index([(field, ASCENDING) for field in INVOICE_KEY_FIELDS], unique=True, name="invoice_key")
+
+
+def check_source(source, per_key):
+    # Rollups have no api_key dimension, so per-key lines need the raw logs.
+    if per_key and source == "rollups":
+        raise ValueError("Per-API-key invoices need source='logs'; rollups have no api_key dimension.")
+
+
+def usage_chunk_pipeline(start, end, source="logs", per_key=True):
+    check_source(source, per_key)
+    if source == "rollups":
+        day, calls = "$bucket", "$calls"
+        match = build_match_stage(start, end, field="bucket")
+    else:
+        day, calls = {"$dateTrunc": {"date": "$timestamp", "unit": "day"}}, 1
+        match = build_match_stage(start, end)
+    api_key = {"$ifNull": ["$api_key", NO_API_KEY]} if per_key else NO_API_KEY
+    return [
+        match,
+        {"$group": {
+            "_id": {
+                "timestamp": day,
+                "user_id": {"$ifNull": ["$user_id", LOG_DEFAULTS["user_id"]]},
+                "api": "$api",
+                "api_key": api_key,
+                "endpoint": {"$ifNull": ["$endpoint", LOG_DEFAULTS["endpoint"]]},
+            },
+            "calls": {"$sum": calls},
+        }},
+        {"$project": {
+            "_id": 0, "timestamp": "$_id.timestamp", "user_id": "$_id.user_id", "api": "$_id.api",
+            "api_key": "$_id.api_key", "endpoint": "$_id.endpoint", "calls": 1,
+        }},
+    ]
+
+
+def load_month_usage(db, month, source="logs", per_key=True, workers=4, chunk_days=DEFAULT_CHUNK_DAYS):
+    check_source(source, per_key)
+    collection = db[ROLLUP_COLLECTIONS["day"]] if source == "rollups" else db["api_usage_logs"]
+    columns = ["timestamp", "user_id", "api", "api_key", "endpoint", "calls"]
+
+    def load_chunk(start, end):
+        return pd.DataFrame(list(collection.aggregate(usage_chunk_pipeline(start, end, source, per_key), allowDiskUse=True)), columns=columns)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = list(executor.map(lambda chunk: load_chunk(*chunk), month_chunks(month, chunk_days)))
+    usage = pd.concat(frames, ignore_index=True)
+    usage["timestamp"] = pd.to_datetime(usage["timestamp"])
+    return usage
+
+
+def invoice_line_items(usage, month):
+    # Volume tiers are counted per customer and API across the whole month, hence pricing after the chunks merge.
+    priced = price_usage(usage, tier_keys=INVOICE_TIER_KEYS)
+    if priced.empty:
+        return pd.DataFrame(columns=LINE_ITEM_COLUMNS)
+    lines = priced.groupby(["user_id", "api", "api_key"], as_index=False).agg(calls=("calls", "sum"), cost=("Cost", "sum"))
+    lines.insert(0, "month", month)
+    lines["calls"] = lines["calls"].astype(int)
+    lines["cost"] = lines["cost"].round(6)
+    return lines.sort_values(["user_id", "api", "api_key"]).reset_index(drop=True)[LINE_ITEM_COLUMNS]
+
+
+def invoice_documents(lines, generated_at=None):
+    generated_at = generated_at or datetime.utcnow()
+    docs = []
+    for (month, user_id), user_lines in lines.groupby(["month", "user_id"], sort=True):
+        items = user_lines[["api", "api_key", "calls", "cost"]].to_dict("records")
+        docs.append({
+            "month": month,
+            "user_id": user_id,
+            "line_items": items,
+            "total_calls": int(user_lines["calls"].sum()),
+            "total_cost": round(float(user_lines["cost"].sum()), 6),
+            "generated_at": generated_at,
+        })
+    return docs
+
+
+def write_invoices(db, docs):
+    if not docs:
+        return 0
+    ensure_invoice_indexes(db)
+    result = db[INVOICE_COLLECTION].bulk_write(
+        [ReplaceOne({field: doc[field] for field in INVOICE_KEY_FIELDS}, doc, upsert=True) for doc in docs],
+        ordered=False,
+    )
+    return result.upserted_count + result.modified_count
+
+
+def generate_invoices(db, month, source="logs", per_key=True, workers=4, chunk_days=DEFAULT_CHUNK_DAYS):
+    lines = invoice_line_items(load_month_usage(db, month, source, per_key, workers, chunk_days), month)
+    write_invoices(db, invoice_documents(lines))
+    return lines
+
+
+def load_invoices(db, month):
+    return list(db[INVOICE_COLLECTION].find({"month": month}, {"_id": 0}).sort("user_id", ASCENDING))
+
+
+def export_line_items(lines, path):
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            raise RuntimeError("Parquet export needs pyarrow installed.")
+        lines.to_parquet(path, index=False)
+    else:
+        lines.to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate monthly invoices for every user.")
+    parser.add_argument("--month", default=None, help="Calendar month as YYYY-MM. Defaults to last month.")
+    parser.add_argument("--source", choices=["rollups", "logs"], default="logs")
+    parser.add_argument(
+        "--no-api-keys", dest="per_key", action="store_false",
+        help="Bill per user and API only. Required with --source rollups.",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-days", type=int, default=DEFAULT_CHUNK_DAYS)
+    parser.add_argument("--export", action="append", default=[], help="Write line items to a .csv or .parquet path.")
+    args = parser.parse_args()
+    try:
+        check_source(args.source, args.per_key)
+    except ValueError as e:
+        parser.error(str(e))
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    month = args.month or (datetime.utcnow().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    lines = generate_invoices(db, month, args.source, args.per_key, args.workers, args.chunk_days)
+    print(f"{month}: {lines['user_id'].nunique():,} invoices, {len(lines):,} line items, ${lines['cost'].sum():,.2f} total")
+    for path in args.export:
+        print(f"Wrote {export_line_items(lines, path)}")
+
+
+if __name__ == "__main__":
+    main()
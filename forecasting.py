@@ -0,0 +1,128 @@
+import itertools
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+FORECAST_HISTORY_DAYS = 56
+FORECAST_HORIZON_DAYS = 35
+SEASON_LENGTH = 7
+INTERVAL_Z = 1.2816
+SMOOTHING_GRID = np.array(list(itertools.product((0.1, 0.3, 0.5, 0.8), (0.0, 0.05, 0.2), (0.05, 0.2, 0.4))))
+
+
+def usage_matrix(daily, key="api", value="Count", start=None, end=None):
+    dates = pd.date_range(start or daily["timestamp"].min(), end or daily["timestamp"].max(), freq="D")
+    matrix = daily.pivot_table(index=key, columns="timestamp", values=value, aggfunc="sum", fill_value=0)
+    matrix = matrix.reindex(columns=dates, fill_value=0)
+    return list(matrix.index), dates, matrix.to_numpy(dtype=float)
+
+
+def holt_winters(series, horizon, season=SEASON_LENGTH, grid=SMOOTHING_GRID, z=INTERVAL_Z):
+    # Additive Holt-Winters fitted to every series and every (alpha, beta, gamma) in the grid at
+    # once: arrays are (series, grid), so the only Python loop is over the days of history.
+    n_series, n_days = series.shape
+    steps = np.arange(1, horizon + 1)
+    if n_days < 2 * season:
+        level = series[:, -season:].mean(axis=1) if n_days else np.zeros(n_series)
+        sigma = series[:, -season:].std(axis=1) if n_days else np.zeros(n_series)
+        forecast = np.repeat(level[:, None], horizon, axis=1)
+    else:
+        alpha, beta, gamma = (grid[:, i][None, :] for i in range(3))
+        first, second = series[:, :season].mean(axis=1), series[:, season:2 * season].mean(axis=1)
+        level = np.repeat(first[:, None], len(grid), axis=1)
+        trend = np.repeat(((second - first) / season)[:, None], len(grid), axis=1)
+        seasonal = np.repeat((series[:, :season] - first[:, None])[:, None, :], len(grid), axis=1)
+        sse = np.zeros((n_series, len(grid)))
+
+        for t in range(season, n_days):
+            observed = series[:, t, None]
+            index = t % season
+            error = observed - (level + trend + seasonal[:, :, index])
+            sse += error ** 2
+            new_level = alpha * (observed - seasonal[:, :, index]) + (1 - alpha) * (level + trend)
+            trend = beta * (new_level - level) + (1 - beta) * trend
+            seasonal[:, :, index] = gamma * (observed - new_level) + (1 - gamma) * seasonal[:, :, index]
+            level = new_level
+
+        rows = np.arange(n_series)
+        best = sse.argmin(axis=1)
+        level, trend, seasonal = level[rows, best], trend[rows, best], seasonal[rows, best]
+        sigma = np.sqrt(sse[rows, best] / (n_days - season))
+        forecast = level[:, None] + steps[None, :] * trend[:, None] + seasonal[:, (n_days + steps - 1) % season]
+
+    spread = z * sigma[:, None] * np.sqrt(steps)[None, :]
+    forecast = np.clip(forecast, 0, None)
+    return forecast, np.clip(forecast - spread, 0, None), forecast + spread, sigma
+
+
+def forecast_usage(daily, key="api", value="Count", today=None, history_days=FORECAST_HISTORY_DAYS, horizon=FORECAST_HORIZON_DAYS):
+    # Today is still filling up, so the models see complete days only and forecast from today on.
+    today = pd.Timestamp(today or datetime.utcnow()).normalize()
+    columns = [key, "timestamp", "Forecast", "Lower", "Upper", "Sigma"]
+    history = daily[(daily["timestamp"] < today) & (daily["timestamp"] >= today - pd.Timedelta(days=history_days))]
+    if history.empty:
+        return pd.DataFrame(columns=columns)
+    keys, _, matrix = usage_matrix(history, key, value, start=today - pd.Timedelta(days=history_days), end=today - pd.Timedelta(days=1))
+    forecast, lower, upper, sigma = holt_winters(matrix, horizon)
+    dates = pd.date_range(today, periods=horizon, freq="D")
+    return pd.DataFrame({
+        key: np.repeat(keys, horizon),
+        "timestamp": np.tile(dates, len(keys)),
+        "Forecast": forecast.ravel(),
+        "Lower": lower.ravel(),
+        "Upper": upper.ravel(),
+        "Sigma": np.repeat(sigma, horizon),
+    }, columns=columns)
+
+
+def effective_unit_costs(priced, key="api"):
+    # Average price per call after endpoint prices and volume tiers, from priced usage rows.
+    totals = priced.groupby(key)[["Cost", "calls"]].sum()
+    return (totals["Cost"] / totals["calls"].where(totals["calls"] > 0)).fillna(0).to_dict()
+
+
+def month_end_projection(daily, forecast, unit_costs, key="api", value="Count", today=None, z=INTERVAL_Z):
+    # Actual calls for the complete days of this month plus the forecast through the month's last day.
+    today = pd.Timestamp(today or datetime.utcnow()).normalize()
+    month_start = today.replace(day=1)
+    month_end = month_start + pd.offsets.MonthBegin(1)
+    actual = daily[(daily["timestamp"] >= month_start) & (daily["timestamp"] < today)].groupby(key)[value].sum()
+    remaining = forecast[forecast["timestamp"] < month_end].copy()
+    remaining["Step"] = (remaining["timestamp"] - today).dt.days + 1
+    remaining["Variance"] = remaining["Sigma"] ** 2 * remaining["Step"]
+    projected = remaining.groupby(key).agg(Forecast=("Forecast", "sum"), Variance=("Variance", "sum"))
+    projected["Actual"] = actual.reindex(projected.index).fillna(0)
+    projected["Spread"] = z * np.sqrt(projected["Variance"])
+
+    result = pd.DataFrame(index=projected.index)
+    result["Projected Calls"] = projected["Actual"] + projected["Forecast"]
+    result["Calls Low"] = projected["Actual"] + (projected["Forecast"] - projected["Spread"]).clip(lower=0)
+    result["Calls High"] = projected["Actual"] + projected["Forecast"] + projected["Spread"]
+    unit_cost = pd.Series(unit_costs).reindex(result.index).fillna(0)
+    for column in ("Projected Calls", "Calls Low", "Calls High"):
+        result[column.replace("Calls", "Cost")] = result[column] * unit_cost
+    return result.reset_index()
+
+
+def quota_exhaustion(forecast, quota_daily, used_today, now=None):
+    # When today's remaining quota runs out at the forecast's hourly pace (upper bound = earliest),
+    # and the first future day whose forecast volume alone exceeds the quota.
+    now = now or datetime.utcnow()
+    today = pd.Timestamp(now).normalize()
+    result = {"exhausted": used_today >= quota_daily, "today_expected": None, "today_earliest": None, "first_day": None, "first_day_earliest": None}
+    if forecast.empty or not quota_daily:
+        return result
+    midnight = (today + pd.Timedelta(days=1)).to_pydatetime()
+    today_row = forecast[forecast["timestamp"] == today]
+    if not result["exhausted"] and not today_row.empty:
+        for label, column in (("today_expected", "Forecast"), ("today_earliest", "Upper")):
+            hourly_rate = today_row[column].iloc[0] / 24
+            if hourly_rate > 0:
+                hit_at = now + timedelta(hours=(quota_daily - used_today) / hourly_rate)
+                result[label] = hit_at if hit_at < midnight else None
+    future = forecast[forecast["timestamp"] > today]
+    for label, column in (("first_day", "Forecast"), ("first_day_earliest", "Upper")):
+        over = future[future[column] >= quota_daily]
+        result[label] = over["timestamp"].iloc[0].to_pydatetime() if not over.empty else None
+    return result
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timedelta
+
+from aggregations import LOG_DEFAULTS, log_value
+from sketches import DDSketch
+
+HEALTH_WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+STATUS_WINDOW = "5m"
+SLOT_SECONDS = 10
+EPOCH = datetime(1970, 1, 1)
+
+
+def recent_logs_query(now=None, horizon_seconds=max(HEALTH_WINDOWS.values()), up_to_id=None):
+    now = now or datetime.utcnow()
+    query = {"timestamp": {"$gte": now - timedelta(seconds=horizon_seconds)}}
+    if up_to_id is not None:
+        query["_id"] = {"$lte": up_to_id}
+    return query
+
+
+def health_status(stats, config):
+    # Same thresholds the simulated status used: multiples of the configured baselines.
+    if not stats["requests"]:
+        return "idle"
+    base_latency = config.get("base_latency_ms", 50)
+    base_error_rate = config.get("base_error_rate_percent", 0.5)
+    if stats["error_rate"] > base_error_rate * 4 or stats["avg_latency"] > base_latency * 2.5:
+        return "critical"
+    if stats["error_rate"] > base_error_rate * 2 or stats["avg_latency"] > base_latency * 1.5:
+        return "warning"
+    return "healthy"
+
+
+class HealthMonitor:
+    # Per-API ring of SLOT_SECONDS slots; each window merges the slots it covers.
+    def __init__(self, windows=HEALTH_WINDOWS):
+        self.windows = dict(windows)
+        self.horizon = max(self.windows.values())
+        self.slots = {}
+        self.pruned_slot = None
+        self._lock = threading.Lock()
+
+    def _slot(self, timestamp):
+        return int((timestamp - EPOCH).total_seconds()) // SLOT_SECONDS
+
+    def _prune(self, now):
+        # Slots only expire when the current slot changes, so callers adding one document at a time
+        # walk the ring once per SLOT_SECONDS rather than once per document.
+        current = self._slot(now)
+        if current == self.pruned_slot:
+            return
+        oldest = current - self.horizon // SLOT_SECONDS
+        for api_slots in self.slots.values():
+            for slot in [slot for slot in api_slots if slot <= oldest]:
+                del api_slots[slot]
+        self.pruned_slot = current
+
+    def reset(self):
+        with self._lock:
+            self.slots = {}
+            self.pruned_slot = None
+
+    def add_many(self, docs, now=None):
+        with self._lock:
+            for doc in docs:
+                api = doc.get("api")
+                timestamp = doc.get("timestamp")
+                if api in (None, LOG_DEFAULTS["api"]) or not isinstance(timestamp, datetime):
+                    continue
+                entry = self.slots.setdefault(api, {}).get(self._slot(timestamp))
+                if entry is None:
+                    entry = self.slots[api][self._slot(timestamp)] = [0, 0, 0, DDSketch()]
+                status_code = log_value(doc, "status_code")
+                entry[0] += 1
+                entry[1] += 400 <= status_code < 500
+                entry[2] += status_code >= 500
+                entry[3].add_many([log_value(doc, "latency_ms")])
+            self._prune(now or datetime.utcnow())
+
+    def window_stats(self, api, seconds, now=None):
+        now = now or datetime.utcnow()
+        first_slot = self._slot(now) - seconds // SLOT_SECONDS
+        requests = errors_4xx = errors_5xx = 0
+        latency = DDSketch()
+        with self._lock:
+            for slot, (count, count_4xx, count_5xx, sketch) in self.slots.get(api, {}).items():
+                if slot > first_slot:
+                    requests += count
+                    errors_4xx += count_4xx
+                    errors_5xx += count_5xx
+                    latency.merge(sketch)
+        return {
+            "requests": requests,
+            "rps": requests / seconds,
+            "error_4xx_rate": errors_4xx / requests * 100 if requests else 0.0,
+            "error_5xx_rate": errors_5xx / requests * 100 if requests else 0.0,
+            "error_rate": (errors_4xx + errors_5xx) / requests * 100 if requests else 0.0,
+            "avg_latency": latency.mean() or 0.0,
+            "p50": latency.quantile(0.50) or 0.0,
+            "p95": latency.quantile(0.95) or 0.0,
+            "p99": latency.quantile(0.99) or 0.0,
+        }
+
+    def report(self, api, config=None, now=None):
+        now = now or datetime.utcnow()
+        windows = {name: self.window_stats(api, seconds, now) for name, seconds in self.windows.items()}
+        return {"status": health_status(windows[STATUS_WINDOW], config or {}), "windows": windows}
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+
+from aggregations import (
+    api_totals_pipeline, build_log_query, daily_usage_pipeline, endpoint_daily_usage_pipeline, top_values_pipeline,
+)
+from anomalies import ANOMALY_COLLECTION, ensure_anomaly_indexes, series_usage_pipeline
+from api_keys import keys_for_users_query
+from billing import INVOICE_COLLECTION, ensure_invoice_indexes, usage_chunk_pipeline
+from health import recent_logs_query
+from log_export import export_query
+from pagination import DEFAULT_PAGE_SIZE, PICKER_PAGE_SIZE, page_sort, prefix_query
+from quotas import QUOTA_COLLECTION, QUOTA_RESERVATION_COLLECTION, ensure_quota_indexes, quota_filter
+from rate_limits import rps_histogram_pipeline
+from rollups import (
+    ROLLUP_COLLECTIONS, ensure_rollup_indexes, rollup_api_totals_pipeline,
+    rollup_daily_usage_pipeline, rollup_endpoint_daily_usage_pipeline, rollup_top_values_pipeline,
+)
+from sketches import (
+    DISTINCT_SKETCH_COLLECTION, LATENCY_SKETCH_COLLECTION, distinct_query, ensure_sketch_indexes, sketch_query,
+)
+from tickets import open_tickets_pipeline, ticket_aging_pipeline
+
+INDEX_SPECS = {
+    "api_usage_logs": [
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+        IndexModel([("api", ASCENDING), ("timestamp", ASCENDING)], name="api_timestamp"),
+    ],
+    "api_keys": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("key_id", ASCENDING)], name="key_id", unique=True),
+    ],
+    "support_tickets": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="status_created_at_id"),
+        IndexModel([("status", ASCENDING), ("closed_at", DESCENDING), ("_id", DESCENDING)], name="status_closed_at_id"),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_id"),
+    ],
+}
+
+
+def ensure_indexes(db):
+    created = {}
+    for collection_name, models in INDEX_SPECS.items():
+        created[collection_name] = db[collection_name].create_indexes(models)
+    ensure_rollup_indexes(db)
+    ensure_sketch_indexes(db)
+    ensure_quota_indexes(db)
+    ensure_invoice_indexes(db)
+    ensure_anomaly_indexes(db)
+    return created
+
+
+def app_queries(db):
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=29)
+    sample_users = [user["user_id"] for user in db["users"].find({}, {"user_id": 1}).limit(50)] or ["user_1"]
+    sample_key = (db["api_keys"].find_one({}, {"key_id": 1}) or {}).get("key_id", "missing")
+    newest_log = db["api_usage_logs"].find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+
+    watermark_query = build_log_query(start_date, end_date)
+    if newest_log:
+        watermark_query["_id"] = {"$gt": newest_log["_id"]}
+
+    return [
+        ("logs: api totals", "api_usage_logs", {"aggregate": api_totals_pipeline(start_date, end_date)}),
+        ("logs: daily usage", "api_usage_logs", {"aggregate": daily_usage_pipeline(start_date, end_date)}),
+        ("logs: daily usage for one API", "api_usage_logs",
+         {"aggregate": daily_usage_pipeline(start_date, end_date, "Image API")}),
+        ("logs: endpoint daily usage for pricing", "api_usage_logs",
+         {"aggregate": endpoint_daily_usage_pipeline(start_date, end_date)}),
+        ("logs: top consumers", "api_usage_logs",
+         {"aggregate": top_values_pipeline("user_id", start_date, end_date, limit=10)}),
+        ("logs: country counts", "api_usage_logs", {"aggregate": top_values_pipeline("country", start_date, end_date)}),
+        ("logs: raw window load", "api_usage_logs", {"find": build_log_query(start_date, end_date)}),
+        ("logs: watermark delta", "api_usage_logs", {"find": watermark_query}),
+        ("logs: newest _id", "api_usage_logs", {"find": {}, "sort": {"_id": -1}, "limit": 1}),
+        ("logs: raw export for one API", "api_usage_logs",
+         {"find": export_query(start_date, end_date, "Image API", status="5xx"), "sort": {"timestamp": 1}}),
+        ("logs: health window seed", "api_usage_logs", {"find": recent_logs_query()}),
+        ("logs: per-second RPS for one API", "api_usage_logs",
+         {"aggregate": rps_histogram_pipeline(start_date, end_date, "Image API")}),
+        ("rollups: api totals", ROLLUP_COLLECTIONS["day"], {"aggregate": rollup_api_totals_pipeline(start_date, end_date)}),
+        ("rollups: daily usage", ROLLUP_COLLECTIONS["day"], {"aggregate": rollup_daily_usage_pipeline(start_date, end_date)}),
+        ("rollups: endpoint daily usage for pricing", ROLLUP_COLLECTIONS["day"],
+         {"aggregate": rollup_endpoint_daily_usage_pipeline(start_date, end_date)}),
+        ("rollups: top consumers", ROLLUP_COLLECTIONS["day"],
+         {"aggregate": rollup_top_values_pipeline("user_id", start_date, end_date, limit=10)}),
+        ("sketches: latency sketches for one API", LATENCY_SKETCH_COLLECTION,
+         {"find": sketch_query(start_date, end_date, "Image API")}),
+        ("sketches: distinct users per API", DISTINCT_SKETCH_COLLECTION,
+         {"find": distinct_query("user_id", start_date, end_date)}),
+        ("quotas: api counter today", QUOTA_COLLECTION, {"find": quota_filter("Image API")}),
+        ("quotas: api admissions today", QUOTA_RESERVATION_COLLECTION, {"find": quota_filter("Image API")}),
+        ("billing: month usage chunk per api key", "api_usage_logs",
+         {"aggregate": usage_chunk_pipeline(start_date, start_date + timedelta(days=7))}),
+        ("billing: invoices for a month", INVOICE_COLLECTION, {"find": {"month": end_date.strftime("%Y-%m")}}),
+        ("anomalies: daily series", ROLLUP_COLLECTIONS["day"],
+         {"aggregate": series_usage_pipeline(end_date - timedelta(days=34), end_date)}),
+        ("anomalies: recent daily anomalies", ANOMALY_COLLECTION,
+         {"find": {"granularity": "day"}, "sort": {"bucket": -1}, "limit": 200}),
+        ("api_keys: keys for visible users", "api_keys", {"find": keys_for_users_query(sample_users)}),
+        ("api_keys: status update", "api_keys",
+         {"update": {"q": {"key_id": sample_key}, "u": {"$set": {"status": "active"}}}}),
+        ("support_tickets: open tickets page", "support_tickets", {"aggregate": open_tickets_pipeline()}),
+        ("support_tickets: aging buckets", "support_tickets", {"aggregate": ticket_aging_pipeline()}),
+        ("support_tickets: closed tickets page", "support_tickets",
+         {"find": {"status": "closed"}, "sort": dict(page_sort("closed_at", DESCENDING)), "limit": DEFAULT_PAGE_SIZE + 1}),
+        ("users: users page", "users", {"find": {}, "sort": dict(page_sort("user_id")), "limit": DEFAULT_PAGE_SIZE + 1}),
+        ("users: key generation user search", "users",
+         {"find": prefix_query("user_id", sample_users[0][:4]), "sort": dict(page_sort("user_id")), "limit": PICKER_PAGE_SIZE + 1}),
+    ]
+
+
+def _explain_command(collection_name, spec):
+    if "aggregate" in spec:
+        return {"aggregate": collection_name, "pipeline": spec["aggregate"], "cursor": {}}
+    if "update" in spec:
+        return {"update": collection_name, "updates": [spec["update"]]}
+    command = {"find": collection_name, "filter": spec["find"]}
+    if "sort" in spec:
+        command["sort"] = spec["sort"]
+    if "limit" in spec:
+        command["limit"] = spec["limit"]
+    return command
+
+
+def _find_sections(explain, key):
+    if isinstance(explain, dict):
+        if key in explain:
+            yield explain[key]
+        for value in explain.values():
+            yield from _find_sections(value, key)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _find_sections(item, key)
+
+
+def _plan_stages(plan):
+    stages = []
+    while isinstance(plan, dict):
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        if "inputStage" in plan:
+            plan = plan["inputStage"]
+        elif plan.get("inputStages"):
+            stages.extend(_plan_stages(plan["inputStages"][0]))
+            break
+        else:
+            break
+    return stages
+
+
+def explain_query(db, collection_name, spec):
+    explain = db.command("explain", _explain_command(collection_name, spec), verbosity="executionStats")
+    planners = list(_find_sections(explain, "queryPlanner"))
+    stats = list(_find_sections(explain, "executionStats"))
+    winning_plan = planners[0].get("winningPlan", {}) if planners else {}
+    stages = _plan_stages(winning_plan.get("queryPlan", winning_plan))
+    execution = stats[0] if stats else {}
+    return {
+        "plan": " <- ".join(stages),
+        "collection_scan": "COLLSCAN" in stages,
+        "returned": execution.get("nReturned"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "docs_examined": execution.get("totalDocsExamined"),
+        "millis": execution.get("executionTimeMillis"),
+    }
+
+
+def explain_app_queries(db):
+    report = []
+    for name, collection_name, spec in app_queries(db):
+        try:
+            result = explain_query(db, collection_name, spec)
+        except Exception as e:
+            result = {"error": str(e)}
+        report.append({"query": name, "collection": collection_name, **result})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create apiman indexes and report query plans.")
+    parser.add_argument("command", choices=["ensure", "explain"])
+    parser.add_argument("--json", action="store_true", help="Print the explain report as JSON.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    if args.command == "ensure":
+        for collection_name, names in ensure_indexes(db).items():
+            print(f"{collection_name}: {', '.join(names)}")
+        return
+
+    report = explain_app_queries(db)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+    for entry in report:
+        if "error" in entry:
+            print(f"{entry['query']}: ERROR {entry['error']}")
+            continue
+        flag = "COLLSCAN " if entry["collection_scan"] else ""
+        print(
+            f"{flag}{entry['query']}: {entry['plan']} | returned={entry['returned']} "
+            f"keys={entry['keys_examined']} docs={entry['docs_examined']} ms={entry['millis']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
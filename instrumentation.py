@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+METRIC_PREFIX = "apiman_dashboard"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class RenderMetrics:
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.sections = {}
+        self.cache_requests = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start_run(self):
+        self._local.timings = []
+        self._local.cache_events = []
+        self._local.started = time.perf_counter()
+
+    def run_seconds(self):
+        return time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+
+    def run_timings(self):
+        return list(getattr(self._local, "timings", []))
+
+    def run_cache_events(self):
+        return list(getattr(self._local, "cache_events", []))
+
+    def record_section(self, name, seconds):
+        with self._lock:
+            count, total, _ = self.sections.get(name, (0, 0.0, 0.0))
+            self.sections[name] = (count + 1, total + seconds, seconds)
+        if hasattr(self._local, "timings"):
+            self._local.timings.append((name, seconds))
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_section(name, time.perf_counter() - started)
+
+    def record_cache(self, function_name, hit):
+        result = "hit" if hit else "miss"
+        with self._lock:
+            key = (function_name, result)
+            self.cache_requests[key] = self.cache_requests.get(key, 0) + 1
+        if hasattr(self._local, "cache_events"):
+            self._local.cache_events.append((function_name, result))
+
+    def track_cache(self, cache_decorator):
+        # The cache only runs the wrapped body on a miss, so a flag set inside it tells the two apart.
+        def decorate(func):
+            state = threading.local()
+
+            @wraps(func)
+            def body(*args, **kwargs):
+                state.missed = True
+                return func(*args, **kwargs)
+
+            cached = cache_decorator(body)
+
+            @wraps(func)
+            def call(*args, **kwargs):
+                state.missed = False
+                started = time.perf_counter()
+                try:
+                    return cached(*args, **kwargs)
+                finally:
+                    self.record_cache(func.__name__, hit=not state.missed)
+                    self.record_section(f"cache: {func.__name__}", time.perf_counter() - started)
+
+            call.clear = getattr(cached, "clear", None)
+            return call
+        return decorate
+
+    def prometheus_text(self):
+        with self._lock:
+            sections = dict(self.sections)
+            cache_requests = dict(self.cache_requests)
+
+        lines = [
+            f"# HELP {self.prefix}_section_seconds Wall time spent rendering each dashboard section.",
+            f"# TYPE {self.prefix}_section_seconds summary",
+        ]
+        for name, (count, total, _) in sorted(sections.items()):
+            label = f"section=\"{_label_value(name)}\""
+            lines.append(f"{self.prefix}_section_seconds_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.prefix}_section_seconds_count{{{label}}} {count}")
+        lines += [
+            f"# HELP {self.prefix}_section_last_seconds Wall time of the most recent render of each section.",
+            f"# TYPE {self.prefix}_section_last_seconds gauge",
+        ]
+        for name, (_, _, last) in sorted(sections.items()):
+            lines.append(f"{self.prefix}_section_last_seconds{{section=\"{_label_value(name)}\"}} {last:.6f}")
+        lines += [
+            f"# HELP {self.prefix}_cache_requests_total Calls to st.cache_data functions by result.",
+            f"# TYPE {self.prefix}_cache_requests_total counter",
+        ]
+        for (function_name, result), count in sorted(cache_requests.items()):
+            lines.append(
+                f"{self.prefix}_cache_requests_total{{function=\"{_label_value(function_name)}\",result=\"{result}\"}} {count}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Write then rename, so a node_exporter textfile collector never reads a half-written file.
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
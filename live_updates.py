@@ -0,0 +1,211 @@
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import ConfigurationError, OperationFailure, PyMongoError
+
+from aggregations import LOG_DEFAULTS, build_match_stage, log_value
+from health import HealthMonitor, recent_logs_query
+from log_cache import WATERMARK_OVERLAP, overlap_floor
+
+DEFAULT_POLL_SECONDS = 5
+# Rescans every half overlap, so an insert up to half the overlap late is still above the floor.
+DEFAULT_RESCAN_SECONDS = WATERMARK_OVERLAP.total_seconds() / 2
+POLL_BATCH_SIZE = 10000
+WATCH_PIPELINE = [{"$match": {"operationType": "insert"}}]
+LIVE_PROJECTION = {"_id": 1, "api": 1, "timestamp": 1, "latency_ms": 1, "status_code": 1}
+
+
+def utc_day_start(now=None):
+    now = now or datetime.utcnow()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def today_seed_pipeline(day_start, up_to_id=None):
+    match = build_match_stage(day_start)["$match"]
+    if up_to_id is not None:
+        match["_id"] = {"$lte": up_to_id}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"api": "$api", "hour": {"$hour": "$timestamp"}},
+            "calls": {"$sum": 1},
+            "latency_sum": {"$sum": {"$ifNull": ["$latency_ms", LOG_DEFAULTS["latency_ms"]]}},
+            "errors": {"$sum": {"$cond": [{"$gte": [{"$ifNull": ["$status_code", LOG_DEFAULTS["status_code"]]}, 400]}, 1, 0]}},
+        }},
+    ]
+
+
+class LiveLogFeed:
+    def __init__(self, collection, poll_seconds=DEFAULT_POLL_SECONDS, rescan_seconds=DEFAULT_RESCAN_SECONDS):
+        self.collection = collection
+        self.poll_seconds = poll_seconds
+        self.rescan_seconds = rescan_seconds
+        self.mode = None
+        self.use_polling = not hasattr(type(collection), "watch")
+        self.counters = {}
+        self.day_start = None
+        self.seed_id = None
+        self.last_id = None
+        self.floor = None
+        self.seen_ids = set()
+        self.resume_token = None
+        self.events = 0
+        self.last_event_at = None
+        self.error = None
+        self.health = HealthMonitor()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="live-log-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _roll_day(self):
+        day_start = utc_day_start()
+        if self.day_start != day_start:
+            self.counters = {}
+            self.day_start = day_start
+
+    def _seed(self):
+        newest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        last_id = newest["_id"] if newest else None
+        day_start = utc_day_start()
+        counters = {}
+        for row in self.collection.aggregate(today_seed_pipeline(day_start, last_id)):
+            counters[(row["_id"]["api"], row["_id"]["hour"])] = [row["calls"], row["latency_sum"], row["errors"]]
+        self.health.reset()
+        self.health.add_many(self.collection.find(recent_logs_query(up_to_id=last_id), LIVE_PROJECTION))
+        floor = overlap_floor(last_id) if last_id is not None else None
+        seen_ids = set()
+        if last_id is not None:
+            seen_ids = {doc["_id"] for doc in self.collection.find({"_id": {"$gt": floor, "$lte": last_id}}, {"_id": 1})}
+        with self._lock:
+            self.counters, self.day_start = counters, day_start
+            self.seed_id = self.last_id = last_id
+            self.floor, self.seen_ids = floor, seen_ids
+
+    def _apply(self, docs, track=False):
+        with self._lock:
+            self._roll_day()
+            events = self.events
+            for doc in docs:
+                # Everything at or below the floor and every id seen above it is already counted.
+                # Polling re-reads the overlap above the floor, so it tracks what it applied.
+                if (self.floor is not None and doc["_id"] <= self.floor) or doc["_id"] in self.seen_ids:
+                    continue
+                if track:
+                    self.seen_ids.add(doc["_id"])
+                if self.last_id is None or doc["_id"] > self.last_id:
+                    self.last_id = doc["_id"]
+                self.events += 1
+                api = doc.get("api")
+                timestamp = doc.get("timestamp")
+                if api in (None, LOG_DEFAULTS["api"]) or not isinstance(timestamp, datetime):
+                    continue
+                self.health.add_many([doc])
+                if timestamp < self.day_start:
+                    continue
+                counter = self.counters.setdefault((api, timestamp.hour), [0, 0.0, 0])
+                counter[0] += 1
+                counter[1] += log_value(doc, "latency_ms")
+                counter[2] += log_value(doc, "status_code") >= 400
+            if self.events != events:
+                self.last_event_at = datetime.utcnow()
+
+    def _watch(self):
+        # The stream is opened before seeding so no insert falls between the two;
+        # _apply drops the ones the seed already counted.
+        with self.collection.watch(WATCH_PIPELINE, resume_after=self.resume_token, max_await_time_ms=1000) as stream:
+            if self.resume_token is None:
+                self._seed()
+            self.mode = "change_stream"
+            self.error = None
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                self.resume_token = stream.resume_token
+                if change is not None:
+                    self._apply([change["fullDocument"]])
+
+    def _poll(self, rescan=True):
+        # The change stream does not track seen ids, so falling back from it starts from a fresh seed.
+        if self.day_start is None or self.mode == "change_stream":
+            self._seed()
+        self.mode = "polling"
+        # Most polls only read above the watermark. A rescan starts at the overlap floor instead, so
+        # inserts that became visible late, with an _id under ones already read, are still picked
+        # up; seen_ids drops the repeats.
+        if rescan:
+            self._advance_floor()
+        after_id = self.floor if rescan else self.last_id
+        while True:
+            query = {} if after_id is None else {"_id": {"$gt": after_id}}
+            docs = list(self.collection.find(query, LIVE_PROJECTION).sort("_id", 1).limit(POLL_BATCH_SIZE))
+            self._apply(docs, track=True)
+            if len(docs) < POLL_BATCH_SIZE:
+                break
+            after_id = docs[-1]["_id"]
+        self.error = None
+
+    def _poll_loop(self):
+        next_rescan = time.monotonic()
+        while not self._stop.is_set():
+            rescan = time.monotonic() >= next_rescan
+            self._poll(rescan)
+            if rescan:
+                next_rescan = time.monotonic() + self.rescan_seconds
+            self._stop.wait(self.poll_seconds)
+
+    def _advance_floor(self):
+        with self._lock:
+            if self.last_id is None:
+                return
+            self.floor = overlap_floor(self.last_id)
+            self.seen_ids = {doc_id for doc_id in self.seen_ids if doc_id > self.floor}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.use_polling:
+                    self._poll_loop()
+                else:
+                    self._watch()
+            except (OperationFailure, ConfigurationError) as e:
+                self.error = str(e)
+                if not self.use_polling:
+                    # Standalone servers have no change streams; poll the _id watermark instead.
+                    # Polling runs in the try above so its own errors are retried like any other.
+                    self.use_polling = True
+                    continue
+                self._stop.wait(self.poll_seconds)
+            except PyMongoError as e:
+                self.error = str(e)
+                self._stop.wait(self.poll_seconds)
+            except Exception as e:
+                # Anything else (a malformed document, a bug in _apply) would end the thread silently
+                # and freeze the live view; surface it and keep retrying.
+                self.error = f"{type(e).__name__}: {e}"
+                self._stop.wait(self.poll_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            self._roll_day()
+            return {
+                "mode": self.mode,
+                "day_start": self.day_start,
+                "rows": [
+                    {"api": api, "hour": hour, "calls": calls, "latency_sum": latency_sum, "errors": errors}
+                    for (api, hour), (calls, latency_sum, errors) in self.counters.items()
+                ],
+                "events": self.events,
+                "last_event_at": self.last_event_at,
+                "error": self.error,
+            }
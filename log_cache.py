@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from aggregations import as_datetime
+from log_loader import DEFAULT_BATCH_SIZE, concat_log_frames, empty_log_frame, load_log_frame
+
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
+def overlap_floor(object_id, overlap=WATERMARK_OVERLAP):
+    # ObjectIds come from client clocks and parallel writers, so an _id below the watermark can still
+    # become visible after the watermark was read. Deltas re-read everything above this floor.
+    return ObjectId.from_datetime(object_id.generation_time - overlap)
+
+
+class IncrementalLogCache:
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.frame = None
+        self.window_start = None
+        self.window_end = None
+        self.last_id = None
+        self.seen_ids = set()
+        self.last_refresh = None
+        self.last_delta_rows = 0
+        self._lock = threading.Lock()
+
+    def _load(self, query):
+        return load_log_frame(self.collection, query, batch_size=self.batch_size, compact=True)
+
+    def _current_watermark(self):
+        newest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return newest["_id"] if newest else None
+
+    def _range_query(self, start, end, up_to_id):
+        query = {"timestamp": {"$gte": start, "$lte": end}}
+        if up_to_id is not None:
+            query["_id"] = {"$lte": up_to_id}
+        return query
+
+    def _window_ids(self, start, end, floor, up_to_id):
+        query = {"timestamp": {"$gte": start, "$lte": end}, "_id": {"$gt": floor, "$lte": up_to_id}}
+        return [doc["_id"] for doc in self.collection.find(query, {"_id": 1})]
+
+    def _load_ids(self, ids):
+        # The overlap is loaded by the exact id list that becomes seen_ids, so a document that turns
+        # visible between the two queries is neither dropped nor loaded twice.
+        frames = [self._load({"_id": {"$in": ids[i:i + self.batch_size]}}) for i in range(0, len(ids), self.batch_size)]
+        return concat_log_frames(frames) if frames else empty_log_frame(compact=True)
+
+    def _reload(self, start, end):
+        watermark = self._current_watermark()
+        if watermark is None:
+            self.frame, window_ids = self._load(self._range_query(start, end, None)), []
+        else:
+            floor = overlap_floor(watermark)
+            window_ids = self._window_ids(start, end, floor, watermark)
+            self.frame = concat_log_frames([self._load(self._range_query(start, end, floor)), self._load_ids(window_ids)])
+        self.window_start, self.window_end = start, end
+        self.last_id = watermark
+        self.seen_ids = set(window_ids)
+        self.last_delta_rows = len(self.frame)
+
+    def _refresh(self, start, end):
+        watermark = self._current_watermark()
+        if watermark is None or watermark < self.last_id:
+            self._reload(start, end)
+            return
+        frames = [self.frame]
+        floor = overlap_floor(self.last_id)
+
+        # Time ranges that are new to the window only need documents below the overlap floor;
+        # anything above it is picked up with the overlap below.
+        if start < self.window_start:
+            frames.append(self._load(self._range_query(start, self.window_start, floor)))
+            frames[-1] = frames[-1][frames[-1]["timestamp"] < self.window_start]
+        if end > self.window_end:
+            frames.append(self._load(self._range_query(self.window_end, end, floor)))
+            frames[-1] = frames[-1][frames[-1]["timestamp"] > self.window_end]
+
+        # Everything above the floor that is not loaded yet: inserts since the last refresh plus
+        # late-visible documents whose _id sorts below the previous watermark.
+        window_ids = self._window_ids(start, end, floor, watermark)
+        frames.append(self._load_ids([doc_id for doc_id in window_ids if doc_id not in self.seen_ids]))
+
+        self.last_delta_rows = sum(len(frame) for frame in frames[1:])
+        df = concat_log_frames(frames)
+        if start > self.window_start or end < self.window_end:
+            df = df[(df["timestamp"] >= start) & (df["timestamp"] <= end)].reset_index(drop=True)
+            for column in df.select_dtypes("category").columns:
+                df[column] = df[column].cat.remove_unused_categories()
+
+        self.frame = df
+        self.window_start, self.window_end = start, end
+        self.last_id = watermark
+        next_floor = overlap_floor(watermark)
+        self.seen_ids = {doc_id for doc_id in window_ids if doc_id > next_floor}
+
+    def get(self, start_date=None, end_date=None):
+        start = as_datetime(start_date) if start_date else datetime.min
+        end = as_datetime(end_date, end_of_day=True) if end_date else datetime.max
+        with self._lock:
+            if self.frame is None or self.last_id is None:
+                self._reload(start, end)
+            else:
+                self._refresh(start, end)
+            self.last_refresh = datetime.utcnow()
+            return self.frame
+
+    def stats(self):
+        return {
+            "rows": 0 if self.frame is None else len(self.frame),
+            "last_delta_rows": self.last_delta_rows,
+            "last_id": str(self.last_id) if self.last_id is not None else None,
+            "last_refresh": self.last_refresh,
+        }
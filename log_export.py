@@ -0,0 +1,116 @@
+import argparse
+import gzip
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient
+
+from aggregations import build_log_query
+from log_loader import DEFAULT_BATCH_SIZE, LOG_COLUMNS, decode_log_batch
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = {"csv": "text/csv", "csv.gz": "application/gzip", "parquet": "application/octet-stream"}
+STATUS_CLASSES = {"2xx": (200, 300), "3xx": (300, 400), "4xx": (400, 500), "5xx": (500, 600)}
+DEFAULT_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "apiman_exports")
+
+
+def export_query(start_date=None, end_date=None, api_name=None, user_id=None, status=None):
+    # status is an exact code (404) or a class ("5xx").
+    query = build_log_query(start_date, end_date)
+    if api_name:
+        query["api"] = api_name
+    if user_id:
+        query["user_id"] = user_id
+    if status in STATUS_CLASSES:
+        low, high = STATUS_CLASSES[status]
+        query["status_code"] = {"$gte": low, "$lt": high}
+    elif status:
+        query["status_code"] = int(status)
+    return query
+
+
+def export_format(path):
+    for name in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if path.endswith("." + name):
+            return name
+    raise ValueError(f"Unsupported export file type: {path}")
+
+
+def iter_log_batches(collection, query, batch_size=DEFAULT_BATCH_SIZE, columns=LOG_COLUMNS):
+    # Only one raw cursor batch and its decoded frame are alive at a time. Fields missing from a
+    # stored log stay empty rather than taking the dashboard's LOG_DEFAULTS.
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    for raw_batch in collection.find_raw_batches(query, projection, batch_size=batch_size, sort=[("timestamp", ASCENDING)]):
+        yield decode_log_batch(raw_batch, columns, fill_defaults=False)
+
+
+def parquet_schema(columns=LOG_COLUMNS):
+    types = {
+        "timestamp": pyarrow.timestamp("ms"),
+        "status_code": pyarrow.int64(),
+        "latency_ms": pyarrow.float64(),
+    }
+    return pyarrow.schema([(column, types.get(column, pyarrow.string())) for column in columns])
+
+
+def write_log_export(collection, query, path, batch_size=DEFAULT_BATCH_SIZE, columns=LOG_COLUMNS):
+    # Streams the cursor into the file batch by batch: CSV chunks are appended, Parquet gets one
+    # row group per batch. Returns the number of rows written.
+    file_format = export_format(path)
+    if file_format == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow installed.")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    rows = 0
+    batches = iter_log_batches(collection, query, batch_size, columns)
+    if file_format == "parquet":
+        schema = parquet_schema(columns)
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for batch in batches:
+                writer.write_table(pyarrow.Table.from_pandas(batch, schema=schema, preserve_index=False))
+                rows += len(batch)
+        return rows
+
+    opener = gzip.open if file_format == "csv.gz" else open
+    with opener(path, "wt", newline="") as handle:
+        handle.write(",".join(columns) + "\n")
+        for batch in batches:
+            batch.to_csv(handle, header=False, index=False)
+            rows += len(batch)
+    return rows
+
+
+def export_path(file_format, export_dir=DEFAULT_EXPORT_DIR, prefix="api_usage_logs"):
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    return os.path.join(export_dir, f"{prefix}_{stamp}_{uuid.uuid4().hex[:8]}.{file_format}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export raw api_usage_logs to CSV or Parquet without loading them into memory.")
+    parser.add_argument("output", help="Destination path ending in .csv, .csv.gz or .parquet.")
+    parser.add_argument("--start", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), default=None)
+    parser.add_argument("--end", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), default=None)
+    parser.add_argument("--api", default=None)
+    parser.add_argument("--user", default=None)
+    parser.add_argument("--status", default=None, help="Exact status code or class such as 5xx.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    query = export_query(args.start, args.end, args.api, args.user, args.status)
+    rows = write_log_export(db["api_usage_logs"], query, args.output, args.batch_size)
+    print(f"Wrote {rows:,} logs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
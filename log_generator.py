@@ -0,0 +1,147 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from api_configs import API_CONFIGS
+from rollups import backfill_rollups, record_logs
+
+COUNTRIES = ["USA", "Germany", "India", "Brazil", "Japan", "UK", "Canada", "Australia", "France", "China", "Mexico"]
+ERROR_STATUS_CODES = np.array([400, 401, 404, 500], dtype=np.int16)
+ERROR_STATUS_WEIGHTS = np.array([5, 2, 3, 5], dtype=np.float64) / 15
+MIN_LATENCY_MS = 10.0
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def _api_tables(api_configs):
+    apis = list(api_configs.keys())
+    quotas = np.array([api_configs[api].get("quota_daily", 1000) for api in apis], dtype=np.float64)
+    endpoints = [api_configs[api].get("endpoints", ["/default"]) for api in apis]
+    endpoint_counts = np.array([len(names) for names in endpoints])
+    return {
+        "apis": np.array(apis, dtype=object),
+        "weights": quotas / quotas.sum(),
+        "versions": np.array([api_configs[api].get("latest_version", "v1.0") for api in apis], dtype=object),
+        "endpoint_names": np.array([name for names in endpoints for name in names], dtype=object),
+        "endpoint_offsets": np.concatenate([[0], np.cumsum(endpoint_counts)[:-1]]),
+        "endpoint_counts": endpoint_counts,
+        "base_latency": np.array([api_configs[api].get("base_latency_ms", 50) for api in apis], dtype=np.float64),
+        "latency_variation": np.array([api_configs[api].get("latency_variation", 20) for api in apis], dtype=np.float64),
+        "error_rate": np.array([api_configs[api].get("base_error_rate_percent", 0.5) for api in apis]) / 100,
+        "error_variation": np.array([api_configs[api].get("error_rate_variation", 0.5) for api in apis]) / 100,
+    }
+
+
+def generate_log_columns(size, seed=None, start_time=None, end_time=None, num_users=20, api_configs=API_CONFIGS):
+    rng = np.random.default_rng(seed)
+    tables = _api_tables(api_configs)
+    end_time = end_time or datetime.utcnow()
+    start_time = start_time or end_time - timedelta(days=90)
+
+    start_ms = np.datetime64(start_time, "ms").astype(np.int64)
+    span_ms = np.datetime64(end_time, "ms").astype(np.int64) - start_ms
+    timestamps = np.sort(start_ms + (rng.random(size) * span_ms).astype(np.int64)).astype("datetime64[ms]")
+
+    api_idx = rng.choice(len(tables["apis"]), size=size, p=tables["weights"])
+    endpoint_idx = tables["endpoint_offsets"][api_idx] + (rng.random(size) * tables["endpoint_counts"][api_idx]).astype(np.int64)
+
+    user_ranks = np.arange(1, num_users + 1, dtype=np.float64)
+    user_weights = 1 / user_ranks ** 1.1
+    user_idx = rng.choice(num_users, size=size, p=user_weights / user_weights.sum())
+    user_names = np.array([f"user_{i}" for i in range(1, num_users + 1)], dtype=object)
+
+    # Lognormal latency with the configured base as the mean and the variation as the spread.
+    base = tables["base_latency"][api_idx]
+    sigma = np.sqrt(np.log1p((tables["latency_variation"][api_idx] / base) ** 2))
+    latency = np.maximum(MIN_LATENCY_MS, base * np.exp(rng.standard_normal(size) * sigma - sigma ** 2 / 2))
+
+    error_rate = tables["error_rate"][api_idx] + (rng.random(size) * 2 - 1) * tables["error_variation"][api_idx]
+    is_error = rng.random(size) < np.clip(error_rate, 0, 1)
+    status_codes = np.full(size, 200, dtype=np.int16)
+    status_codes[is_error] = rng.choice(ERROR_STATUS_CODES, size=int(is_error.sum()), p=ERROR_STATUS_WEIGHTS)
+
+    return {
+        "api": tables["apis"][api_idx],
+        "timestamp": timestamps,
+        "user_id": user_names[user_idx],
+        "status_code": status_codes,
+        "country": np.array(COUNTRIES, dtype=object)[rng.integers(len(COUNTRIES), size=size)],
+        "api_version": tables["versions"][api_idx],
+        "endpoint": tables["endpoint_names"][endpoint_idx],
+        "latency_ms": latency,
+    }
+
+
+def columns_to_documents(columns):
+    names = list(columns.keys())
+    values = [columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def _chunk_plan(size, chunk_size, start_time, end_time, seed):
+    num_chunks = max(1, -(-size // chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    # Each chunk covers a share of the time range proportional to its rows, so a short last chunk
+    # does not thin out the end of the range.
+    span = end_time - start_time
+    plan = []
+    for i in range(num_chunks):
+        first, last = i * chunk_size, min((i + 1) * chunk_size, size)
+        plan.append((last - first, seeds[i], start_time + span * first / max(size, 1), start_time + span * last / max(size, 1)))
+    return plan
+
+
+def insert_dummy_logs(db, size, seed=None, days=90, chunk_size=DEFAULT_CHUNK_SIZE, workers=4, rollups="incremental", num_users=20):
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=days)
+    collection = db["api_usage_logs"]
+
+    def write_chunk(rows, chunk_seed, chunk_start, chunk_end):
+        columns = generate_log_columns(rows, chunk_seed, chunk_start, chunk_end, num_users=num_users)
+        docs = columns_to_documents(columns)
+        if rollups == "incremental":
+            record_logs(db, docs)
+        else:
+            collection.insert_many(docs, ordered=False)
+        return rows
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_chunk, *chunk) for chunk in _chunk_plan(size, chunk_size, start_time, end_time, seed)]
+        inserted = sum(future.result() for future in futures)
+
+    if rollups == "backfill":
+        # A full rebuild: a date-bounded one leaves logs above the sync watermark to sync_rollups.
+        backfill_rollups(db)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-generate synthetic api_usage_logs.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rollups", choices=["incremental", "backfill", "none"], default="backfill")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    started = time.perf_counter()
+    inserted = insert_dummy_logs(
+        db, args.rows, seed=args.seed, days=args.days, chunk_size=args.chunk_size,
+        workers=args.workers, rollups=args.rollups, num_users=args.users,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"Inserted {inserted:,} logs in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
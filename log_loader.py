@@ -0,0 +1,165 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from bson import decode_all
+from pandas.api.types import union_categoricals
+
+from aggregations import LOG_DEFAULTS
+
+try:
+    import pyarrow.compute as pc
+    from pymongoarrow.api import Schema
+    from pymongoarrow.context import PyMongoArrowContext
+except ImportError:
+    pc = None
+    Schema = None
+    PyMongoArrowContext = None
+
+LOG_COLUMNS = ["api", "timestamp", "user_id", "status_code", "country", "api_version", "endpoint", "latency_ms"]
+LOG_PROJECTION = {"_id": 0, **{column: 1 for column in LOG_COLUMNS}}
+LOG_COLUMN_DTYPES = {
+    "api": object,
+    "timestamp": "datetime64[ns]",
+    "user_id": object,
+    "status_code": np.int64,
+    "country": object,
+    "api_version": object,
+    "endpoint": object,
+    "latency_ms": np.float64,
+}
+LOG_COMPACT_DTYPES = {
+    "api": "category",
+    "timestamp": "datetime64[ns]",
+    "user_id": "category",
+    "status_code": np.int16,
+    "country": "category",
+    "api_version": "category",
+    "endpoint": "category",
+    "latency_ms": np.float32,
+}
+# Dtypes that keep missing values missing, for output that must show what is stored.
+LOG_RAW_DTYPES = {**LOG_COLUMN_DTYPES, "status_code": "Int64"}
+LOG_ARROW_TYPES = {
+    "api": str,
+    "timestamp": datetime,
+    "user_id": str,
+    "status_code": int,
+    "country": str,
+    "api_version": str,
+    "endpoint": str,
+    "latency_ms": float,
+}
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _arrow_column(table, column, compact, fill_defaults=True):
+    # Arrow columns become typed numpy arrays (or categoricals) without boxing rows into Python objects.
+    values = table.column(column)
+    if column != "timestamp" and values.null_count:
+        if not fill_defaults:
+            return values.to_pandas().astype(LOG_RAW_DTYPES[column]).array
+        values = pc.fill_null(values, LOG_DEFAULTS[column])
+    if compact and LOG_COMPACT_DTYPES[column] == "category":
+        encoded = values.combine_chunks().dictionary_encode()
+        return pd.Categorical.from_codes(encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary.to_pylist())
+    dtype = LOG_COMPACT_DTYPES[column] if compact else LOG_COLUMN_DTYPES[column]
+    return values.to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+
+
+def _decode_with_arrow(raw_batches, columns, compact, fill_defaults):
+    # libbson walks the raw cursor batches straight into Arrow builders, one per column.
+    context = PyMongoArrowContext(Schema({column: LOG_ARROW_TYPES[column] for column in columns}))
+    for raw_batch in raw_batches:
+        context.process_bson_stream(raw_batch)
+    table = context.finish()
+    return pd.DataFrame({column: _arrow_column(table, column, compact, fill_defaults) for column in columns})
+
+
+def _decode_with_dicts(raw_batches, columns, compact, fill_defaults):
+    # Fallback without pymongoarrow: pandas' C dict-to-column conversion, one batch at a time.
+    chunks = {column: [] for column in columns}
+    for raw_batch in raw_batches:
+        batch = pd.DataFrame(decode_all(raw_batch), columns=columns)
+        for column in columns:
+            values = batch[column]
+            if not fill_defaults:
+                chunks[column].append(values.astype(LOG_RAW_DTYPES[column]).array)
+                continue
+            if column != "timestamp" and values.isna().any():
+                values = values.fillna(LOG_DEFAULTS[column])
+            values = values.to_numpy().astype(LOG_COLUMN_DTYPES[column], copy=False)
+            chunks[column].append(_compact_column(values, column) if compact else values)
+    if not chunks[columns[0]]:
+        return empty_log_frame(columns, compact)
+    return pd.DataFrame({column: _concat_column(chunks[column], column) for column in columns})
+
+
+def decode_log_batches(raw_batches, columns=LOG_COLUMNS, compact=False, use_arrow=True, fill_defaults=True):
+    # fill_defaults=False leaves missing fields empty instead of substituting LOG_DEFAULTS.
+    if use_arrow and PyMongoArrowContext is not None:
+        return _decode_with_arrow(raw_batches, columns, compact, fill_defaults)
+    return _decode_with_dicts(raw_batches, columns, compact, fill_defaults)
+
+
+def decode_log_batch(raw_batch, columns=LOG_COLUMNS, use_arrow=True, fill_defaults=True):
+    return decode_log_batches([raw_batch], columns, use_arrow=use_arrow, fill_defaults=fill_defaults)
+
+
+def _compact_column(values, column):
+    dtype = LOG_COMPACT_DTYPES[column]
+    if dtype == "category":
+        return pd.Categorical(values)
+    return values.astype(dtype, copy=False)
+
+
+def _concat_column(chunks, column):
+    if LOG_COMPACT_DTYPES[column] == "category" and isinstance(chunks[0], pd.Categorical):
+        return union_categoricals(chunks)
+    if isinstance(chunks[0], pd.api.extensions.ExtensionArray):
+        return pd.concat([pd.Series(chunk) for chunk in chunks], ignore_index=True).array
+    return np.concatenate(chunks)
+
+
+def compact_log_frame(df):
+    for column in df.columns:
+        if column in LOG_COMPACT_DTYPES and df[column].dtype != LOG_COMPACT_DTYPES[column]:
+            df[column] = df[column].astype(LOG_COMPACT_DTYPES[column])
+    return df
+
+
+def empty_log_frame(columns=LOG_COLUMNS, compact=False):
+    df = pd.DataFrame({column: np.array([], dtype=LOG_COLUMN_DTYPES[column]) for column in columns})
+    return compact_log_frame(df) if compact else df
+
+
+def load_log_frame(collection, query=None, batch_size=DEFAULT_BATCH_SIZE, columns=LOG_COLUMNS, use_arrow=True, compact=False):
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    raw_batches = collection.find_raw_batches(query or {}, projection, batch_size=batch_size)
+    return decode_log_batches(raw_batches, columns, compact, use_arrow)
+
+
+def concat_log_frames(frames):
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    combined = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            combined[column] = union_categoricals([frame[column] for frame in frames])
+        else:
+            combined[column] = np.concatenate([frame[column].to_numpy() for frame in frames])
+    return pd.DataFrame(combined)
+
+
+def log_frame_memory_report(df):
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "Column": usage.index,
+        "Dtype": [str(df[column].dtype) for column in usage.index],
+        "MB": (usage.values / 1024 ** 2).round(3),
+        "Bytes/Row": (usage.values / max(len(df), 1)).round(1),
+    })
+    total = pd.DataFrame({"Column": ["Total"], "Dtype": [""], "MB": [round(usage.sum() / 1024 ** 2, 3)],
+                          "Bytes/Row": [round(usage.sum() / max(len(df), 1), 1)]})
+    return pd.concat([report, total], ignore_index=True)
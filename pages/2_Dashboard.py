@@ -2,16 +2,59 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from pymongo import MongoClient
+from pymongo import DESCENDING, MongoClient
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 import numpy as np
 import uuid
+import time
+
+from anomalies import detection_start, load_anomalies
+from api_configs import API_CONFIGS
+from api_keys import load_keys_by_user
+from indexes import ensure_indexes
+from instrumentation import RenderMetrics
+from billing import generate_invoices, load_invoices
+from forecasting import FORECAST_HISTORY_DAYS, effective_unit_costs, forecast_usage, month_end_projection, quota_exhaustion
+from health import HEALTH_WINDOWS, STATUS_WINDOW
+from live_updates import LiveLogFeed
+from log_cache import IncrementalLogCache
+from log_generator import insert_dummy_logs
+from log_export import DEFAULT_EXPORT_DIR, EXPORT_FORMATS, STATUS_CLASSES, export_path, export_query, write_log_export
+from log_loader import DEFAULT_BATCH_SIZE, log_frame_memory_report
+from pagination import DEFAULT_PAGE_SIZE, PAGE_SIZE_OPTIONS, PICKER_PAGE_SIZE, fetch_page, prefix_query
+from sketches import PERCENTILES, distinct_counts, latency_percentiles
+from tickets import (
+    aging_bucket, apply_ticket_action, apply_ticket_action_locally, open_tickets_page, ticket_aging_counts,
+)
+from aggregations import aggregate_api_totals, aggregate_daily_usage, aggregate_endpoint_daily_usage, aggregate_top_values
+from pricing import price_usage
+from usage_metrics import daily_usage_for_api, summarize_usage_frame
+from quotas import QUOTA_COLLECTION, key_usage_today, usage_today
+from rate_limits import peak_rps
+from rollups import (
+    ROLLUP_COLLECTIONS, backfill_rollups,
+    rollup_api_totals, rollup_daily_usage, rollup_endpoint_daily_usage, rollup_month_prefix_calls, rollup_top_values,
+)
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 load_dotenv()
 
 mongo_uri = os.getenv("MONGODB_URI")
+log_batch_size = int(os.getenv("LOG_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+metrics_file = os.getenv("DASHBOARD_METRICS_FILE", "dashboard_metrics.prom")
+debug_timings_default = os.getenv("DASHBOARD_DEBUG", "").lower() in ("1", "true", "yes")
+lazy_tabs_default = os.getenv("DASHBOARD_LAZY_TABS", "1").lower() in ("1", "true", "yes")
+ticket_view_ttl = int(os.getenv("TICKET_VIEW_TTL", 60))
+live_refresh_seconds = int(os.getenv("LIVE_REFRESH_SECONDS", 5))
+log_export_dir = os.getenv("LOG_EXPORT_DIR", DEFAULT_EXPORT_DIR)
+# Downloads are read into the server process, so only small exports are served from the page.
+log_export_download_limit_mb = int(os.getenv("LOG_EXPORT_DOWNLOAD_LIMIT_MB", 25))
 
 try:
     client = MongoClient(mongo_uri)
@@ -27,141 +70,42 @@ except Exception as e:
 
 st.set_page_config(layout="wide", page_title="API Admin Dashboard", initial_sidebar_state="collapsed")
 
-API_CONFIGS = {
-    "Image API": {
-        "cost_per_call": 0.001,
-        "quota_daily": 10000,
-        "rate_limit_per_second": 10,
-        "base_latency_ms": 50,
-        "latency_variation": 20,
-        "base_error_rate_percent": 0.5,
-        "error_rate_variation": 0.5,
-        "documentation_url": "https://www.apihub.digital/dashboard/Imageapi",
-        "latest_version": "v2.1",
-        "endpoints": ["/process", "/info", "/status"]
-    },
-    "Video API": {
-        "cost_per_call": 0.002,
-        "quota_daily": 5000,
-        "rate_limit_per_second": 5,
-        "base_latency_ms": 80,
-        "latency_variation": 30,
-        "base_error_rate_percent": 1.2,
-        "error_rate_variation": 1.0,
-        "documentation_url": "https://www.apihub.digital/dashboard/videoapi",
-        "latest_version": "v1.5",
-        "endpoints": ["/stream", "/upload", "/metadata"]
-    },
-    "Weather API": {
-        "cost_per_call": 0.0005,
-        "quota_daily": 20000,
-        "rate_limit_per_second": 20,
-        "base_latency_ms": 30,
-        "latency_variation": 10,
-        "base_error_rate_percent": 0.1,
-        "error_rate_variation": 0.1,
-        "documentation_url": "https://www.apihub.digital/dashboard/weatherapi",
-        "latest_version": "v3.0",
-        "endpoints": ["/current", "/forecast", "/historical"]
-    },
-    "Ecommerce API": {
-        "cost_per_call": 0.0007,
-        "quota_daily": 15000,
-        "rate_limit_per_second": 15,
-        "base_latency_ms": 60,
-        "latency_variation": 25,
-        "base_error_rate_percent": 0.8,
-        "error_rate_variation": 0.7,
-        "documentation_url": "https://www.apihub.digital/dashboard/ecommerceapi",
-        "latest_version": "v2.3",
-        "endpoints": ["/products", "/orders", "/users", "/checkout"]
-    },
-    "QR Code API": {
-        "cost_per_call": 0.0012,
-        "quota_daily": 8000,
-        "rate_limit_per_second": 8,
-        "base_latency_ms": 45,
-        "latency_variation": 15,
-        "base_error_rate_percent": 0.3,
-        "error_rate_variation": 0.3,
-        "documentation_url": "https://www.apihub.digital/dashboard/Qrcodeapi",
-        "latest_version": "v1.2",
-        "endpoints": ["/generate", "/decode"]
-    },
-    "Profile Photo API": {
-        "cost_per_call": 0.0014,
-        "quota_daily": 7000,
-        "rate_limit_per_second": 7,
-        "base_latency_ms": 70,
-        "latency_variation": 28,
-        "base_error_rate_percent": 0.6,
-        "error_rate_variation": 0.6,
-        "documentation_url": "https://www.apihub.digital/dashboard/profilepic",
-        "latest_version": "v2.0",
-        "endpoints": ["/upload", "/crop", "/filter"]
-    },
-    "Jokes API": {
-        "cost_per_call": 0.0004,
-        "quota_daily": 25000,
-        "rate_limit_per_second": 25,
-        "base_latency_ms": 25,
-        "latency_variation": 10,
-        "base_error_rate_percent": 0.05,
-        "error_rate_variation": 0.05,
-        "documentation_url": "https://www.apihub.digital/dashboard/jokesapi",
-        "latest_version": "v1.0",
-        "endpoints": ["/random", "/category", "/search"]
-    }
-}
-
-@st.cache_data(ttl=3600)
-def generate_dummy_log_data(num_entries=50000):
-    
-    apis = list(API_CONFIGS.keys())
-    users = ["user_" + str(i) for i in range(1, 21)]
-    status_codes = [200] * 50 + [400] * 5 + [401] * 2 + [404] * 3 + [500] * 5
-    countries = ["USA", "Germany", "India", "Brazil", "Japan", "UK", "Canada", "Australia", "France", "China", "Mexico"]
-
-    log_entries = []
-    end_time = datetime.utcnow()
-    start_time = end_time - timedelta(days=90)
-
-    for _ in range(num_entries):
-        api = str(np.random.choice(apis))
-        user_id = str(np.random.choice(users))
-        timestamp = start_time + (end_time - start_time) * np.random.rand()
-        status_code = int(np.random.choice(status_codes)) 
-        country = str(np.random.choice(countries))
-        
-        api_config = API_CONFIGS.get(api, {})
-        api_version = api_config.get("latest_version", "v1.0")
-        endpoint = str(np.random.choice(api_config.get("endpoints", ["/default"])))
-        
-        base_latency = api_config.get("base_latency_ms", 50)
-        latency_variation = api_config.get("latency_variation", 20)
-        latency = float(max(10, base_latency + (np.random.rand() * 2 - 1) * latency_variation))
-
-        log_entries.append({
-            "api": api,
-            "timestamp": timestamp,
-            "user_id": user_id,
-            "status_code": status_code,
-            "country": country,
-            "api_version": api_version,
-            "endpoint": endpoint,
-            "latency_ms": latency
-        })
-    return log_entries
-
-if logs_collection.count_documents({}) == 0:
+
+@st.cache_resource
+def get_render_metrics():
+    return RenderMetrics()
+
+render_metrics = get_render_metrics()
+render_metrics.start_run()
+
+@st.cache_resource
+def bootstrap_indexes():
+    return ensure_indexes(db)
+
+try:
+    bootstrap_indexes()
+except Exception as e:
+    st.warning(f"Could not create MongoDB indexes: {e}")
+
+if logs_collection.estimated_document_count() == 0:
     st.info("No logs found. Generating dummy data...")
-    dummy_logs = generate_dummy_log_data(50000)
-    logs_collection.insert_many(dummy_logs)
+    insert_dummy_logs(db, 50000)
     st.success("Dummy log data generated!")
     st.cache_data.clear()
     st.rerun()
 
-if users_collection.count_documents({}) == 0:
+# Logs from writers that bypass record_logs reach the rollups, sketches and quota counters through
+# `python rollups.py sync` on a schedule; the page only builds them once for an empty database. The session flag stops a rebuild
+# that writes no buckets from rerunning forever.
+if db[ROLLUP_COLLECTIONS["day"]].estimated_document_count() == 0 and not st.session_state.get("rollups_bootstrapped"):
+    st.info("No usage rollups found. Building them from existing logs...")
+    backfill_rollups(db)
+    st.session_state["rollups_bootstrapped"] = True
+    st.success("Usage rollups built!")
+    st.cache_data.clear()
+    st.rerun()
+
+if users_collection.estimated_document_count() == 0:
     st.info("No users found. Generating dummy users...")
     dummy_users = [{"user_id": f"user_{i}", "email": f"user{i}@example.com", "role": "developer", "last_login": datetime.utcnow().isoformat()} for i in range(1, 21)]
     users_collection.insert_many(dummy_users)
@@ -169,106 +113,114 @@ if users_collection.count_documents({}) == 0:
     st.cache_data.clear()
     st.rerun()
 
-@st.cache_data(ttl=600)
-def get_api_logs(start_date=None, end_date=None):
-    query = {}
-    if start_date:
-        query["timestamp"] = {"$gte": datetime.combine(start_date, datetime.min.time())}
-    if end_date:
-        if "timestamp" not in query:
-            query["timestamp"] = {}
-        query["timestamp"]["$lte"] = datetime.combine(end_date, datetime.max.time())
-            
-    logs = list(logs_collection.find(query))
-    df = pd.DataFrame(logs)
-    if 'timestamp' in df.columns and not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-    else:
-        df['timestamp'] = pd.to_datetime([])
-        
-    expected_cols = ["api", "timestamp", "user_id", "status_code", "country", "api_version", "endpoint", "latency_ms"]
-    for col in expected_cols:
-        if col not in df.columns:
-            if col == 'api': df[col] = "unknown_api"
-            elif col == 'user_id': df[col] = "unknown_user"
-            elif col == 'status_code': df[col] = 200
-            elif col == 'country': df[col] = "Unknown"
-            elif col == 'api_version': df[col] = "v1.0"
-            elif col == 'endpoint': df[col] = "/default"
-            elif col == 'latency_ms': df[col] = 50.0
-            else: df[col] = None
-    
-    return df.copy()
-
-def calculate_daily_usage(df, api_name=None, start_date=None, end_date=None):
-    if df.empty:
-        end_date_default = end_date if end_date else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        start_date_default = start_date if start_date else end_date_default - timedelta(days=29)
-        all_dates = pd.date_range(start=start_date_default, end=end_date_default, freq='D')
-        
-        dummy_counts = []
-        base_value = API_CONFIGS.get(api_name, {}).get("quota_daily", 1000) / 10 if api_name else 500
-        if base_value == 0: base_value = 100
-        
-        for day_idx in range(len(all_dates)):
-            trend_factor = np.sin(day_idx / 5) * (base_value / 2)
-            random_noise = np.random.normal(0, base_value / 4)
-            count = max(0, int(base_value + trend_factor + random_noise))
-            dummy_counts.append(count)
-            
-        return pd.DataFrame({"Date": all_dates, "Count": dummy_counts})
-
-    df_filtered = df
-    if api_name:
-        df_filtered = df_filtered[df_filtered["api"] == api_name]
-    
-    df_daily = df_filtered.groupby(pd.Grouper(key="timestamp", freq="D")).size().reset_index(name="Count")
-    df_daily.columns = ["Date", "Count"]
-
-    end_date_range = df_daily['Date'].max() if not df_daily.empty else datetime.utcnow()
-    start_date_range = df_daily['Date'].min() if not df_daily.empty else end_date_range - timedelta(days=29)
-    
-    if start_date and end_date:
-        start_date_range = datetime.combine(start_date, datetime.min.time())
-        end_date_range = datetime.combine(end_date, datetime.max.time())
-        
-    all_dates = pd.date_range(start=start_date_range, end=end_date_range, freq='D')
-    full_df = pd.DataFrame(all_dates, columns=["Date"])
-    
-    daily_usage = pd.merge(full_df, df_daily, on="Date", how="left").fillna(0)
-    return daily_usage
+@st.cache_resource
+def get_live_feed():
+    return LiveLogFeed(logs_collection, poll_seconds=live_refresh_seconds)
 
-def calculate_current_daily_usage(df, api_name):
-    if 'api' not in df.columns or df.empty:
-        return 0
+def get_log_cache():
+    # One cache per browser session: a range change or day rollover slides that session's window
+    # incrementally, and sessions on different ranges do not evict each other's rows.
+    if "log_cache" not in st.session_state:
+        st.session_state["log_cache"] = IncrementalLogCache(logs_collection, batch_size=log_batch_size)
+    return st.session_state["log_cache"]
 
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    current_day_usage = df[(df["api"] == api_name) & (df["timestamp"] >= today_start)].shape[0]
-    return current_day_usage
-
-def get_api_health(api_name):
-    config = API_CONFIGS.get(api_name, {})
-    
-    base_latency = config.get("base_latency_ms", 50)
-    latency_variation = config.get("latency_variation", 20)
-    base_error_rate = config.get("base_error_rate_percent", 0.5)
-    error_rate_variation = config.get("error_rate_variation", 0.5)
-
-    latency_rand = base_latency + (np.random.rand() * 2 - 1) * latency_variation
-    latency_rand = max(10.0, latency_rand)
-
-    error_rate_rand = base_error_rate + (np.random.rand() * 2 - 1) * error_rate_variation
-    error_rate_rand = max(0.01, error_rate_rand) 
+def get_api_logs(start_date=None, end_date=None):
+    return get_log_cache().get(start_date, end_date)
+
+def get_usage_summary(start_date, end_date, source, logs=None):
+    if source == "Raw Logs":
+        return summarize_usage_frame(logs[logs['api'] != 'unknown_api'], prior_calls=get_month_prefix_calls(start_date))
+    return get_server_usage_summary(start_date, end_date, source)
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_month_prefix_calls(start_date):
+    # Volume tiers count from the 1st of the month, also when the selected range starts later.
+    return rollup_month_prefix_calls(db, start_date)
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_server_usage_summary(start_date, end_date, source):
+    if source == "Rollups":
+        top_users = rollup_top_values(db, "user_id", start_date, end_date, limit=10)
+        top_users.columns = ["User ID", "Total Calls"]
+        country_counts = rollup_top_values(db, "country", start_date, end_date)
+        country_counts.columns = ["Country", "Calls"]
+
+        return {
+            "api_totals": rollup_api_totals(db, start_date, end_date),
+            "daily": rollup_daily_usage(db, start_date, end_date),
+            "top_users": top_users,
+            "countries": country_counts,
+            "costs": price_usage(rollup_endpoint_daily_usage(db, start_date, end_date), prior_calls=get_month_prefix_calls(start_date)),
+        }
 
-    status = "healthy"
-    status_emoji = ""
-    
-    if error_rate_rand > (base_error_rate * 2) or latency_rand > (base_latency * 1.5): 
-        status = "warning"
-    if error_rate_rand > (base_error_rate * 4) or latency_rand > (base_latency * 2.5): 
-        status = "critical"
-    
-    return status, status_emoji, round(latency_rand, 1), round(error_rate_rand, 2)
+    top_users = aggregate_top_values(logs_collection, "user_id", start_date, end_date, limit=10, default="unknown_user")
+    top_users.columns = ["User ID", "Total Calls"]
+    country_counts = aggregate_top_values(logs_collection, "country", start_date, end_date)
+    country_counts.columns = ["Country", "Calls"]
+
+    return {
+        "api_totals": aggregate_api_totals(logs_collection, start_date, end_date),
+        "daily": aggregate_daily_usage(logs_collection, start_date, end_date),
+        "top_users": top_users,
+        "countries": country_counts,
+        "costs": price_usage(aggregate_endpoint_daily_usage(logs_collection, start_date, end_date), prior_calls=get_month_prefix_calls(start_date)),
+    }
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_latency_percentiles(start_date, end_date, api_name=None, by=("api",), freq=None):
+    return latency_percentiles(db, start_date, end_date, api_name, by, freq)
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_distinct_counts(field, start_date, end_date, api_name=None, by=("api",), freq=None):
+    return distinct_counts(db, field, start_date, end_date, api_name, by, freq)
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_peak_rps(start_date, end_date, api_name, by=("api",)):
+    return peak_rps(logs_collection, start_date, end_date, api_name, by)
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_usage_anomalies(granularity):
+    # Detection runs from `python anomalies.py` on a schedule; the page only reads its results.
+    return load_anomalies(db, granularity, since=detection_start(granularity))
+
+@render_metrics.track_cache(st.cache_data(ttl=300))
+def get_usage_forecast(today):
+    history_start = today - timedelta(days=FORECAST_HISTORY_DAYS)
+    daily = rollup_daily_usage(db, history_start, today)
+    unit_costs = effective_unit_costs(price_usage(
+        rollup_endpoint_daily_usage(db, history_start, today), prior_calls=rollup_month_prefix_calls(db, history_start)
+    ))
+    forecast = forecast_usage(daily, today=today)
+    return {
+        "daily": daily,
+        "forecast": forecast,
+        "unit_costs": unit_costs,
+        "month_end": month_end_projection(daily, forecast, unit_costs, today=today),
+    }
+
+def run_invoice_generation(month):
+    lines = generate_invoices(db, month)
+    st.toast(f"Generated {lines['user_id'].nunique():,} invoices for {month}.")
+
+def run_log_export(api_name, export_range, user_id, status, file_format):
+    previous = st.session_state.get(f"log_export_{api_name}")
+    if previous and os.path.exists(previous["path"]):
+        os.remove(previous["path"])
+    path = export_path(file_format, log_export_dir, prefix=api_name.lower().replace(" ", "_"))
+    query = export_query(export_range[0], export_range[-1], api_name, user_id.strip() or None, None if status == "All" else status)
+    rows = write_log_export(logs_collection, query, path, log_batch_size)
+    st.session_state[f"log_export_{api_name}"] = {"path": path, "rows": rows, "format": file_format}
+    st.toast(f"Exported {rows:,} {api_name} logs.")
+
+def read_log_export(path):
+    with open(path, "rb") as handle:
+        return handle.read()
+
+def invoice_line_frame(invoices):
+    return pd.DataFrame(
+        [{"month": invoice["month"], "user_id": invoice["user_id"], **item} for invoice in invoices for item in invoice["line_items"]],
+        columns=["month", "user_id", "api", "api_key", "calls", "cost"],
+    )
 
 def generate_api_key(user_id, api_name):
     key_id = str(uuid.uuid4())
@@ -286,18 +238,53 @@ def generate_api_key(user_id, api_name):
         "status": "active"
     })
     st.success(f"API Key generated: `{api_key_str}`")
-    st.cache_data.clear()
+    search_user_ids.clear()
+    get_api_keys_by_user.clear()
     st.rerun()
 
 def update_api_key_status(key_id, status):
     api_keys_collection.update_one({"key_id": key_id}, {"$set": {"status": status}})
     st.success(f"API Key {key_id} status updated to {status}!")
-    st.cache_data.clear()
+    get_api_keys_by_user.clear()
     st.rerun()
 
-@st.cache_data(ttl=600)
-def get_users():
-    return list(users_collection.find())
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def search_user_ids(prefix):
+    # The key picker lists the first matches only; the search narrows it down on large user bases.
+    users, next_cursor = fetch_page(
+        users_collection, prefix_query("user_id", prefix), "user_id", page_size=PICKER_PAGE_SIZE, projection={"user_id": 1}
+    )
+    return [user["user_id"] for user in users], next_cursor is not None
+
+@render_metrics.track_cache(st.cache_data(ttl=600))
+def get_api_keys_by_user(user_ids):
+    return load_keys_by_user(api_keys_collection, user_ids)
+
+def reset_pagination(name):
+    st.session_state[f"{name}_cursors"] = [None]
+
+def paginate(name, fetch):
+    page_size = st.selectbox(
+        "Page Size", PAGE_SIZE_OPTIONS, index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+        key=f"{name}_page_size", on_change=reset_pagination, args=(name,)
+    )
+    cursors = st.session_state.setdefault(f"{name}_cursors", [None])
+    docs, next_cursor = fetch(cursors[-1], page_size)
+    if not docs and len(cursors) > 1:
+        # The last page emptied out (e.g. its tickets were closed); step back a page.
+        cursors.pop()
+        docs, next_cursor = fetch(cursors[-1], page_size)
+    return docs, next_cursor
+
+def render_page_controls(name, next_cursor, row_count):
+    cursors = st.session_state[f"{name}_cursors"]
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("Previous", key=f"{name}_prev", disabled=len(cursors) == 1, on_click=cursors.pop, use_container_width=True)
+    with col_page:
+        st.markdown(f"<p style='text-align: center;'>Page {len(cursors)} ({row_count} shown)</p>", unsafe_allow_html=True)
+    with col_next:
+        st.button("Next", key=f"{name}_next", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,), use_container_width=True)
 
 
 st.title("API Management Dashboard")
@@ -319,53 +306,448 @@ with st.sidebar:
     selected_start_date = date_range[0]
     selected_end_date = date_range[1] if len(date_range) > 1 else date_range[0]
 
+    metrics_source = st.selectbox(
+        "Metrics Source",
+        ["Rollups", "MongoDB Aggregation", "Raw Logs"],
+        key="metrics_source",
+        help="Rollups reads the pre-aggregated daily buckets. MongoDB Aggregation computes the numbers from raw logs on the server. Raw Logs loads every log in the range."
+    )
+
     st.markdown("---")
     
-    # Auto-refresh checkbox moved to sidebar
-    auto_refresh = st.checkbox("Enable Auto-Refresh (Every 60s)", value=False, key="auto_refresh_checkbox")
-    if auto_refresh:
-        from streamlit_extras.rerun_with_delay import rerun_with_delay
-        rerun_with_delay(delay_seconds=60)
-
+    live_updates = st.checkbox(
+        "Live Updates (Today)", value=False, key="live_updates",
+        help=f"Stream new logs into today's counters every {live_refresh_seconds}s without rerunning the dashboard."
+    )
+    if live_updates:
+        get_live_feed().start()
 
-df_logs = get_api_logs(start_date=selected_start_date, end_date=selected_end_date)
-df_logs = df_logs[df_logs['api'] != 'unknown_api'] 
+    lazy_tab_rendering = st.checkbox(
+        "Lazy Tab Rendering", value=lazy_tabs_default, key="lazy_tab_rendering",
+        help="Only compute the tab you are viewing. Turn off to render every tab on each rerun."
+    )
+    show_render_timings = st.checkbox("Show Render Timings", value=debug_timings_default, key="show_render_timings")
+
+
+with render_metrics.section("Mongo Fetch"):
+    df_cached_logs = get_api_logs(start_date=selected_start_date, end_date=selected_end_date) if metrics_source == "Raw Logs" else None
+    usage_summary = get_usage_summary(selected_start_date, selected_end_date, metrics_source, df_cached_logs)
+
+if metrics_source == "Raw Logs":
+    with st.sidebar.expander("Log Frame Memory Report"):
+        cache_stats = get_log_cache().stats()
+        st.caption(f"{len(df_cached_logs):,} cached log rows, {cache_stats['last_delta_rows']:,} fetched on the last refresh")
+        st.dataframe(log_frame_memory_report(df_cached_logs), use_container_width=True, hide_index=True)
+
+def live_today_frame():
+    return pd.DataFrame(get_live_feed().snapshot()["rows"], columns=["api", "hour", "calls", "latency_sum", "errors"])
+
+def current_usage_today(api_name):
+    return usage_today(db[QUOTA_COLLECTION], api_name)
+
+@st.fragment(run_every=live_refresh_seconds)
+def render_live_today():
+    with render_metrics.section("Live Today"):
+        live_feed = get_live_feed()
+        # start() is a no-op while the feed thread is alive and restarts it if it ever stopped.
+        live_feed.start()
+        snapshot = live_feed.snapshot()
+        today_rows = live_today_frame()
+        st.subheader("Live Today")
+
+        calls_today = int(today_rows["calls"].sum())
+        col_calls, col_errors, col_latency = st.columns(3)
+        with col_calls:
+            st.metric(label="Calls Today", value=f"{calls_today:,}")
+        with col_errors:
+            error_rate = today_rows["errors"].sum() / calls_today * 100 if calls_today else 0
+            st.metric(label="Error Rate Today", value=f"{error_rate:.2f}%")
+        with col_latency:
+            avg_latency = today_rows["latency_sum"].sum() / calls_today if calls_today else 0
+            st.metric(label="Avg Latency Today", value=f"{avg_latency:.1f} ms")
+
+        source = {"change_stream": "change stream", "polling": "_id polling"}.get(snapshot["mode"], "starting")
+        last_event = snapshot["last_event_at"].strftime("%H:%M:%S") if snapshot["last_event_at"] else "none yet"
+        st.caption(f"Source: {source} | {snapshot['events']:,} new logs since the feed started | last delta at {last_event} UTC")
+        if snapshot["error"]:
+            st.caption(f"Live feed retrying after: {snapshot['error']}")
+
+        if not today_rows.empty:
+            hourly = today_rows.groupby(["hour", "api"], as_index=False)["calls"].sum()
+            fig_live = px.bar(hourly, x="hour", y="calls", color="api", title="Calls per Hour Today (UTC)", template="plotly_white")
+            fig_live.update_layout(xaxis_title="Hour", yaxis_title="Calls", legend_title_text="API")
+            st.plotly_chart(fig_live, use_container_width=True)
+
+if live_updates:
+    render_live_today()
+
+@st.fragment(run_every=live_refresh_seconds)
+def render_api_health(api_name):
+    live_feed = get_live_feed()
+    live_feed.start()
+    report = live_feed.health.report(api_name, API_CONFIGS.get(api_name, {}))
+    status = report["status"]
+    stats = report["windows"][STATUS_WINDOW]
+
+    status_color = "green"
+    if status == "warning": status_color = "orange"
+    if status == "critical": status_color = "red"
+    if status == "idle": status_color = "gray"
+
+    st.markdown(f"""
+    <div class="api-health-card">
+        <div class="health-icon">
+            <span style="font-size: 3.5rem; animation: pulse-{status_color} 1.5s infinite alternate;"> </span>
+        </div>
+        <div class="health-details">
+            <p style="font-size: 1.5rem; font-weight: bold; color: {status_color}; text-transform: uppercase;">Status: {status}</p>
+            <p>Average Latency ({STATUS_WINDOW}): <strong>{stats['avg_latency']:.1f} ms</strong> (p95 {stats['p95']:.1f} ms)</p>
+            <p>Error Rate ({STATUS_WINDOW}): <strong>{stats['error_rate']:.2f}%</strong> (5xx {stats['error_5xx_rate']:.2f}%)</p>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    windows = pd.DataFrame([
+        {
+            "Window": name,
+            "Requests": window["requests"],
+            "Req/sec": round(window["rps"], 2),
+            "4xx %": round(window["error_4xx_rate"], 2),
+            "5xx %": round(window["error_5xx_rate"], 2),
+            "p50 (ms)": round(window["p50"], 1),
+            "p95 (ms)": round(window["p95"], 1),
+            "p99 (ms)": round(window["p99"], 1),
+        }
+        for name, window in report["windows"].items()
+    ])
+    st.dataframe(windows, use_container_width=True, hide_index=True)
+    windows_label = "/".join(HEALTH_WINDOWS)
+    st.caption(f"Sliding {windows_label} windows over live logs; status uses the last {STATUS_WINDOW}. Refreshes every {live_refresh_seconds}s.")
 
 
 st.markdown(" ")
 
+def dashboard_tabs(labels, key):
+    if lazy_tab_rendering:
+        return st.tabs(labels, key=key, on_change="rerun")
+    return st.tabs(labels)
+
+@st.fragment
+def render_api_tab(tab_name):
+    st.header(f"{tab_name} - Detailed Monitoring")
+    api_config = API_CONFIGS.get(tab_name, {})
+    quota_daily = api_config.get("quota_daily", "N/A")
+    rate_limit_per_second = api_config.get("rate_limit_per_second", "N/A")
+    cost_per_call = api_config.get("cost_per_call", "N/A")
+    documentation_url = api_config.get("documentation_url", "#")
+    latest_version = api_config.get("latest_version", "N/A")
+
+    st.markdown(f"""
+    <div class="api-info-display-card">
+        <div style="display: flex; justify-content: space-around; flex-wrap: wrap;">
+            <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Version:</strong> {latest_version}</p>
+            <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Daily Quota:</strong> {quota_daily:,} calls</p>
+            <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Rate Limit:</strong> {rate_limit_per_second} req/sec</p>
+            <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Cost/Call:</strong> ${cost_per_call}</p>
+        </div>
+        <div style="text-align: center; margin-top: 15px;">
+            <a href="{documentation_url}" target="_blank" class="button-link"> View Documentation</a>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("<h4>Select a metric:</h4>", unsafe_allow_html=True)
+    sub_options = ["Usage per API", "Latency Percentiles", "Quota per API", "Rate Limit per API", "Health", "Cost Projection"]
+
+    metric_tabs = dashboard_tabs(sub_options, key=f"metric_tabs_{tab_name}")
+    api_daily_usage = usage_summary["daily"][usage_summary["daily"]["api"] == tab_name]
+    current_daily_usage = current_usage_today(tab_name)
+
+    for metric_index, selected_option_label in enumerate(sub_options):
+        if metric_tabs[metric_index].open is False:
+            continue
+        with metric_tabs[metric_index], render_metrics.section(f"{tab_name} / {selected_option_label}"):
+
+            if selected_option_label == "Usage per API":
+                st.subheader(f"Daily API Usage Trend for {tab_name}")
+
+                daily_usage_df = daily_usage_for_api(api_daily_usage, tab_name, start_date=selected_start_date, end_date=selected_end_date)
+
+                total_calls = int(api_daily_usage["Count"].sum()) if not api_daily_usage.empty else daily_usage_df['Count'].sum()
+
+                col_metric, col_graph = st.columns([1, 3])
+                with col_metric:
+                    st.metric(label=f"Total Calls for {tab_name} (Selected Period)", value=f"{total_calls:,}")
+                    distinct_users = get_distinct_counts("user_id", selected_start_date, selected_end_date, tab_name)
+                    distinct_user_count = int(distinct_users["Distinct"].sum())
+                    st.metric(label="Distinct Consumers (Selected Period)", value=f"{distinct_user_count:,}")
+                    st.markdown("<p>Daily API calls over the selected period.</p>", unsafe_allow_html=True)
+                    st.download_button(
+                        label="Download Usage Data",
+                        data=daily_usage_df.to_csv(index=False).encode('utf-8'),
+                        file_name=f"{tab_name}_daily_usage.csv",
+                        mime="text/csv",
+                        key=f"download_usage_{tab_name}"
+                    )
+                with col_graph:
+                    fig_api_usage = px.line(daily_usage_df, x="Date", y="Count",
+                                             title=f"Daily API Usage for {tab_name}", template="plotly_white")
+                    fig_api_usage.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Number of Calls")
+                    st.plotly_chart(fig_api_usage, use_container_width=True)
+
+                with st.expander("Export Raw Logs"):
+                    col_export_range, col_export_user, col_export_status, col_export_format = st.columns(4)
+                    with col_export_range:
+                        export_range = st.date_input("Date range", (selected_start_date, selected_end_date), key=f"export_range_{tab_name}")
+                    with col_export_user:
+                        export_user = st.text_input("User ID (optional)", key=f"export_user_{tab_name}")
+                    with col_export_status:
+                        export_status = st.selectbox("Status", ["All"] + list(STATUS_CLASSES), key=f"export_status_{tab_name}")
+                    with col_export_format:
+                        export_formats = [name for name in EXPORT_FORMATS if name != "parquet" or pyarrow is not None]
+                        export_format = st.selectbox("Format", export_formats, key=f"export_format_{tab_name}")
+                    st.button("Prepare Export", key=f"prepare_export_{tab_name}", on_click=run_log_export,
+                              args=(tab_name, export_range, export_user, export_status, export_format))
+
+                    log_export = st.session_state.get(f"log_export_{tab_name}")
+                    if log_export and os.path.exists(log_export["path"]):
+                        export_mb = os.path.getsize(log_export["path"]) / 1024 ** 2
+                        st.caption(f"{log_export['rows']:,} logs, {export_mb:,.1f} MB, saved to {log_export['path']}")
+                        if export_mb <= log_export_download_limit_mb:
+                            st.download_button(
+                                label="Download Raw Logs",
+                                data=lambda path=log_export["path"]: read_log_export(path),
+                                file_name=os.path.basename(log_export["path"]),
+                                mime=EXPORT_FORMATS[log_export["format"]],
+                                key=f"download_logs_{tab_name}"
+                            )
+                        else:
+                            st.info(f"Exports over {log_export_download_limit_mb} MB are not served by the dashboard; collect the file from the export directory.")
+
+            elif selected_option_label == "Latency Percentiles":
+                st.subheader(f"Latency Percentiles for {tab_name}")
+
+                latency_daily = get_latency_percentiles(selected_start_date, selected_end_date, tab_name, by=(), freq="D")
+                latency_endpoints = get_latency_percentiles(selected_start_date, selected_end_date, tab_name, by=("endpoint",))
+
+                if not latency_daily.empty:
+                    col_metric_latency, col_graph_latency = st.columns([1, 3])
+                    with col_metric_latency:
+                        period = get_latency_percentiles(selected_start_date, selected_end_date, tab_name, by=())
+                        for label in PERCENTILES:
+                            st.metric(label=f"{label} Latency (Selected Period)", value=f"{period[label].iloc[0]:.1f} ms")
+                    with col_graph_latency:
+                        fig_latency = px.line(latency_daily, x="timestamp", y=list(PERCENTILES),
+                                              title=f"Daily Latency Percentiles for {tab_name}", template="plotly_white")
+                        fig_latency.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Latency (ms)", legend_title_text="")
+                        st.plotly_chart(fig_latency, use_container_width=True)
+
+                    st.dataframe(latency_endpoints.round(1), use_container_width=True)
+                else:
+                    st.info("No latency data for the selected period.")
+
+            elif selected_option_label == "Quota per API":
+                st.subheader(f"Quota Information and Trend for {tab_name}")
+
+                quota_val = api_config.get("quota_daily", 0) 
+
+                if quota_val > 0:
+                    st.info(f"Configured Daily Quota: {quota_val:,} calls")
+                    st.info(f"Cost per Call: ${cost_per_call}")
+
+                    remaining_quota = quota_val - current_daily_usage
+
+                    col_metric_quota, col_graph_quota = st.columns([1, 3])
+                    with col_metric_quota:
+                        st.metric(label="Current Daily Usage", value=f"{current_daily_usage:,} calls")
+                        st.metric(label="Remaining Daily Quota", value=f"{remaining_quota:,} calls")
+                        if remaining_quota <= 0:
+                            st.error("Daily quota exceeded!")
+                        elif remaining_quota < quota_val * 0.2:
+                            st.warning("Daily quota running low.")
+                        else:
+                            st.success("Daily quota is within limits.")
+
+                    with col_graph_quota:
+                        daily_usage_for_quota = daily_usage_for_api(api_daily_usage, tab_name, start_date=selected_start_date, end_date=selected_end_date)
+                        daily_usage_dict = daily_usage_for_quota.set_index('Date')['Count'].to_dict()
+
+                        all_dates_for_plot = pd.date_range(start=daily_usage_for_quota['Date'].min(), end=daily_usage_for_quota['Date'].max(), freq='D')
+                        quota_trend_data = []
+                        for date in all_dates_for_plot:
+                            usage = daily_usage_dict.get(date, 0)
+                            quota_trend_data.append({"Date": date, "Usage": usage, "Daily Quota": quota_val})
+
+                        df_quota_trend = pd.DataFrame(quota_trend_data)
+
+                        fig_quota_trend = px.line(df_quota_trend, x="Date", y=["Usage", "Daily Quota"],
+                                                    title=f"Daily Usage vs. Quota for {tab_name}", template="plotly_white")
+                        fig_quota_trend.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Count")
+                        st.plotly_chart(fig_quota_trend, use_container_width=True)
+
+                    top_keys_today = key_usage_today(db[QUOTA_COLLECTION], tab_name)
+                    if top_keys_today:
+                        st.markdown("<h5>Top API Keys Today</h5>", unsafe_allow_html=True)
+                        df_top_keys = pd.DataFrame(top_keys_today).rename(columns={"api_key": "API Key", "calls": "Calls Today"})
+                        df_top_keys["Share of Quota"] = (df_top_keys["Calls Today"] / quota_val * 100).round(2).astype(str) + "%"
+                        st.dataframe(df_top_keys, use_container_width=True, hide_index=True)
+
+                else:
+                    st.warning("Daily quota not configured.")
+                    st.info("Set 'quota_daily' for this API.")
+
+
+            elif selected_option_label == "Rate Limit per API":
+                st.subheader(f"Rate Limit Information and Trend for {tab_name}")
+                if rate_limit_per_second != "N/A":
+                    st.info(f"Configured Rate Limit: {rate_limit_per_second} calls per second")
+                    st.markdown("Observed calls per second, bucketed per second from the raw logs.")
+
+                    daily_rps = get_peak_rps(selected_start_date, selected_end_date, tab_name)
+                    if not daily_rps.empty:
+                        col_metric_rps, col_graph_rps = st.columns([1, 3])
+                        with col_metric_rps:
+                            st.metric(label="Peak RPS (Selected Period)", value=f"{int(daily_rps['Peak RPS'].max()):,}")
+                            st.metric(label="Highest Daily p99 RPS", value=f"{int(daily_rps['p99 RPS'].max()):,}")
+                            seconds_over = int(daily_rps["Seconds Over Limit"].sum())
+                            st.metric(label="Seconds Over Limit", value=f"{seconds_over:,}")
+                            if seconds_over:
+                                st.warning("Traffic exceeded the configured rate limit.")
+                            else:
+                                st.success("Traffic stayed within the rate limit.")
+                        with col_graph_rps:
+                            df_rate_limit_trend = daily_rps.rename(columns={"day": "Date"})
+                            fig_rate_limit_trend = px.line(df_rate_limit_trend, x="Date", y=["Peak RPS", "p99 RPS", "Rate Limit"],
+                                                            title=f"Observed Daily RPS vs. Rate Limit for {tab_name}", template="plotly_white")
+                            fig_rate_limit_trend.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Calls per Second", legend_title_text="")
+                            st.plotly_chart(fig_rate_limit_trend, use_container_width=True)
+
+                        st.markdown("<h5>Peak RPS by User</h5>", unsafe_allow_html=True)
+                        user_rps = get_peak_rps(selected_start_date, selected_end_date, tab_name, by=("api", "user_id"))
+                        user_rps = user_rps.groupby("user_id", as_index=False).agg(**{
+                            "Peak RPS": ("Peak RPS", "max"),
+                            "p99 RPS": ("p99 RPS", "max"),
+                            "Seconds Over Limit": ("Seconds Over Limit", "sum"),
+                        }).sort_values(["Peak RPS", "Seconds Over Limit"], ascending=False)
+                        st.dataframe(user_rps.rename(columns={"user_id": "User ID"}), use_container_width=True, hide_index=True)
+                    else:
+                        st.info("No traffic in the selected period.")
+
+                else:
+                    st.warning("Rate limit not configured.")
+                    st.info("No rate limit trend graph.")
+
+            elif selected_option_label == "Health":
+                st.subheader(f"Real-time Health Status for {tab_name}")
+
+                render_api_health(tab_name)
+
+            elif selected_option_label == "Cost Projection":
+                st.subheader(f"Projected Daily Cost for {tab_name}")
+
+                api_config = API_CONFIGS.get(tab_name, {})
+                cost_per_call = api_config.get("cost_per_call", 0)
+
+                if cost_per_call > 0:
+                    now = datetime.utcnow()
+                    usage_forecast = get_usage_forecast(now.replace(hour=0, minute=0, second=0, microsecond=0))
+                    api_forecast = usage_forecast["forecast"][usage_forecast["forecast"]["api"] == tab_name]
+                    unit_cost = usage_forecast["unit_costs"].get(tab_name, cost_per_call)
+                    day_left = 1 - (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() / 86400
+
+                    today_forecast = api_forecast.iloc[0] if not api_forecast.empty else pd.Series({"Forecast": 0, "Lower": 0, "Upper": 0})
+                    projected_total_daily_calls = current_daily_usage + today_forecast["Forecast"] * day_left
+                    projected_cost = projected_total_daily_calls * unit_cost
+                    month_end = usage_forecast["month_end"].set_index("api")
+
+                    col_proj_metric, col_proj_graph = st.columns([1, 3])
+                    with col_proj_metric:
+                        st.metric(label="Current Usage Today", value=f"{current_daily_usage:,} calls")
+                        st.metric(label="Projected Total Calls Today", value=f"{int(projected_total_daily_calls):,}")
+                        st.caption(f"80% interval: {int(current_daily_usage + today_forecast['Lower'] * day_left):,} - "
+                                   f"{int(current_daily_usage + today_forecast['Upper'] * day_left):,} calls")
+                        st.metric(label="Projected Daily Cost", value=f"${projected_cost:,.2f}")
+                        if tab_name in month_end.index:
+                            st.metric(label="Projected Cost by Month End", value=f"${month_end.loc[tab_name, 'Projected Cost']:,.2f}")
+                            st.caption(f"80% interval: ${month_end.loc[tab_name, 'Cost Low']:,.2f} - ${month_end.loc[tab_name, 'Cost High']:,.2f}")
+                        if projected_cost > 10:
+                            st.warning("Projected daily cost is high.")
+
+                        quota_val = api_config.get("quota_daily")
+                        if quota_val:
+                            exhaustion = quota_exhaustion(api_forecast, quota_val, current_daily_usage, now)
+                            if exhaustion["exhausted"]:
+                                st.error("Daily quota already reached today.")
+                            elif exhaustion["today_expected"]:
+                                st.warning(f"Daily quota expected to run out at {exhaustion['today_expected']:%H:%M} UTC today.")
+                            elif exhaustion["today_earliest"]:
+                                st.info(f"Daily quota could run out as early as {exhaustion['today_earliest']:%H:%M} UTC today.")
+                            if exhaustion["first_day"]:
+                                st.info(f"Forecast exceeds the daily quota on {exhaustion['first_day']:%Y-%m-%d}.")
+                            elif exhaustion["first_day_earliest"]:
+                                st.info(f"Daily quota could be exceeded from {exhaustion['first_day_earliest']:%Y-%m-%d}.")
+
+                    with col_proj_graph:
+                        history = usage_forecast["daily"][usage_forecast["daily"]["api"] == tab_name]
+                        fig_cost_proj = go.Figure([
+                            go.Scatter(x=api_forecast["timestamp"], y=api_forecast["Upper"] * unit_cost, mode="lines",
+                                       line={"width": 0}, showlegend=False, hoverinfo="skip"),
+                            go.Scatter(x=api_forecast["timestamp"], y=api_forecast["Lower"] * unit_cost, mode="lines",
+                                       line={"width": 0}, fill="tonexty", fillcolor="rgba(255, 138, 101, 0.25)", name="80% Interval"),
+                            go.Scatter(x=history["timestamp"], y=history["Count"] * unit_cost, mode="lines+markers",
+                                       line={"color": "#5b9bd5"}, name="Actual Cost"),
+                            go.Scatter(x=api_forecast["timestamp"], y=api_forecast["Forecast"] * unit_cost, mode="lines",
+                                       line={"color": "#ff8a65", "dash": "dash"}, name="Forecast Cost"),
+                        ])
+                        fig_cost_proj.update_layout(title=f"Daily Cost Forecast for {tab_name}", template="plotly_white",
+                                                    xaxis_title="", yaxis_title="Cost ($)", hovermode="x unified")
+                        st.plotly_chart(fig_cost_proj, use_container_width=True)
+
+                else:
+                    st.warning("Cost not configured for this API.")
+
+
 api_tabs_list = ["Overview"] + sorted(list(API_CONFIGS.keys())) + ["Users", "Changelog"]
-selected_api_tab = st.tabs(api_tabs_list)
+selected_api_tab = dashboard_tabs(api_tabs_list, key="api_tab")
 
 for i, tab_name in enumerate(api_tabs_list):
-    with selected_api_tab[i]:
+    if selected_api_tab[i].open is False:
+        continue
+    with selected_api_tab[i], render_metrics.section(tab_name):
         if tab_name == "Overview":
             st.subheader("Overall API Usage Summary")
             
+            api_counts = usage_summary["api_totals"].copy()
+            api_cost_values = api_counts["API"].map(usage_summary["costs"].groupby("api")["Cost"].sum()).fillna(0)
+            api_counts["Cost ($)"] = api_cost_values.round(3)
+
             col1, col2, col3 = st.columns(3)
-            total_calls_overall = df_logs.shape[0]
-            total_cost_overall = df_logs.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1).sum()
+            total_calls_overall = int(api_counts["Calls"].sum())
+            total_cost_overall = api_cost_values.sum()
 
             with col1:
                 st.metric(label="Total Calls (Selected Period)", value=f"{total_calls_overall:,}")
             with col2:
                 st.metric(label="Total Estimated Cost (Selected Period)", value=f"${total_cost_overall:,.2f}")
             with col3:
-                avg_latency_overall = df_logs['latency_ms'].mean() if not df_logs.empty else 0
+                avg_latency_overall = api_counts["Latency Sum"].sum() / total_calls_overall if total_calls_overall else 0
                 st.metric(label="Avg Latency (Selected Period)", value=f"{avg_latency_overall:.1f} ms")
 
 
-            if not df_logs.empty and 'api' in df_logs.columns and df_logs['api'].any():
-                api_counts = df_logs["api"].value_counts().reset_index()
-                api_counts.columns = ["API", "Calls"]
-                api_counts["Cost ($)"] = api_counts.apply(
-                    lambda row: round(row["Calls"] * API_CONFIGS.get(row["API"], {}).get("cost_per_call", 0), 3), axis=1
-                )
-                st.dataframe(api_counts, use_container_width=True)
+            if not api_counts.empty:
+                st.dataframe(api_counts[["API", "Calls", "Cost ($)"]], use_container_width=True)
+
+                st.subheader("Latency Percentiles by API")
+                latency_by_api = get_latency_percentiles(selected_start_date, selected_end_date)
+                if not latency_by_api.empty:
+                    latency_by_api = latency_by_api.rename(columns={"api": "API"})
+                    fig_latency_api = px.bar(latency_by_api, x="API", y=list(PERCENTILES), barmode="group",
+                                             title="Latency Percentiles by API (Selected Period)", template="plotly_white")
+                    fig_latency_api.update_layout(yaxis_title="Latency (ms)", legend_title_text="")
+                    st.plotly_chart(fig_latency_api, use_container_width=True)
 
                 st.subheader("API Usage Over Time (All APIs Combined)")
-                df_daily_all = df_logs.groupby([pd.Grouper(key="timestamp", freq="D"), "api"]).size().reset_index(name="Count")
-                
+                df_daily_all = usage_summary["daily"]
                 if not df_daily_all.empty and df_daily_all['Count'].sum() > 0:
                     fig_all_usage = px.line(df_daily_all, x="timestamp", y="Count", color="api", title="Daily API Usage (All APIs Combined)", template="plotly_white")
                     fig_all_usage.update_layout(hovermode="x unified", legend_title_text='API')
@@ -415,18 +797,62 @@ for i, tab_name in enumerate(api_tabs_list):
                 st.plotly_chart(fig_all_usage, use_container_width=True)
 
             
+            st.subheader("Active Consumers by API")
+            active_granularity = st.radio("Active consumer window", ["Daily", "Weekly", "Monthly"], horizontal=True, key="active_consumer_window")
+            active_freq = {"Daily": "D", "Weekly": "W", "Monthly": "M"}[active_granularity]
+            active_users = get_distinct_counts("user_id", selected_start_date, selected_end_date, freq=active_freq)
+            if not active_users.empty:
+                col_active_table, col_active_graph = st.columns([1, 3])
+                with col_active_table:
+                    consumers_by_api = get_distinct_counts("user_id", selected_start_date, selected_end_date).rename(
+                        columns={"api": "API", "Distinct": "Distinct Users"})
+                    countries_by_api = get_distinct_counts("country", selected_start_date, selected_end_date).rename(
+                        columns={"api": "API", "Distinct": "Distinct Countries"})
+                    st.dataframe(consumers_by_api.merge(countries_by_api, on="API", how="left"), use_container_width=True, hide_index=True)
+                with col_active_graph:
+                    fig_active = px.line(active_users, x="timestamp", y="Distinct", color="api",
+                                         title=f"{active_granularity} Active Consumers per API", template="plotly_white")
+                    fig_active.update_layout(hovermode="x unified", legend_title_text="API", xaxis_title="", yaxis_title="Distinct Users")
+                    st.plotly_chart(fig_active, use_container_width=True)
+            else:
+                st.info("No consumer data for the selected period.")
+
+            st.subheader("Usage Anomalies")
+            anomaly_granularity = st.radio("Anomaly resolution", ["Daily", "Hourly"], horizontal=True, key="anomaly_window")
+            anomalies = get_usage_anomalies({"Daily": "day", "Hourly": "hour"}[anomaly_granularity])
+            if not anomalies.empty:
+                col_spikes, col_drops, col_errors = st.columns(3)
+                with col_spikes:
+                    st.metric(label="Volume Spikes", value=f"{int(((anomalies['metric'] == 'calls') & (anomalies['direction'] == 'spike')).sum()):,}")
+                with col_drops:
+                    st.metric(label="Volume Drops", value=f"{int((anomalies['direction'] == 'drop').sum()):,}")
+                with col_errors:
+                    st.metric(label="Error Rate Spikes", value=f"{int((anomalies['metric'] == 'error_rate').sum()):,}")
+
+                col_anomaly_table, col_anomaly_graph = st.columns([2, 3])
+                with col_anomaly_table:
+                    st.dataframe(anomalies.head(100).rename(columns={
+                        "bucket": "Time", "api": "API", "user_id": "User ID", "country": "Country", "metric": "Metric",
+                        "value": "Observed", "expected": "Expected", "score": "Score", "direction": "Direction", "calls": "Calls",
+                    }).drop(columns="granularity").round(3), use_container_width=True, hide_index=True)
+                with col_anomaly_graph:
+                    fig_anomalies = px.scatter(anomalies, x="bucket", y="score", color="api", symbol="metric",
+                                               hover_data=["user_id", "country", "value", "expected"],
+                                               title=f"{anomaly_granularity} Anomaly Scores (robust z vs. rolling median)", template="plotly_white")
+                    fig_anomalies.update_layout(legend_title_text="API", xaxis_title="", yaxis_title="Score")
+                    st.plotly_chart(fig_anomalies, use_container_width=True)
+            else:
+                st.success("No unusual usage detected by the last anomaly run.")
+
             st.subheader("Top API Consumers")
-            if not df_logs.empty and 'user_id' in df_logs.columns:
-                top_users = df_logs["user_id"].value_counts().reset_index()
-                top_users.columns = ["User ID", "Total Calls"]
-                st.dataframe(top_users.head(10), use_container_width=True)
+            if not usage_summary["top_users"].empty:
+                st.dataframe(usage_summary["top_users"], use_container_width=True)
             else:
                 st.info("No user data available.")
 
             st.subheader("Geographical Usage Overview")
-            if not df_logs.empty and 'country' in df_logs.columns and df_logs['country'].nunique() > 1:
-                country_counts = df_logs['country'].value_counts().reset_index()
-                country_counts.columns = ['Country', 'Calls']
+            if len(usage_summary["countries"]) > 1:
+                country_counts = usage_summary["countries"].copy()
                 
                 country_coords = {
                     "USA": (37.0902, -95.7129), "Germany": (51.1657, 10.4515), "India": (20.5937, 78.9629),
@@ -453,10 +879,10 @@ for i, tab_name in enumerate(api_tabs_list):
             st.info("Assuming a monthly billing cycle.")
             
             first_day_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            df_current_month = df_logs[df_logs["timestamp"] >= first_day_of_month]
+            month_costs = usage_summary["costs"][usage_summary["costs"]["timestamp"] >= first_day_of_month]
             
-            current_month_cost = df_current_month.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1).sum()
-            current_month_calls = df_current_month.shape[0]
+            current_month_cost = month_costs["Cost"].sum()
+            current_month_calls = int(month_costs["calls"].sum())
 
             col_curr_cost, col_proj_cost = st.columns(2)
             with col_curr_cost:
@@ -466,206 +892,50 @@ for i, tab_name in enumerate(api_tabs_list):
                 days_in_month = (datetime.utcnow().replace(day=1) + timedelta(days=32)).replace(day=1) - datetime.utcnow().replace(day=1)
                 days_in_month = days_in_month.days
                 
-                days_passed = (datetime.utcnow() - first_day_of_month).days + 1
-                if days_passed == 0: days_passed = 1
-                
-                projected_month_cost = (current_month_cost / days_passed) * days_in_month
+                month_end = get_usage_forecast(first_day_of_month.replace(day=datetime.utcnow().day))["month_end"]
+                projected_month_cost = month_end["Projected Cost"].sum()
                 st.metric(label="Projected Cost This Month", value=f"${projected_month_cost:,.2f}")
-                st.markdown(f"<p>Based on usage over {days_passed} days. (Total {days_in_month} days in month)</p>", unsafe_allow_html=True)
+                st.markdown(f"<p>Seasonal forecast per API, 80% interval ${month_end['Cost Low'].sum():,.2f} - "
+                            f"${month_end['Cost High'].sum():,.2f}. (Total {days_in_month} days in month)</p>", unsafe_allow_html=True)
                 
                 if projected_month_cost > 500:
                     st.warning("Projected cost is high.")
                 else:
                     st.success("Projected cost is within limits.")
 
-        elif tab_name in API_CONFIGS:
-            st.header(f"{tab_name} - Detailed Monitoring")
-            api_config = API_CONFIGS.get(tab_name, {})
-            quota_daily = api_config.get("quota_daily", "N/A")
-            rate_limit_per_second = api_config.get("rate_limit_per_second", "N/A")
-            cost_per_call = api_config.get("cost_per_call", "N/A")
-            documentation_url = api_config.get("documentation_url", "#")
-            latest_version = api_config.get("latest_version", "N/A")
-
-            st.markdown(f"""
-            <div class="api-info-display-card">
-                <div style="display: flex; justify-content: space-around; flex-wrap: wrap;">
-                    <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Version:</strong> {latest_version}</p>
-                    <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Daily Quota:</strong> {quota_daily:,} calls</p>
-                    <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Rate Limit:</strong> {rate_limit_per_second} req/sec</p>
-                    <p style="margin: 5px 15px; font-size: 1.1em;"><strong>Cost/Call:</strong> ${cost_per_call}</p>
-                </div>
-                <div style="text-align: center; margin-top: 15px;">
-                    <a href="{documentation_url}" target="_blank" class="button-link"> View Documentation</a>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            st.markdown("<h4>Select a metric:</h4>", unsafe_allow_html=True)
-            sub_options = ["Usage per API", "Quota per API", "Rate Limit per API", "Health", "Cost Projection"]
-            
-            metric_tabs = st.tabs(sub_options)
-
-            for metric_index, selected_option_label in enumerate(sub_options):
-                with metric_tabs[metric_index]:
-                    df_api_filtered = df_logs[df_logs["api"] == tab_name]
-
-                    if selected_option_label == "Usage per API":
-                        st.subheader(f"Daily API Usage Trend for {tab_name}")
-                        
-                        daily_usage_df = calculate_daily_usage(df_api_filtered, tab_name, start_date=selected_start_date, end_date=selected_end_date)
-                        
-                        total_calls = df_api_filtered.shape[0] if not df_api_filtered.empty else daily_usage_df['Count'].sum()
-
-                        col_metric, col_graph = st.columns([1, 3])
-                        with col_metric:
-                            st.metric(label=f"Total Calls for {tab_name} (Selected Period)", value=f"{total_calls:,}")
-                            st.markdown("<p>Daily API calls over the selected period.</p>", unsafe_allow_html=True)
-                            st.download_button(
-                                label="Download Usage Data",
-                                data=daily_usage_df.to_csv(index=False).encode('utf-8'),
-                                file_name=f"{tab_name}_daily_usage.csv",
-                                mime="text/csv",
-                                key=f"download_usage_{tab_name}"
-                            )
-                        with col_graph:
-                            fig_api_usage = px.line(daily_usage_df, x="Date", y="Count",
-                                                     title=f"Daily API Usage for {tab_name}", template="plotly_white")
-                            fig_api_usage.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Number of Calls")
-                            st.plotly_chart(fig_api_usage, use_container_width=True)
-
-                    elif selected_option_label == "Quota per API":
-                        st.subheader(f"Quota Information and Trend for {tab_name}")
-                        
-                        quota_val = api_config.get("quota_daily", 0) 
-
-                        if quota_val > 0:
-                            st.info(f"Configured Daily Quota: {quota_val:,} calls")
-                            st.info(f"Cost per Call: ${cost_per_call}")
-
-                            current_daily_usage = calculate_current_daily_usage(df_api_filtered, tab_name)
-                            remaining_quota = quota_val - current_daily_usage
-
-                            col_metric_quota, col_graph_quota = st.columns([1, 3])
-                            with col_metric_quota:
-                                st.metric(label="Current Daily Usage", value=f"{current_daily_usage:,} calls")
-                                st.metric(label="Remaining Daily Quota", value=f"{remaining_quota:,} calls")
-                                if remaining_quota <= 0:
-                                    st.error("Daily quota exceeded!")
-                                elif remaining_quota < quota_val * 0.2:
-                                    st.warning("Daily quota running low.")
-                                else:
-                                    st.success("Daily quota is within limits.")
-                            
-                            with col_graph_quota:
-                                daily_usage_for_quota = calculate_daily_usage(df_api_filtered, tab_name, start_date=selected_start_date, end_date=selected_end_date)
-                                daily_usage_dict = daily_usage_for_quota.set_index('Date')['Count'].to_dict()
-
-                                all_dates_for_plot = pd.date_range(start=daily_usage_for_quota['Date'].min(), end=daily_usage_for_quota['Date'].max(), freq='D')
-                                quota_trend_data = []
-                                for date in all_dates_for_plot:
-                                    usage = daily_usage_dict.get(date, 0)
-                                    quota_trend_data.append({"Date": date, "Usage": usage, "Daily Quota": quota_val})
-
-                                df_quota_trend = pd.DataFrame(quota_trend_data)
-                                
-                                fig_quota_trend = px.line(df_quota_trend, x="Date", y=["Usage", "Daily Quota"],
-                                                            title=f"Daily Usage vs. Quota for {tab_name}", template="plotly_white")
-                                fig_quota_trend.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Count")
-                                st.plotly_chart(fig_quota_trend, use_container_width=True)
-
-                        else:
-                            st.warning("Daily quota not configured.")
-                            st.info("Set 'quota_daily' for this API.")
-
-
-                    elif selected_option_label == "Rate Limit per API":
-                        st.subheader(f"Rate Limit Information and Trend for {tab_name}")
-                        if rate_limit_per_second != "N/A":
-                            st.info(f"Configured Rate Limit: {rate_limit_per_second} calls per second")
-                            st.markdown("Maximum requests per second for stable API performance.")
-                            
-                            end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-                            start_date = end_date - timedelta(days=29)
-                            all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-                            
-                            rate_limit_trend_data = []
-                            for date in all_dates:
-                                rate_limit_trend_data.append({"Date": date, "Rate Limit": rate_limit_per_second})
-                            
-                            df_rate_limit_trend = pd.DataFrame(rate_limit_trend_data)
-                            
-                            fig_rate_limit_trend = px.line(df_rate_limit_trend, x="Date", y="Rate Limit",
-                                                            title=f"Configured Daily Rate Limit for {tab_name}", template="plotly_white")
-                            fig_rate_limit_trend.update_layout(hovermode="x unified", xaxis_title="Date", yaxis_title="Calls per Second")
-                            st.plotly_chart(fig_rate_limit_trend, use_container_width=True)
-
-                        else:
-                            st.warning("Rate limit not configured.")
-                            st.info("No rate limit trend graph.")
-
-                    elif selected_option_label == "Health":
-                        st.subheader(f"Real-time Health Status for {tab_name}")
-                        
-                        status, status_emoji, latency, error_rate = get_api_health(tab_name)
-                        
-                        status_color = "green"
-                        if status == "warning": status_color = "orange"
-                        if status == "critical": status_color = "red"
-
-                        st.markdown(f"""
-                        <div class="api-health-card">
-                            <div class="health-icon">
-                                <span style="font-size: 3.5rem; animation: pulse-{status_color} 1.5s infinite alternate;">{status_emoji if status_emoji else ' '}</span>
-                            </div>
-                            <div class="health-details">
-                                <p style="font-size: 1.5rem; font-weight: bold; color: {status_color}; text-transform: uppercase;">Status: {status}</p>
-                                <p>Average Latency: <strong>{latency} ms</strong></p>
-                                <p>Error Rate: <strong>{error_rate}%</strong></p>
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        st.info("Simulated real-time API health.")
-
-                    elif selected_option_label == "Cost Projection":
-                        st.subheader(f"Projected Daily Cost for {tab_name}")
-
-                        api_config = API_CONFIGS.get(tab_name, {})
-                        cost_per_call = api_config.get("cost_per_call", 0)
-                        
-                        if cost_per_call > 0:
-                            current_daily_usage = calculate_current_daily_usage(df_api_filtered, tab_name)
-                            
-                            hours_passed = (datetime.utcnow() - datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() / 3600
-                            if hours_passed == 0: hours_passed = 0.1
-                            
-                            projected_total_daily_calls = (current_daily_usage / hours_passed) * 24
-                            projected_cost = projected_total_daily_calls * cost_per_call
-
-                            col_proj_metric, col_proj_graph = st.columns([1, 3])
-                            with col_proj_metric:
-                                st.metric(label="Current Usage Today", value=f"{current_daily_usage:,} calls")
-                                st.metric(label="Projected Total Calls Today", value=f"{int(projected_total_daily_calls):,}")
-                                st.metric(label="Projected Daily Cost", value=f"${projected_cost:,.2f}")
-                                if projected_cost > 10:
-                                    st.warning("Projected daily cost is high.")
-                            
-                            with col_proj_graph:
-                                cost_data = pd.DataFrame({
-                                    "Category": ["Current Cost", "Projected Additional Cost"],
-                                    "Cost": [current_daily_usage * cost_per_call, (projected_total_daily_calls - current_daily_usage) * cost_per_call]
-                                })
-                                fig_cost_proj = px.bar(cost_data, x="Category", y="Cost", 
-                                                        title=f"Cost Projection for {tab_name}",
-                                                        color="Category",
-                                                        color_discrete_map={"Current Cost": "#5b9bd5", "Projected Additional Cost": "#ff8a65"},
-                                                        template="plotly_white")
-                                fig_cost_proj.update_layout(showlegend=False, xaxis_title="", yaxis_title="Cost ($)",
-                                                            hovermode="x unified")
-                                st.plotly_chart(fig_cost_proj, use_container_width=True)
+            with st.expander("Monthly Invoices"):
+                invoice_months = [(pd.Period(first_day_of_month, freq="M") - i).strftime("%Y-%m") for i in range(4)]
+                invoice_month = st.selectbox("Billing month", invoice_months, index=1, key="invoice_month")
+                st.button("Generate Invoices", key="generate_invoices", on_click=run_invoice_generation, args=(invoice_month,))
+
+                invoices = load_invoices(db, invoice_month)
+                if invoices:
+                    st.dataframe(pd.DataFrame([
+                        {"User ID": invoice["user_id"], "Calls": invoice["total_calls"], "Cost ($)": round(invoice["total_cost"], 2),
+                         "Generated": invoice["generated_at"].strftime("%Y-%m-%d %H:%M")}
+                        for invoice in invoices
+                    ]), use_container_width=True, hide_index=True)
+                    invoice_lines = invoice_line_frame(invoices)
+                    st.download_button(
+                        label="Download Line Items (CSV)",
+                        data=invoice_lines.to_csv(index=False).encode('utf-8'),
+                        file_name=f"invoices_{invoice_month}.csv",
+                        mime="text/csv",
+                        key="download_invoices_csv"
+                    )
+                    if pyarrow is not None:
+                        st.download_button(
+                            label="Download Line Items (Parquet)",
+                            data=invoice_lines.to_parquet(index=False),
+                            file_name=f"invoices_{invoice_month}.parquet",
+                            mime="application/octet-stream",
+                            key="download_invoices_parquet"
+                        )
+                else:
+                    st.info(f"No invoices generated for {invoice_month} yet.")
 
-                        else:
-                            st.warning("Cost not configured for this API.")
+        elif tab_name in API_CONFIGS:
+            render_api_tab(tab_name)
 
 
         elif tab_name == "Users":
@@ -675,8 +945,11 @@ for i, tab_name in enumerate(api_tabs_list):
 
             with user_tabs[0]:
                 st.markdown("<h3>Registered Users and Their API Keys</h3>", unsafe_allow_html=True)
-                users_data = get_users()
+                users_data, next_users_cursor = paginate(
+                    "users", lambda cursor, page_size: fetch_page(users_collection, {}, "user_id", cursor, page_size)
+                )
                 if users_data:
+                    api_keys_by_user = get_api_keys_by_user(tuple(user['user_id'] for user in users_data))
                     for user in users_data:
                         st.markdown(f"""
                         <div class="user-card">
@@ -688,7 +961,7 @@ for i, tab_name in enumerate(api_tabs_list):
                         </div>
                         """, unsafe_allow_html=True)
 
-                        user_api_keys = list(api_keys_collection.find({"user_id": user['user_id']}))
+                        user_api_keys = api_keys_by_user.get(user['user_id'], [])
                         if user_api_keys:
                             st.markdown("<h5>Associated API Keys:</h5>", unsafe_allow_html=True)
                             key_data = []
@@ -725,6 +998,7 @@ for i, tab_name in enumerate(api_tabs_list):
                         else:
                             st.info(f"No API keys found for {user['user_id']}.")
                         st.markdown("---")
+                    render_page_controls("users", next_users_cursor, len(users_data))
                 else:
                     st.info("No registered users found.")
 
@@ -752,9 +1026,11 @@ for i, tab_name in enumerate(api_tabs_list):
 
             with user_tabs[2]:
                 st.markdown("<h3>Generate New API Keys</h3>", unsafe_allow_html=True)
+                user_search = st.text_input("Search User ID", key="key_user_search", placeholder="Start of a user ID").strip()
+                user_ids, more_users = search_user_ids(user_search)
+                if more_users:
+                    st.caption(f"Showing the first {PICKER_PAGE_SIZE} matching users; refine the search to narrow the list.")
                 with st.form("generate_key_form"):
-                    all_users = get_users()
-                    user_ids = [u['user_id'] for u in all_users]
                     key_user_id = st.selectbox("Select User for Key", user_ids + ["Create New User..."])
                     
                     new_user_for_key_input = None
@@ -834,72 +1110,181 @@ for i, tab_name in enumerate(api_tabs_list):
 
 st.markdown("---")
 
-st.subheader("Support Tickets")
-
-support_tab_titles = ["Open Tickets", "Closed Tickets"]
-support_tabs = st.tabs(support_tab_titles)
-
-with support_tabs[0]:
-    st.markdown("<h3>Currently Active Support Requests</h3>", unsafe_allow_html=True)
-    open_tickets = list(tickets_collection.find({"status": "open"}))
-
-    if open_tickets:
-        for ticket in open_tickets:
-            created_at = datetime.fromisoformat(ticket["created_at"])
-            ticket["hours_open"] = round((datetime.utcnow() - created_at).total_seconds() / 3600, 2)
-        
-        open_tickets_sorted = sorted(open_tickets, key=lambda x: x["hours_open"], reverse=True)
-
-        for ticket in open_tickets_sorted:
-            border_color = "#7cb342"
-            if ticket["hours_open"] > 24:
-                border_color = "#ff8a65"
-            if ticket["hours_open"] > 72:
-                border_color = "#ef5350"
-
-            st.markdown(f"""
-            <div class="ticket-card" style="border-left: 8px solid {border_color};">
-                <div class="ticket-header">
-                    <span class="ticket-id">Ticket ID: <code>{ticket['_id']}</code></span>
-                    <span class="ticket-aging">Aging: <strong>{ticket['hours_open']} hours</strong></span>
-                </div>
-                <p><strong>Query:</strong> {ticket['query']}</p>
-                <p><strong>Contact:</strong> {ticket.get('contact', 'anonymous')}</p>
-                <p><strong>Status:</strong> <span class="status-open">OPEN</span></p>
-                <div class="ticket-button-container">
+def ticket_views():
+    return st.session_state.setdefault("ticket_views", {})
+
+def cached_ticket_view(name, key, fetch):
+    # Ticket lists are kept per session so bulk actions can patch them in place;
+    # they are reloaded when the page changes, after ticket_view_ttl, or on Refresh.
+    view = ticket_views().get(name)
+    if view is None or view["key"] != key or time.time() - view["loaded_at"] > ticket_view_ttl:
+        view = {"key": key, "value": fetch(), "loaded_at": time.time()}
+        ticket_views()[name] = view
+    return view["value"]
+
+def selected_ticket_ids(list_name, ticket_ids):
+    return [ticket_id for ticket_id in ticket_ids if st.session_state.get(f"select_{list_name}_{ticket_id}")]
+
+def set_ticket_selection(list_name, ticket_ids, selected):
+    for ticket_id in ticket_ids:
+        st.session_state[f"select_{list_name}_{ticket_id}"] = selected
+
+def run_ticket_action(action, list_name, ticket_ids):
+    assignee = (st.session_state.get(f"{list_name}_assignee") or "").strip() or None
+    if not ticket_ids:
+        st.toast("Select at least one ticket first.")
+        return
+    if action == "assign" and not assignee:
+        st.toast("Enter an assignee first.")
+        return
+
+    modified = apply_ticket_action(tickets_collection, action, ticket_ids, assignee)
+
+    views = ticket_views()
+    if modified != len(ticket_ids):
+        # Some tickets were already changed elsewhere, so the loaded pages and counts can't be
+        # patched reliably; reload them instead.
+        for name in ("open_tickets", "closed_tickets", "aging"):
+            views.pop(name, None)
+    elif list_name in views:
+        docs, next_cursor = views[list_name]["value"]
+        if action == "close" and "aging" in views:
+            counts = dict(views["aging"]["value"])
+            for ticket in docs:
+                if ticket["_id"] in ticket_ids and ticket.get("hours_open") is not None:
+                    counts[aging_bucket(ticket["hours_open"])] -= 1
+                    counts["total"] -= 1
+            views["aging"]["value"] = counts
+        views[list_name]["value"] = (apply_ticket_action_locally(docs, action, ticket_ids, assignee), next_cursor)
+    if action != "assign":
+        # The ticket moved to the other list; reload that one rather than guess where it sorts.
+        views.pop("closed_tickets" if list_name == "open_tickets" else "open_tickets", None)
+    if action == "reopen":
+        views.pop("aging", None)
+
+    set_ticket_selection(list_name, ticket_ids, False)
+    verb = {"close": "Closed", "reopen": "Reopened", "assign": f"Assigned to {assignee}:"}[action]
+    st.toast(f"{verb} {modified} ticket(s).")
+
+def run_bulk_ticket_action(action, list_name, page_ticket_ids):
+    run_ticket_action(action, list_name, selected_ticket_ids(list_name, page_ticket_ids))
+
+def render_ticket_action_bar(list_name, page_ticket_ids, actions):
+    col_select, col_clear, col_assignee, *col_actions = st.columns([1, 1, 2] + [1] * len(actions))
+    with col_select:
+        st.button("Select Page", key=f"{list_name}_select_all", on_click=set_ticket_selection,
+                  args=(list_name, page_ticket_ids, True), use_container_width=True)
+    with col_clear:
+        st.button("Clear", key=f"{list_name}_clear_selection", on_click=set_ticket_selection,
+                  args=(list_name, page_ticket_ids, False), use_container_width=True)
+    with col_assignee:
+        st.text_input("Assignee", key=f"{list_name}_assignee", label_visibility="collapsed", placeholder="Assignee")
+    for col, (label, action) in zip(col_actions, actions):
+        with col:
+            st.button(label, key=f"{list_name}_bulk_{action}", on_click=run_bulk_ticket_action,
+                      args=(action, list_name, page_ticket_ids), use_container_width=True)
+
+@st.fragment
+def render_support_tickets():
+    st.subheader("Support Tickets")
+    st.button("Refresh Tickets", key="refresh_tickets", on_click=ticket_views().clear)
+
+    support_tab_titles = ["Open Tickets", "Closed Tickets"]
+    support_tabs = st.tabs(support_tab_titles)
+
+    with support_tabs[0], render_metrics.section("Support Tickets / Open"):
+        st.markdown("<h3>Currently Active Support Requests</h3>", unsafe_allow_html=True)
+        aging_counts = cached_ticket_view("aging", None, lambda: ticket_aging_counts(tickets_collection))
+        col_total, col_fresh, col_aging, col_stale = st.columns(4)
+        with col_total:
+            st.metric(label="Open Tickets", value=f"{aging_counts['total']:,}")
+        with col_fresh:
+            st.metric(label="Open < 24h", value=f"{aging_counts['under_24h']:,}")
+        with col_aging:
+            st.metric(label="Open 24-72h", value=f"{aging_counts['24_to_72h']:,}")
+        with col_stale:
+            st.metric(label="Open > 72h", value=f"{aging_counts['over_72h']:,}")
+
+        # Longest-open first; ordering and hours_open both come from the aggregation.
+        open_tickets, next_open_cursor = paginate(
+            "open_tickets",
+            lambda cursor, page_size: cached_ticket_view(
+                "open_tickets", (cursor, page_size), lambda: open_tickets_page(tickets_collection, cursor, page_size)
+            )
+        )
+
+        if open_tickets:
+            render_ticket_action_bar(
+                "open_tickets", [ticket["_id"] for ticket in open_tickets],
+                [("Close Selected", "close"), ("Assign Selected", "assign")]
+            )
+            for ticket in open_tickets:
+                hours_open = ticket.get("hours_open") or 0
+                border_color = "#7cb342"
+                if hours_open > 24:
+                    border_color = "#ff8a65"
+                if hours_open > 72:
+                    border_color = "#ef5350"
+
+                st.checkbox("Select", key=f"select_open_tickets_{ticket['_id']}")
+                st.markdown(f"""
+                <div class="ticket-card" style="border-left: 8px solid {border_color};">
+                    <div class="ticket-header">
+                        <span class="ticket-id">Ticket ID: <code>{ticket['_id']}</code></span>
+                        <span class="ticket-aging">Aging: <strong>{hours_open} hours</strong></span>
+                    </div>
+                    <p><strong>Query:</strong> {ticket['query']}</p>
+                    <p><strong>Contact:</strong> {ticket.get('contact', 'anonymous')}</p>
+                    <p><strong>Assignee:</strong> {ticket.get('assignee') or 'unassigned'}</p>
+                    <p><strong>Status:</strong> <span class="status-open">OPEN</span></p>
+                    <div class="ticket-button-container">
+                    </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
-            if st.button("Close Ticket", key=f"close_btn_{ticket['_id']}", use_container_width=True):
-                tickets_collection.update_one({"_id": ticket["_id"]}, {"$set": {"status": "closed", "closed_at": datetime.utcnow().isoformat()}})
-                st.success(f"Ticket #{ticket['_id']} closed!")
-                st.rerun()
-
-    else:
-        st.info("No open support tickets.")
-
-with support_tabs[1]:
-    st.markdown("<h3>Recently Closed Support Requests</h3>", unsafe_allow_html=True)
-    closed_tickets = list(tickets_collection.find({"status": "closed"}).sort("closed_at", -1).limit(20))
-
-    if closed_tickets:
-        for ticket in closed_tickets:
-            closed_at_str = ticket.get("closed_at", datetime.utcnow().isoformat())
-            closed_at = datetime.fromisoformat(closed_at_str)
-            
-            st.markdown(f"""
-            <div class="ticket-card closed-ticket">
-                <div class="ticket-header">
-                    <span class="ticket-id">Ticket ID: <code>{ticket['_id']}</code></code></span>
-                    <span class="ticket-aging">Closed: <strong>{closed_at.strftime('%Y-%m-%d %H:%M')}</strong></span>
+                """, unsafe_allow_html=True)
+                st.button("Close Ticket", key=f"close_btn_{ticket['_id']}", on_click=run_ticket_action,
+                          args=("close", "open_tickets", [ticket["_id"]]), use_container_width=True)
+            render_page_controls("open_tickets", next_open_cursor, len(open_tickets))
+
+        else:
+            st.info("No open support tickets.")
+
+    with support_tabs[1], render_metrics.section("Support Tickets / Closed"):
+        st.markdown("<h3>Recently Closed Support Requests</h3>", unsafe_allow_html=True)
+        closed_tickets, next_closed_cursor = paginate(
+            "closed_tickets",
+            lambda cursor, page_size: cached_ticket_view(
+                "closed_tickets", (cursor, page_size),
+                lambda: fetch_page(tickets_collection, {"status": "closed"}, "closed_at", cursor, page_size, DESCENDING)
+            )
+        )
+
+        if closed_tickets:
+            render_ticket_action_bar(
+                "closed_tickets", [ticket["_id"] for ticket in closed_tickets],
+                [("Reopen Selected", "reopen"), ("Assign Selected", "assign")]
+            )
+            for ticket in closed_tickets:
+                closed_at_str = ticket.get("closed_at", datetime.utcnow().isoformat())
+                closed_at = datetime.fromisoformat(closed_at_str)
+
+                st.checkbox("Select", key=f"select_closed_tickets_{ticket['_id']}")
+                st.markdown(f"""
+                <div class="ticket-card closed-ticket">
+                    <div class="ticket-header">
+                        <span class="ticket-id">Ticket ID: <code>{ticket['_id']}</code></code></span>
+                        <span class="ticket-aging">Closed: <strong>{closed_at.strftime('%Y-%m-%d %H:%M')}</strong></span>
+                    </div>
+                    <p><strong>Query:</strong> {ticket['query']}</p>
+                    <p><strong>Contact:</strong> {ticket.get('contact', 'anonymous')}</p>
+                    <p><strong>Assignee:</strong> {ticket.get('assignee') or 'unassigned'}</p>
+                    <p><strong>Status:</strong> <span class="status-closed">CLOSED</span></p>
                 </div>
-                <p><strong>Query:</strong> {ticket['query']}</p>
-                <p><strong>Contact:</strong> {ticket.get('contact', 'anonymous')}</p>
-                <p><strong>Status:</strong> <span class="status-closed">CLOSED</span></p>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.info("No closed support tickets found.")
+                """, unsafe_allow_html=True)
+            render_page_controls("closed_tickets", next_closed_cursor, len(closed_tickets))
+        else:
+            st.info("No closed support tickets found.")
+
+render_support_tickets()
 
 st.markdown("""
 <style>
@@ -1504,4 +1889,20 @@ st.markdown("""
     }
 
 </style>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+render_metrics.record_section("Total", render_metrics.run_seconds())
+
+if show_render_timings:
+    with st.sidebar.expander("Render Timings", expanded=True):
+        run_timings = pd.DataFrame(render_metrics.run_timings(), columns=["Section", "Seconds"])
+        st.dataframe(run_timings.sort_values("Seconds", ascending=False).round(4), use_container_width=True, hide_index=True)
+        cache_events = pd.DataFrame(render_metrics.run_cache_events(), columns=["Function", "Result"])
+        if not cache_events.empty:
+            st.dataframe(cache_events.value_counts().rename("Calls").reset_index(), use_container_width=True, hide_index=True)
+        st.caption(f"Cumulative metrics are written to {metrics_file}")
+
+try:
+    render_metrics.write_prometheus(metrics_file)
+except OSError as e:
+    st.sidebar.warning(f"Could not write render metrics: {e}")
@@ -0,0 +1,50 @@
+import re
+
+from pymongo import ASCENDING
+
+DEFAULT_PAGE_SIZE = 25
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+PICKER_PAGE_SIZE = 50
+
+
+def page_sort(sort_field, direction=ASCENDING):
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def prefix_query(field, prefix):
+    # An anchored, case-sensitive regex can use the index on field as a range scan.
+    return {field: {"$regex": f"^{re.escape(prefix)}"}} if prefix else {}
+
+
+def keyset_query(query, sort_field, cursor=None, direction=ASCENDING):
+    if cursor is None:
+        return query
+    value, last_id = cursor
+    op = "$gt" if direction == ASCENDING else "$lt"
+    after = {"$or": [{sort_field: {op: value}}, {sort_field: value, "_id": {op: last_id}}]}
+    return {"$and": [query, after]} if query else after
+
+
+def page_pipeline(query, sort_field, cursor=None, page_size=DEFAULT_PAGE_SIZE, direction=ASCENDING):
+    return [
+        {"$match": keyset_query(query, sort_field, cursor, direction)},
+        {"$sort": dict(page_sort(sort_field, direction))},
+        {"$limit": page_size + 1},
+    ]
+
+
+def split_page(docs, sort_field, page_size):
+    # One extra document tells us whether there is a next page without a count query.
+    if len(docs) <= page_size:
+        return docs, None
+    docs = docs[:page_size]
+    return docs, (docs[-1].get(sort_field), docs[-1]["_id"])
+
+
+def fetch_page(collection, query, sort_field, cursor=None, page_size=DEFAULT_PAGE_SIZE, direction=ASCENDING, projection=None):
+    docs = list(
+        collection.find(keyset_query(query, sort_field, cursor, direction), projection)
+        .sort(page_sort(sort_field, direction))
+        .limit(page_size + 1)
+    )
+    return split_page(docs, sort_field, page_size)
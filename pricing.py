@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from api_configs import API_CONFIGS
+
+ANY_ENDPOINT = "*"
+PRICE_EPOCH = pd.Timestamp("1970-01-01")
+DEFAULT_TIERS = [{"from": 0, "multiplier": 1.0}]
+
+
+def price_table(api_configs=API_CONFIGS):
+    # One row per (api, endpoint, effective_from). Optional config keys:
+    #   "endpoint_cost_per_call": {"/process": 0.0015}
+    #   "price_changes": [{"effective_from": "2025-07-01", "cost_per_call": 0.0012, "endpoint": "/process"}]
+    # The most recent price in effect wins; on the same effective date an endpoint price beats the
+    # API-wide one. A later API-wide change therefore also replaces older endpoint prices.
+    rows = []
+    for api, config in api_configs.items():
+        rows.append((api, ANY_ENDPOINT, PRICE_EPOCH, config.get("cost_per_call", 0)))
+        for endpoint, cost in config.get("endpoint_cost_per_call", {}).items():
+            rows.append((api, endpoint, PRICE_EPOCH, cost))
+        for change in config.get("price_changes", []):
+            rows.append((api, change.get("endpoint", ANY_ENDPOINT), pd.Timestamp(change["effective_from"]), change["cost_per_call"]))
+    table = pd.DataFrame(rows, columns=["api", "endpoint", "effective_from", "cost_per_call"])
+    table["api"] = table["api"].astype(str)
+    table["endpoint"] = table["endpoint"].astype(str)
+    table["effective_from"] = table["effective_from"].astype("datetime64[ns]")
+    table["cost_per_call"] = table["cost_per_call"].astype(float)
+    return table.sort_values("effective_from", kind="stable").reset_index(drop=True)
+
+
+def tier_table(api_configs=API_CONFIGS):
+    # "volume_tiers": [{"from": 0, "multiplier": 1.0}, {"from": 100000, "multiplier": 0.8}] applies
+    # graduated discounts to monthly volume. Returns per-API bounds and multipliers padded to one width.
+    apis = list(api_configs)
+    tiers = [sorted(api_configs[api].get("volume_tiers", DEFAULT_TIERS), key=lambda tier: tier["from"]) for api in apis]
+    width = max(len(api_tiers) for api_tiers in tiers) if tiers else 1
+    lower = np.full((len(apis) + 1, width), np.inf)
+    multipliers = np.zeros((len(apis) + 1, width))
+    for row, api_tiers in enumerate(tiers + [DEFAULT_TIERS]):
+        lower[row, :len(api_tiers)] = [tier["from"] for tier in api_tiers]
+        multipliers[row, :len(api_tiers)] = [tier["multiplier"] for tier in api_tiers]
+    upper = np.concatenate([lower[:, 1:], np.full((len(lower), 1), np.inf)], axis=1)
+    return apis, lower, upper, multipliers
+
+
+def unit_prices(usage, api_configs=API_CONFIGS):
+    table = price_table(api_configs)
+    keys = pd.DataFrame({
+        "api": usage["api"].astype(str).to_numpy(),
+        "endpoint": usage["endpoint"].astype(str).to_numpy(),
+        "timestamp": pd.to_datetime(usage["timestamp"]).astype("datetime64[ns]").to_numpy(),
+        "row": np.arange(len(usage)),
+    }).sort_values("timestamp", kind="stable")
+
+    specific = pd.merge_asof(
+        keys, table[table["endpoint"] != ANY_ENDPOINT],
+        left_on="timestamp", right_on="effective_from", by=["api", "endpoint"],
+    )
+    fallback = pd.merge_asof(
+        keys, table[table["endpoint"] == ANY_ENDPOINT].drop(columns="endpoint"),
+        left_on="timestamp", right_on="effective_from", by="api",
+    )
+    # Effective date first, specificity second: NaT compares False, so a missing API-wide price
+    # never overrides an endpoint price.
+    use_specific = specific["cost_per_call"].notna().to_numpy() & ~(
+        fallback["effective_from"].to_numpy() > specific["effective_from"].to_numpy()
+    )
+    prices = np.empty(len(usage))
+    prices[keys["row"].to_numpy()] = np.where(
+        use_specific, specific["cost_per_call"].to_numpy(), fallback["cost_per_call"].fillna(0).to_numpy()
+    )
+    return prices
+
+
+def tiered_call_units(usage, calls, tier_keys=("api",), api_configs=API_CONFIGS, prior_calls=None):
+    # Calls weighted by the tier multipliers their position in the month's running volume falls into.
+    # prior_calls (tier_keys + "month" + "calls") carries the volume from the 1st of a month up to the
+    # first row, so a range that starts mid-month does not restart the tiers at zero.
+    timestamps = pd.to_datetime(usage["timestamp"])
+    frame = pd.DataFrame({field: usage[field].astype(str).to_numpy() for field in tier_keys})
+    frame["timestamp"] = timestamps.to_numpy()
+    frame["month"] = frame["timestamp"].to_numpy().astype("datetime64[M]")
+    frame["calls"] = calls
+    order = frame.sort_values("timestamp", kind="stable").index
+    frame = frame.loc[order]
+    end = frame.groupby(list(tier_keys) + ["month"], sort=False)["calls"].cumsum().to_numpy(dtype=float)
+    if prior_calls is not None and not prior_calls.empty:
+        prior = prior_calls.astype({field: str for field in tier_keys})
+        prior["month"] = pd.to_datetime(prior["month"]).to_numpy().astype("datetime64[M]")
+        prior = prior.groupby(list(tier_keys) + ["month"], as_index=False)["calls"].sum()
+        offsets = frame[list(tier_keys) + ["month"]].merge(prior, how="left", on=list(tier_keys) + ["month"])["calls"]
+        end = end + offsets.fillna(0).to_numpy(dtype=float)
+    start = end - frame["calls"].to_numpy(dtype=float)
+
+    apis, lower, upper, multipliers = tier_table(api_configs)
+    api_index = pd.Index(apis).get_indexer(usage["api"].astype(str).to_numpy()[order])
+    api_index[api_index < 0] = len(apis)
+    in_tier = np.minimum(end[:, None], upper[api_index]) - np.maximum(start[:, None], lower[api_index])
+    units = np.empty(len(frame))
+    units[order] = (np.clip(in_tier, 0, None) * multipliers[api_index]).sum(axis=1)
+    return units
+
+
+def price_usage(usage, tier_keys=("api",), api_configs=API_CONFIGS, prior_calls=None):
+    # usage needs api, endpoint and timestamp columns, plus "calls" for pre-aggregated rows
+    # (raw log rows count as one call each). See tiered_call_units for prior_calls.
+    priced = usage.copy()
+    if priced.empty:
+        priced["Unit Price"] = pd.Series(dtype=float)
+        priced["Cost"] = pd.Series(dtype=float)
+        return priced
+    priced = priced.reset_index(drop=True)
+    calls = priced["calls"].to_numpy(dtype=float) if "calls" in priced else np.ones(len(priced))
+    priced["Unit Price"] = unit_prices(priced, api_configs)
+    priced["Cost"] = priced["Unit Price"] * tiered_call_units(priced, calls, tier_keys, api_configs, prior_calls)
+    return priced
@@ -0,0 +1,138 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from aggregations import LOG_DEFAULTS, build_log_query, log_value
+from api_configs import API_CONFIGS
+
+# Two writers, two collections: QUOTA_COLLECTION counts logged calls (record_logs, sync_rollups and
+# the backfill) and is what the dashboard reads; try_consume admits requests against
+# QUOTA_RESERVATION_COLLECTION. Sharing one would count a checked-then-logged call twice and let a
+# backfill replace the admissions.
+QUOTA_COLLECTION = "api_quota_counters"
+QUOTA_RESERVATION_COLLECTION = "api_quota_reservations"
+QUOTA_KEY_FIELDS = ["day", "api", "api_key"]
+API_TOTAL_KEY = "*"
+
+
+def quota_day(now=None):
+    now = now or datetime.utcnow()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def quota_filter(api_name, api_key=None, now=None):
+    return {"day": quota_day(now), "api": api_name, "api_key": api_key or API_TOTAL_KEY}
+
+
+def daily_quota(api_name, api_configs=API_CONFIGS):
+    return api_configs.get(api_name, {}).get("quota_daily")
+
+
+def ensure_quota_indexes(db):
+    for collection_name in (QUOTA_COLLECTION, QUOTA_RESERVATION_COLLECTION):
+        db[collection_name].create_index([(field, ASCENDING) for field in QUOTA_KEY_FIELDS], unique=True, name="quota_key")
+        db[collection_name].create_index(
+            [("day", ASCENDING), ("api", ASCENDING), ("calls", DESCENDING)], name="day_api_calls"
+        )
+
+
+def key_quota(api_name, api_configs=API_CONFIGS):
+    # Optional per-key cap; without it keys only share the API-wide quota_daily.
+    return api_configs.get(api_name, {}).get("quota_daily_per_key")
+
+
+def _guarded_increment(collection, scope_filter, calls, limit):
+    # Increments only while the counter stays within the limit and returns the new document, or None
+    # when over quota. If the document exists but fails the guard, the upsert collides with the
+    # unique key; the same collision happens when two first-of-day upserts race, so retry once as a
+    # plain guarded update to tell the two apart. A request larger than the whole limit is refused
+    # up front, since the upsert would otherwise create the day's first document with it.
+    if calls > limit:
+        return None
+    query = dict(scope_filter, calls={"$lte": limit - calls})
+    try:
+        return collection.find_one_and_update(query, {"$inc": {"calls": calls}}, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        return collection.find_one_and_update(query, {"$inc": {"calls": calls}}, return_document=ReturnDocument.AFTER)
+
+
+def try_consume(db, api_name, api_key=None, calls=1, limit=None, key_limit=None, now=None):
+    # Admission check for a gateway, before the call is served. The API total ("*") is checked
+    # against quota_daily; the key counter only against a per-key limit when one is configured. A
+    # refused key rolls back the API total it already took.
+    collection = db[QUOTA_RESERVATION_COLLECTION]
+    limit = daily_quota(api_name) if limit is None else limit
+    key_limit = key_quota(api_name) if key_limit is None else key_limit
+    total_filter = quota_filter(api_name, None, now)
+    if limit is None:
+        doc = collection.find_one_and_update(total_filter, {"$inc": {"calls": calls}}, upsert=True, return_document=ReturnDocument.AFTER)
+    else:
+        doc = _guarded_increment(collection, total_filter, calls, limit)
+    if doc is None:
+        return False, usage_today(collection, api_name, api_key, now)
+    if not api_key:
+        return True, doc["calls"]
+
+    key_filter = quota_filter(api_name, api_key, now)
+    if key_limit is None:
+        doc = collection.find_one_and_update(key_filter, {"$inc": {"calls": calls}}, upsert=True, return_document=ReturnDocument.AFTER)
+    else:
+        doc = _guarded_increment(collection, key_filter, calls, key_limit)
+    if doc is None:
+        collection.update_one(total_filter, {"$inc": {"calls": -calls}})
+        return False, usage_today(collection, api_name, api_key, now)
+    return True, doc["calls"]
+
+
+def usage_today(collection, api_name, api_key=None, now=None):
+    doc = collection.find_one(quota_filter(api_name, api_key, now), {"_id": 0, "calls": 1})
+    return doc["calls"] if doc else 0
+
+
+def remaining_quota(collection, api_name, api_key=None, limit=None, now=None):
+    limit = daily_quota(api_name) if limit is None else limit
+    if limit is None:
+        return None
+    return limit - usage_today(collection, api_name, api_key, now)
+
+
+def key_usage_today(collection, api_name, limit=10, now=None):
+    query = {"day": quota_day(now), "api": api_name, "api_key": {"$ne": API_TOTAL_KEY}}
+    return list(collection.find(query, {"_id": 0, "api_key": 1, "calls": 1}).sort("calls", DESCENDING).limit(limit))
+
+
+def build_quota_updates(logs):
+    counts = {}
+    for log in logs:
+        day = quota_day(log["timestamp"])
+        api = log_value(log, "api")
+        for api_key in (API_TOTAL_KEY, log.get("api_key")):
+            if api_key:
+                counts[(day, api, api_key)] = counts.get((day, api, api_key), 0) + 1
+    return [
+        UpdateOne(dict(zip(QUOTA_KEY_FIELDS, key)), {"$inc": {"calls": calls}}, upsert=True)
+        for key, calls in counts.items()
+    ]
+
+
+def apply_logs_to_quotas(db, logs):
+    updates = build_quota_updates(logs)
+    if updates:
+        db[QUOTA_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def backfill_quota_counters(db, start_date=None, end_date=None, log_filter=None):
+    ensure_quota_indexes(db)
+    day = {"$dateTrunc": {"date": "$timestamp", "unit": "day"}}
+    api = {"$ifNull": ["$api", LOG_DEFAULTS["api"]]}
+    merge = {"$merge": {"into": QUOTA_COLLECTION, "on": QUOTA_KEY_FIELDS, "whenMatched": "replace", "whenNotMatched": "insert"}}
+    log_match = dict(build_log_query(start_date, end_date), **(log_filter or {}))
+    key_match = dict(log_match, api_key={"$exists": True, "$ne": None})
+    for match, api_key in ((log_match, API_TOTAL_KEY), (key_match, "$api_key")):
+        db["api_usage_logs"].aggregate([
+            {"$match": match},
+            {"$group": {"_id": {"day": day, "api": api, "api_key": api_key}, "calls": {"$sum": 1}}},
+            {"$replaceWith": {"$mergeObjects": ["$_id", {"calls": "$calls"}]}},
+            merge,
+        ], allowDiskUse=True)
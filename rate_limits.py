@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from aggregations import LOG_DEFAULTS, build_match_stage
+from api_configs import API_CONFIGS
+
+RPS_COLUMNS = ["Active Seconds", "Peak RPS", "p99 RPS", "Seconds Over Limit"]
+
+
+def rps_histogram_pipeline(start_date=None, end_date=None, api_name=None, by=("api",)):
+    # Count calls per second, then collapse to "how many seconds ran at N calls/sec" per day,
+    # so the client only receives one row per distinct rate instead of one per second.
+    second_key = {field: {"$ifNull": [f"${field}", LOG_DEFAULTS[field]]} for field in by}
+    second_key["second"] = {"$dateTrunc": {"date": "$timestamp", "unit": "second"}}
+    day_key = {field: f"$_id.{field}" for field in by}
+    day_key["day"] = {"$dateTrunc": {"date": "$_id.second", "unit": "day"}}
+    day_key["rps"] = "$calls"
+    project = {"_id": 0, "day": "$_id.day", "rps": "$_id.rps", "seconds": 1}
+    project.update({field: f"$_id.{field}" for field in by})
+    return [
+        build_match_stage(start_date, end_date, api_name),
+        {"$group": {"_id": second_key, "calls": {"$sum": 1}}},
+        {"$group": {"_id": day_key, "seconds": {"$sum": 1}}},
+        {"$project": project},
+    ]
+
+
+def summarize_rps_histogram(histogram, by=("api",), quantile=0.99, api_configs=API_CONFIGS):
+    keys = list(by) + ["day"]
+    if histogram.empty:
+        return pd.DataFrame(columns=keys + RPS_COLUMNS + ["Rate Limit"])
+
+    histogram = histogram.sort_values(keys + ["rps"]).reset_index(drop=True)
+    limits = histogram["api"].map(lambda api: api_configs.get(api, {}).get("rate_limit_per_second", np.nan))
+    histogram["over"] = np.where(histogram["rps"].to_numpy() > limits.to_numpy(), histogram["seconds"], 0)
+    grouped = histogram.groupby(keys, sort=False)
+    histogram["cumulative"] = grouped["seconds"].cumsum()
+    histogram["total"] = grouped["seconds"].transform("sum")
+
+    # Weighted quantile: the first rate whose cumulative share of seconds reaches the quantile.
+    reached = histogram[histogram["cumulative"] >= quantile * histogram["total"]]
+    summary = grouped.agg(**{
+        "Active Seconds": ("seconds", "sum"),
+        "Peak RPS": ("rps", "max"),
+        "Seconds Over Limit": ("over", "sum"),
+    })
+    summary["p99 RPS"] = reached.groupby(keys, sort=False)["rps"].first()
+    summary = summary.reset_index()
+    summary["Rate Limit"] = summary["api"].map(lambda api: api_configs.get(api, {}).get("rate_limit_per_second"))
+    return summary[keys + RPS_COLUMNS + ["Rate Limit"]]
+
+
+def peak_rps(collection, start_date=None, end_date=None, api_name=None, by=("api",)):
+    pipeline = rps_histogram_pipeline(start_date, end_date, api_name, by)
+    histogram = pd.DataFrame(list(collection.aggregate(pipeline, allowDiskUse=True)), columns=list(by) + ["day", "rps", "seconds"])
+    histogram["day"] = pd.to_datetime(histogram["day"])
+    return summarize_rps_histogram(histogram, by)
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from log_cache import overlap_floor
+
+ROLLUP_STATE_COLLECTION = "rollup_state"
+ROLLUP_STATE_ID = "api_usage_logs"
+ROLLED_UP_FIELD = "rolled_up"
+
+
+def newest_log_id(db):
+    newest = db["api_usage_logs"].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return newest["_id"] if newest else None
+
+
+def load_watermark(db):
+    state = db[ROLLUP_STATE_COLLECTION].find_one({"_id": ROLLUP_STATE_ID})
+    return state["last_id"] if state else None
+
+
+def save_watermark(db, watermark):
+    db[ROLLUP_STATE_COLLECTION].update_one(
+        {"_id": ROLLUP_STATE_ID}, {"$set": {"last_id": watermark, "synced_at": datetime.utcnow()}}, upsert=True
+    )
+
+
+def flag_rolled_up(db, query):
+    db["api_usage_logs"].update_many(query, {"$set": {ROLLED_UP_FIELD: True}})
+
+
+def counted_logs_filter(db):
+    # Logs the rollups, sketches and quota counters already include: everything at or below the
+    # overlap floor of the sync watermark, plus logs flagged by record_logs or sync_rollups. Partial
+    # rebuilds count only these and leave the rest to sync_rollups, so neither counts a log twice.
+    # None before the first sync, when sync_rollups starts with a full rebuild anyway.
+    watermark = load_watermark(db)
+    if watermark is None:
+        return None
+    return {"$or": [{"_id": {"$lte": overlap_floor(watermark)}}, {ROLLED_UP_FIELD: True}]}
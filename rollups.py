@@ -0,0 +1,307 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+from aggregations import LOG_DEFAULTS, as_datetime, build_log_query, build_match_stage, log_value, run_pipeline
+from log_cache import overlap_floor
+from quotas import apply_logs_to_quotas, backfill_quota_counters
+from rollup_state import (
+    ROLLED_UP_FIELD, counted_logs_filter, flag_rolled_up, load_watermark, newest_log_id, save_watermark,
+)
+from sketches import (
+    apply_logs_to_distinct_sketches, apply_logs_to_sketches, backfill_distinct_sketches, backfill_latency_sketches,
+)
+
+ROLLUP_COLLECTIONS = {
+    "hour": "api_usage_rollup_hourly",
+    "day": "api_usage_rollup_daily",
+}
+# Buckets hold no cost: tiered and effective-dated prices depend on month-to-date volume, so
+# pricing.price_usage prices the call counts at read time.
+ROLLUP_DIMENSIONS = ["api", "endpoint", "api_version", "country", "status_code", "user_id"]
+ROLLUP_KEY_FIELDS = ["bucket"] + ROLLUP_DIMENSIONS
+SYNC_BATCH_SIZE = 5000
+
+
+def truncate_timestamp(timestamp, granularity):
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def ensure_rollup_indexes(db):
+    for collection_name in ROLLUP_COLLECTIONS.values():
+        db[collection_name].create_index(
+            [(field, ASCENDING) for field in ROLLUP_KEY_FIELDS],
+            unique=True,
+            name="rollup_key",
+        )
+        db[collection_name].create_index([("api", ASCENDING), ("bucket", ASCENDING)], name="api_bucket")
+
+
+def build_rollup_updates(logs, granularity):
+    buckets = {}
+    for log in logs:
+        key = (truncate_timestamp(log["timestamp"], granularity),) + tuple(
+            log_value(log, field) for field in ROLLUP_DIMENSIONS
+        )
+        latency = float(log_value(log, "latency_ms"))
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {"calls": 1, "latency_sum": latency, "latency_min": latency, "latency_max": latency}
+        else:
+            bucket["calls"] += 1
+            bucket["latency_sum"] += latency
+            bucket["latency_min"] = min(bucket["latency_min"], latency)
+            bucket["latency_max"] = max(bucket["latency_max"], latency)
+
+    updates = []
+    for key, bucket in buckets.items():
+        updates.append(UpdateOne(
+            dict(zip(ROLLUP_KEY_FIELDS, key)),
+            {
+                "$inc": {
+                    "calls": bucket["calls"],
+                    "latency_sum": bucket["latency_sum"],
+                },
+                "$min": {"latency_min": bucket["latency_min"]},
+                "$max": {"latency_max": bucket["latency_max"]},
+            },
+            upsert=True,
+        ))
+    return updates
+
+
+def apply_logs_to_rollups(db, logs):
+    for granularity, collection_name in ROLLUP_COLLECTIONS.items():
+        updates = build_rollup_updates(logs, granularity)
+        if updates:
+            db[collection_name].bulk_write(updates, ordered=False)
+    apply_logs_to_sketches(db, logs)
+    apply_logs_to_distinct_sketches(db, logs)
+    apply_logs_to_quotas(db, logs)
+
+
+def record_logs(db, logs):
+    # The write path for new logs: the counters move with the insert. Logs are flagged as applied so
+    # sync_rollups skips them; a crash between the two steps is repaired by the backfill command.
+    if not logs:
+        return
+    for log in logs:
+        log[ROLLED_UP_FIELD] = True
+    db["api_usage_logs"].insert_many(logs, ordered=False)
+    apply_logs_to_rollups(db, logs)
+
+
+def backfill_rollups(db, granularities=("hour", "day"), start_date=None, end_date=None):
+    ensure_rollup_indexes(db)
+    # A full rebuild counts every log up to the newest _id and moves the sync watermark there. A
+    # partial one (a date range or a single granularity) counts only the logs the counters already
+    # include and leaves the rest to sync_rollups. Either way no log is counted twice.
+    full_rebuild = start_date is None and end_date is None and set(granularities) == set(ROLLUP_COLLECTIONS)
+    watermark = newest_log_id(db) if full_rebuild else None
+    if full_rebuild:
+        log_filter = {"_id": {"$lte": watermark}} if watermark is not None else None
+    else:
+        log_filter = counted_logs_filter(db)
+    match_stage = {"$match": dict(build_log_query(start_date, end_date), **(log_filter or {}))}
+    for granularity in granularities:
+        group_id = {"bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}}}
+        for field in ROLLUP_DIMENSIONS:
+            group_id[field] = {"$ifNull": [f"${field}", LOG_DEFAULTS[field]]}
+        latency = {"$ifNull": ["$latency_ms", LOG_DEFAULTS["latency_ms"]]}
+        pipeline = [
+            match_stage,
+            {"$group": {
+                "_id": group_id,
+                "calls": {"$sum": 1},
+                "latency_sum": {"$sum": latency},
+                "latency_min": {"$min": latency},
+                "latency_max": {"$max": latency},
+            }},
+            {"$replaceWith": {"$mergeObjects": [
+                "$_id",
+                {"calls": "$calls", "latency_sum": "$latency_sum",
+                 "latency_min": "$latency_min", "latency_max": "$latency_max"},
+            ]}},
+            {"$merge": {
+                "into": ROLLUP_COLLECTIONS[granularity],
+                "on": ROLLUP_KEY_FIELDS,
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]
+        db["api_usage_logs"].aggregate(pipeline, allowDiskUse=True)
+    if "hour" in granularities:
+        backfill_latency_sketches(db, start_date, end_date, log_filter=log_filter)
+    if "day" in granularities:
+        backfill_distinct_sketches(db, start_date, end_date, log_filter=log_filter)
+        backfill_quota_counters(db, start_date, end_date, log_filter=log_filter)
+    if watermark is not None:
+        flag_rolled_up(db, {"_id": {"$gt": overlap_floor(watermark), "$lte": watermark}})
+        save_watermark(db, watermark)
+
+
+def _apply_pending(db, logs):
+    apply_logs_to_rollups(db, logs)
+    flag_rolled_up(db, {"_id": {"$in": [log["_id"] for log in logs]}})
+
+
+def sync_rollups(db, batch_size=SYNC_BATCH_SIZE):
+    # Applies logs from writers that bypass record_logs. Unflagged logs above the overlap floor of the
+    # last watermark are $inc'ed into the rollups, sketches and quota counters and then flagged, so
+    # neither a repeated sync nor record_logs counts a log twice. Returns the new _id watermark.
+    watermark = newest_log_id(db)
+    if watermark is None:
+        return None
+    last_id = load_watermark(db)
+    if last_id is None or watermark < last_id:
+        backfill_rollups(db)
+        return watermark
+    if watermark == last_id:
+        return watermark
+
+    query = {
+        "_id": {"$gt": overlap_floor(last_id), "$lte": watermark},
+        "timestamp": {"$type": "date"},
+        ROLLED_UP_FIELD: {"$ne": True},
+    }
+    pending = []
+    for log in db["api_usage_logs"].find(query, batch_size=batch_size).sort("_id", 1):
+        pending.append(log)
+        if len(pending) == batch_size:
+            _apply_pending(db, pending)
+            pending = []
+    if pending:
+        _apply_pending(db, pending)
+    save_watermark(db, watermark)
+    return watermark
+
+
+def rollup_match(start_date=None, end_date=None, api_name=None):
+    return build_match_stage(start_date, end_date, api_name, field="bucket")
+
+
+def rollup_api_totals_pipeline(start_date=None, end_date=None):
+    return [
+        rollup_match(start_date, end_date),
+        {"$group": {
+            "_id": "$api",
+            "Calls": {"$sum": "$calls"},
+            "Latency Sum": {"$sum": "$latency_sum"},
+        }},
+        {"$project": {"_id": 0, "API": "$_id", "Calls": 1, "Latency Sum": 1}},
+        {"$sort": {"Calls": -1}},
+    ]
+
+
+def rollup_api_totals(db, start_date=None, end_date=None, granularity="day"):
+    pipeline = rollup_api_totals_pipeline(start_date, end_date)
+    return run_pipeline(db[ROLLUP_COLLECTIONS[granularity]], pipeline, ["API", "Calls", "Latency Sum"])
+
+
+def rollup_daily_usage_pipeline(start_date=None, end_date=None, api_name=None):
+    return [
+        rollup_match(start_date, end_date, api_name),
+        {"$group": {"_id": {"day": "$bucket", "api": "$api"}, "Count": {"$sum": "$calls"}}},
+        {"$project": {"_id": 0, "timestamp": "$_id.day", "api": "$_id.api", "Count": 1}},
+        {"$sort": {"timestamp": 1, "api": 1}},
+    ]
+
+
+def rollup_daily_usage(db, start_date=None, end_date=None, api_name=None):
+    pipeline = rollup_daily_usage_pipeline(start_date, end_date, api_name)
+    df = run_pipeline(db[ROLLUP_COLLECTIONS["day"]], pipeline, ["timestamp", "api", "Count"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def rollup_endpoint_daily_usage_pipeline(start_date=None, end_date=None, api_name=None):
+    return [
+        rollup_match(start_date, end_date, api_name),
+        {"$group": {"_id": {"day": "$bucket", "api": "$api", "endpoint": "$endpoint"}, "calls": {"$sum": "$calls"}}},
+        {"$project": {"_id": 0, "timestamp": "$_id.day", "api": "$_id.api", "endpoint": "$_id.endpoint", "calls": 1}},
+        {"$sort": {"timestamp": 1, "api": 1, "endpoint": 1}},
+    ]
+
+
+def rollup_endpoint_daily_usage(db, start_date=None, end_date=None, api_name=None):
+    pipeline = rollup_endpoint_daily_usage_pipeline(start_date, end_date, api_name)
+    df = run_pipeline(db[ROLLUP_COLLECTIONS["day"]], pipeline, ["timestamp", "api", "endpoint", "calls"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def rollup_month_prefix_pipeline(month_start, start, by=("api",)):
+    return [
+        rollup_match(month_start, start - timedelta(microseconds=1)),
+        {"$group": {"_id": {field: f"${field}" for field in by}, "calls": {"$sum": "$calls"}}},
+        {"$project": {"_id": 0, **{field: f"$_id.{field}" for field in by}, "calls": 1}},
+    ]
+
+
+def rollup_month_prefix_calls(db, start_date, by=("api",)):
+    # Calls from the 1st of start_date's month up to start_date: the volume a range that starts
+    # mid-month carries into its volume tiers (pricing.price_usage prior_calls).
+    start = as_datetime(start_date)
+    month_start = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    columns = list(by) + ["calls"]
+    if start <= month_start:
+        df = pd.DataFrame(columns=columns)
+    else:
+        df = run_pipeline(db[ROLLUP_COLLECTIONS["day"]], rollup_month_prefix_pipeline(month_start, start, by), columns)
+    df["month"] = pd.Timestamp(month_start)
+    return df
+
+
+def rollup_top_values_pipeline(field, start_date=None, end_date=None, limit=None):
+    pipeline = [
+        rollup_match(start_date, end_date),
+        {"$group": {"_id": f"${field}", "Calls": {"$sum": "$calls"}}},
+        {"$sort": {"Calls": -1, "_id": 1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {"_id": 0, field: "$_id", "Calls": 1}})
+    return pipeline
+
+
+def rollup_top_values(db, field, start_date=None, end_date=None, limit=None):
+    pipeline = rollup_top_values_pipeline(field, start_date, end_date, limit)
+    return run_pipeline(db[ROLLUP_COLLECTIONS["day"]], pipeline, [field, "Calls"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the api_usage_logs rollup collections.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Rebuild rollups from api_usage_logs.")
+    backfill_parser.add_argument("--granularity", choices=["hour", "day", "all"], default="all")
+    backfill_parser.add_argument("--days", type=int, default=None, help="Only rebuild the last N days.")
+    subparsers.add_parser("sync", help="Apply logs written without record_logs since the last sync. Run it on a schedule.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    if args.command == "sync":
+        watermark = sync_rollups(db)
+        print(f"Rollups synced up to {watermark}")
+        return
+
+    granularities = ("hour", "day") if args.granularity == "all" else (args.granularity,)
+    start_date = None
+    if args.days:
+        start_date = (datetime.utcnow() - timedelta(days=args.days)).date()
+    backfill_rollups(db, granularities, start_date=start_date)
+    for granularity in granularities:
+        count = db[ROLLUP_COLLECTIONS[granularity]].count_documents({})
+        print(f"{ROLLUP_COLLECTIONS[granularity]}: {count:,} buckets")
+
+
+if __name__ == "__main__":
+    main()
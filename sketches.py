@@ -0,0 +1,386 @@
+import argparse
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+from aggregations import LOG_DEFAULTS, build_log_query, build_match_stage, log_value
+from rollup_state import counted_logs_filter
+
+LATENCY_SKETCH_COLLECTION = "api_latency_sketches"
+SKETCH_KEY_FIELDS = ["bucket", "api", "endpoint"]
+RELATIVE_ACCURACY = 0.01
+PERCENTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99}
+
+DISTINCT_SKETCH_COLLECTION = "api_distinct_sketches"
+DISTINCT_KEY_FIELDS = ["bucket", "api", "field"]
+DISTINCT_FIELDS = ["user_id", "country"]
+HLL_PRECISION = 12
+DISTINCT_BATCH_SIZE = 50000
+
+
+class DDSketch:
+    # Log-spaced buckets: every value in bucket k lies within relative_accuracy of the
+    # bucket's representative value, and two sketches merge by adding bucket counts.
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, bins=None, count=0, zero_count=0, total=0.0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = dict(bins or {})
+        self.count = count
+        self.zero_count = zero_count
+        self.total = total
+
+    def keys(self, values):
+        return np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        positive = values > 0
+        keys, counts = np.unique(self.keys(values[positive]), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += len(values)
+        self.zero_count += int((~positive).sum())
+        self.total += float(values.sum())
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.total += other.total
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        running = self.zero_count
+        if rank < running:
+            return 0.0
+        for key in sorted(self.bins):
+            running += self.bins[key]
+            if running > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_document(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "zero_count": self.zero_count,
+            "latency_sum": self.total,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            doc.get("relative_accuracy", RELATIVE_ACCURACY),
+            bins={int(key): count for key, count in (doc.get("bins") or {}).items()},
+            count=doc.get("count", 0),
+            zero_count=doc.get("zero_count", 0),
+            total=doc.get("latency_sum", 0.0),
+        )
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8) if registers is None else registers
+
+    def register_ranks(self, values):
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object).astype(str))
+        indexes = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        # The remaining bits fit in a float64 mantissa, so frexp gives an exact leading-zero count.
+        rest = (hashes & np.uint64((1 << (64 - self.precision)) - 1)).astype(np.float64)
+        _, exponents = np.frexp(rest)
+        return indexes, (65 - self.precision - exponents).astype(np.uint8)
+
+    def add_many(self, values):
+        indexes, ranks = self.register_ranks(values)
+        np.maximum.at(self.registers, indexes, ranks)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_document(self):
+        nonzero = np.flatnonzero(self.registers)
+        return {
+            "precision": self.precision,
+            "registers": {str(index): int(self.registers[index]) for index in nonzero},
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        sketch = cls(doc.get("precision", HLL_PRECISION))
+        registers = doc.get("registers") or {}
+        if registers:
+            sketch.registers[np.array([int(index) for index in registers])] = list(registers.values())
+        return sketch
+
+
+def ensure_sketch_indexes(db):
+    collection = db[LATENCY_SKETCH_COLLECTION]
+    collection.create_index([(field, ASCENDING) for field in SKETCH_KEY_FIELDS], unique=True, name="sketch_key")
+    collection.create_index([("api", ASCENDING), ("bucket", ASCENDING)], name="api_bucket")
+    collection = db[DISTINCT_SKETCH_COLLECTION]
+    collection.create_index([(field, ASCENDING) for field in DISTINCT_KEY_FIELDS], unique=True, name="distinct_key")
+    collection.create_index([("field", ASCENDING), ("api", ASCENDING), ("bucket", ASCENDING)], name="field_api_bucket")
+
+
+def build_sketch_updates(logs, relative_accuracy=RELATIVE_ACCURACY):
+    if not logs:
+        return []
+    df = pd.DataFrame({
+        "bucket": pd.to_datetime([log["timestamp"] for log in logs]).floor("h"),
+        "api": [log_value(log, "api") for log in logs],
+        "endpoint": [log_value(log, "endpoint") for log in logs],
+        "latency": np.array([log_value(log, "latency_ms") for log in logs], dtype=np.float64),
+    })
+    sketch = DDSketch(relative_accuracy)
+    positive = df["latency"] > 0
+    df["bin"] = np.where(positive, sketch.keys(df["latency"].where(positive, 1.0)), 0)
+
+    updates = []
+    for (bucket, api, endpoint), group in df.groupby(SKETCH_KEY_FIELDS, sort=False):
+        bins = group.loc[group["latency"] > 0, "bin"].value_counts()
+        inc = {
+            "count": len(group),
+            "zero_count": int((group["latency"] <= 0).sum()),
+            "latency_sum": float(group["latency"].sum()),
+        }
+        inc.update({f"bins.{key}": int(count) for key, count in bins.items()})
+        updates.append(UpdateOne(
+            {"bucket": bucket.to_pydatetime(), "api": api, "endpoint": endpoint},
+            {"$inc": inc, "$setOnInsert": {"relative_accuracy": relative_accuracy}},
+            upsert=True,
+        ))
+    return updates
+
+
+def apply_logs_to_sketches(db, logs):
+    updates = build_sketch_updates(logs)
+    if updates:
+        db[LATENCY_SKETCH_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def backfill_latency_sketches(db, start_date=None, end_date=None, relative_accuracy=RELATIVE_ACCURACY, log_filter=None):
+    ensure_sketch_indexes(db)
+    log_gamma = DDSketch(relative_accuracy).log_gamma
+    latency = {"$ifNull": ["$latency_ms", LOG_DEFAULTS["latency_ms"]]}
+    pipeline = [
+        {"$match": dict(build_log_query(start_date, end_date), **(log_filter or {}))},
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+                "api": {"$ifNull": ["$api", LOG_DEFAULTS["api"]]},
+                "endpoint": {"$ifNull": ["$endpoint", LOG_DEFAULTS["endpoint"]]},
+                "bin": {"$cond": [
+                    {"$gt": [latency, 0]},
+                    {"$toString": {"$toLong": {"$ceil": {"$divide": [{"$ln": latency}, log_gamma]}}}},
+                    None,
+                ]},
+            },
+            "count": {"$sum": 1},
+            "latency_sum": {"$sum": latency},
+        }},
+        {"$group": {
+            "_id": {"bucket": "$_id.bucket", "api": "$_id.api", "endpoint": "$_id.endpoint"},
+            "count": {"$sum": "$count"},
+            "zero_count": {"$sum": {"$cond": [{"$eq": ["$_id.bin", None]}, "$count", 0]}},
+            "latency_sum": {"$sum": "$latency_sum"},
+            "bins": {"$push": {"k": "$_id.bin", "v": "$count"}},
+        }},
+        {"$replaceWith": {"$mergeObjects": ["$_id", {
+            "relative_accuracy": relative_accuracy,
+            "count": "$count",
+            "zero_count": "$zero_count",
+            "latency_sum": "$latency_sum",
+            "bins": {"$arrayToObject": {"$filter": {"input": "$bins", "cond": {"$ne": ["$$this.k", None]}}}},
+        }]}},
+        {"$merge": {
+            "into": LATENCY_SKETCH_COLLECTION,
+            "on": SKETCH_KEY_FIELDS,
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    db["api_usage_logs"].aggregate(pipeline, allowDiskUse=True)
+
+
+def build_distinct_updates(logs, fields=DISTINCT_FIELDS, precision=HLL_PRECISION):
+    if not logs:
+        return []
+    df = pd.DataFrame({
+        "bucket": pd.to_datetime([log["timestamp"] for log in logs]).floor("D"),
+        "api": [log_value(log, "api") for log in logs],
+    })
+    sketch = HyperLogLog(precision)
+    updates = []
+    for field in fields:
+        df["register"], df["rank"] = sketch.register_ranks([log_value(log, field) for log in logs])
+        ranks = df.groupby(["bucket", "api", "register"], sort=False)["rank"].max()
+        for (bucket, api), group in ranks.groupby(level=["bucket", "api"], sort=False):
+            updates.append(UpdateOne(
+                {"bucket": bucket.to_pydatetime(), "api": api, "field": field},
+                {
+                    "$max": {f"registers.{register}": int(rank) for (_, _, register), rank in group.items()},
+                    "$setOnInsert": {"precision": precision},
+                },
+                upsert=True,
+            ))
+    return updates
+
+
+def apply_logs_to_distinct_sketches(db, logs):
+    updates = build_distinct_updates(logs)
+    if updates:
+        db[DISTINCT_SKETCH_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def backfill_distinct_sketches(db, start_date=None, end_date=None, fields=DISTINCT_FIELDS, precision=HLL_PRECISION, log_filter=None):
+    # Hashing happens client-side, so the server only ships one row per distinct (day, api, value).
+    ensure_sketch_indexes(db)
+    for field in fields:
+        pipeline = [
+            {"$match": dict(build_log_query(start_date, end_date), **(log_filter or {}))},
+            {"$group": {"_id": {
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}},
+                "api": {"$ifNull": ["$api", LOG_DEFAULTS["api"]]},
+                "value": {"$ifNull": [f"${field}", LOG_DEFAULTS[field]]},
+            }}},
+        ]
+        merged = {}
+        cursor = db["api_usage_logs"].aggregate(pipeline, allowDiskUse=True, batchSize=DISTINCT_BATCH_SIZE)
+        while True:
+            rows = [row["_id"] for _, row in zip(range(DISTINCT_BATCH_SIZE), cursor)]
+            if not rows:
+                break
+            batch = pd.DataFrame(rows)
+            batch["register"], batch["rank"] = HyperLogLog(precision).register_ranks(batch["value"])
+            for (bucket, api), group in batch.groupby(["bucket", "api"], sort=False):
+                sketch = merged.setdefault((bucket, api), HyperLogLog(precision))
+                np.maximum.at(sketch.registers, group["register"].to_numpy(), group["rank"].to_numpy())
+
+        updates = [
+            UpdateOne({"bucket": bucket, "api": api, "field": field}, {"$set": sketch.to_document()}, upsert=True)
+            for (bucket, api), sketch in merged.items()
+        ]
+        if updates:
+            db[DISTINCT_SKETCH_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def _period_start(bucket, freq):
+    return pd.Timestamp(bucket).to_period(freq).start_time
+
+
+def sketch_query(start_date=None, end_date=None, api_name=None):
+    return build_match_stage(start_date, end_date, api_name, field="bucket")["$match"]
+
+
+def merge_sketches(collection, start_date=None, end_date=None, api_name=None, by=("api",), freq=None):
+    merged = {}
+    projection = {"_id": 0, "bucket": 1, "api": 1, "endpoint": 1, "relative_accuracy": 1,
+                  "count": 1, "zero_count": 1, "latency_sum": 1, "bins": 1}
+    for doc in collection.find(sketch_query(start_date, end_date, api_name), projection):
+        key = tuple(doc[field] for field in by)
+        if freq:
+            key = (_period_start(doc["bucket"], freq),) + key
+        sketch = DDSketch.from_document(doc)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    return merged
+
+
+def latency_percentiles(db, start_date=None, end_date=None, api_name=None, by=("api",), freq=None):
+    key_columns = (["timestamp"] if freq else []) + list(by)
+    rows = []
+    merged = merge_sketches(db[LATENCY_SKETCH_COLLECTION], start_date, end_date, api_name, by, freq)
+    for key, sketch in merged.items():
+        rows.append(list(key) + [sketch.count, sketch.mean()] + [sketch.quantile(q) for q in PERCENTILES.values()])
+    df = pd.DataFrame(rows, columns=key_columns + ["Calls", "Mean"] + list(PERCENTILES))
+    if key_columns:
+        df = df.sort_values(key_columns).reset_index(drop=True)
+    return df
+
+
+def distinct_query(field, start_date=None, end_date=None, api_name=None):
+    query = sketch_query(start_date, end_date, api_name)
+    query["field"] = field
+    return query
+
+
+def merge_distinct_sketches(collection, field="user_id", start_date=None, end_date=None, api_name=None, by=("api",), freq=None):
+    merged = {}
+    projection = {"_id": 0, "bucket": 1, "api": 1, "precision": 1, "registers": 1}
+    for doc in collection.find(distinct_query(field, start_date, end_date, api_name), projection):
+        key = tuple(doc[name] for name in by)
+        if freq:
+            key = (_period_start(doc["bucket"], freq),) + key
+        sketch = HyperLogLog.from_document(doc)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    return merged
+
+
+def distinct_counts(db, field="user_id", start_date=None, end_date=None, api_name=None, by=("api",), freq=None):
+    key_columns = (["timestamp"] if freq else []) + list(by)
+    merged = merge_distinct_sketches(db[DISTINCT_SKETCH_COLLECTION], field, start_date, end_date, api_name, by, freq)
+    df = pd.DataFrame([list(key) + [sketch.count()] for key, sketch in merged.items()], columns=key_columns + ["Distinct"])
+    if key_columns:
+        df = df.sort_values(key_columns).reset_index(drop=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the latency and distinct-count sketch collections.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Rebuild sketches from api_usage_logs.")
+    backfill_parser.add_argument("--days", type=int, default=None, help="Only rebuild the last N days.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGODB_URI"))["apiman"]
+
+    start_date = None
+    if args.days:
+        start_date = (datetime.utcnow() - timedelta(days=args.days)).date()
+    # Only the sketches are rebuilt, so they count the same logs as the rollups; sync_rollups adds the rest.
+    log_filter = counted_logs_filter(db)
+    backfill_latency_sketches(db, start_date=start_date, log_filter=log_filter)
+    backfill_distinct_sketches(db, start_date=start_date, log_filter=log_filter)
+    for collection_name in (LATENCY_SKETCH_COLLECTION, DISTINCT_SKETCH_COLLECTION):
+        print(f"{collection_name}: {db[collection_name].count_documents({}):,} sketches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import unittest
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from live_updates import LiveLogFeed
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=None):
+        self.docs = sorted(self.docs, key=lambda doc: doc["_id"])
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class StandaloneCollection:
+    # No change streams, and the first few reads fail the way a reconnecting client does.
+    def __init__(self, docs, failures=0):
+        self.docs = docs
+        self.failures = failures
+        self.queries = []
+
+    def _maybe_fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection reset")
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+    def find_one(self, query, projection=None, sort=None):
+        self._maybe_fail()
+        return max(self.docs, key=lambda doc: doc["_id"]) if self.docs else None
+
+    def aggregate(self, pipeline):
+        self._maybe_fail()
+        return []
+
+    def find(self, query=None, projection=None):
+        self._maybe_fail()
+        self.queries.append(query or {})
+        after = (query or {}).get("_id", {}).get("$gt")
+        return FakeCursor([doc for doc in self.docs if after is None or doc["_id"] > after])
+
+
+class FakeStop:
+    # Stands in for the feed's stop event: _run returns after `waits` waits instead of sleeping.
+    def __init__(self, waits, on_wait=None):
+        self.waits = waits
+        self.on_wait = on_wait
+
+    def is_set(self):
+        return self.waits <= 0
+
+    def set(self):
+        self.waits = 0
+
+    def clear(self):
+        pass
+
+    def wait(self, timeout=None):
+        self.waits -= 1
+        if self.on_wait:
+            self.on_wait()
+        return self.is_set()
+
+
+def log_doc(seconds_ago=0):
+    generated = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    return {"_id": ObjectId.from_datetime(generated), "api": "Image API", "timestamp": datetime.utcnow(),
+            "latency_ms": 10.0, "status_code": 200}
+
+
+class LiveLogFeedPollTest(unittest.TestCase):
+    def test_poll_errors_after_change_stream_fallback_are_retried(self):
+        collection = StandaloneCollection([], failures=2)
+        feed = LiveLogFeed(collection, poll_seconds=0)
+        # Two failed seeds, then the doc arrives after the first successful poll.
+        feed._stop = FakeStop(4, on_wait=lambda: feed._stop.waits == 1 and collection.docs.append(log_doc()))
+        feed._run()
+
+        snapshot = feed.snapshot()
+        self.assertEqual(snapshot["mode"], "polling")
+        self.assertEqual(snapshot["events"], 1)
+        self.assertIsNone(snapshot["error"])
+
+    def test_poll_reads_above_watermark_between_rescans(self):
+        collection = StandaloneCollection([log_doc(seconds_ago=5)])
+        feed = LiveLogFeed(collection)
+        feed._poll(rescan=True)
+        watermark = feed.last_id
+
+        collection.docs.append(log_doc())
+        collection.queries.clear()
+        feed._poll(rescan=False)
+        self.assertEqual(collection.queries, [{"_id": {"$gt": watermark}}])
+        self.assertEqual(feed.snapshot()["events"], 1)
+
+    def test_rescan_picks_up_late_visible_logs_once(self):
+        collection = StandaloneCollection([log_doc()])
+        feed = LiveLogFeed(collection)
+        feed._poll(rescan=True)
+
+        # Becomes visible after the watermark moved past its _id.
+        collection.docs.append(log_doc(seconds_ago=10))
+        feed._poll(rescan=False)
+        self.assertEqual(feed.snapshot()["events"], 0)
+
+        feed._poll(rescan=True)
+        feed._poll(rescan=True)
+        self.assertEqual(feed.snapshot()["events"], 1)
+
+    def test_none_fields_count_with_defaults(self):
+        collection = StandaloneCollection([dict(log_doc(seconds_ago=5), status_code=None, latency_ms=None)])
+        feed = LiveLogFeed(collection)
+        feed._poll(rescan=True)
+
+        collection.docs.append(dict(log_doc(), status_code=None, latency_ms=None))
+        feed._poll(rescan=False)
+        snapshot = feed.snapshot()
+        self.assertEqual(snapshot["events"], 1)
+        self.assertEqual(snapshot["rows"][0]["calls"], 1)
+        self.assertEqual(snapshot["rows"][0]["latency_sum"], 50.0)
+        self.assertEqual(snapshot["rows"][0]["errors"], 0)
+        self.assertEqual(feed.health.window_stats("Image API", 60)["requests"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+
+from log_cache import IncrementalLogCache
+
+OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+    "$in": lambda value, bound: value in bound,
+}
+
+
+def matches(doc, query):
+    for field, condition in (query or {}).items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if not all(OPERATORS[op](value, bound) for op, bound in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def project(doc, projection):
+    fields = [field for field, include in projection.items() if include and field != "_id"]
+    projected = {field: doc[field] for field in fields if field in doc}
+    if projection.get("_id", 1):
+        projected["_id"] = doc["_id"]
+    return projected
+
+
+class LogCollection:
+    def __init__(self):
+        self.docs = []
+        self.queries = []
+
+    def find_one(self, query, projection=None, sort=None):
+        docs = [doc for doc in self.docs if matches(doc, query)]
+        return max(docs, key=lambda doc: doc["_id"]) if docs else None
+
+    def find(self, query=None, projection=None):
+        self.queries.append(query or {})
+        return [project(doc, projection or {}) for doc in self.docs if matches(doc, query)]
+
+    def find_raw_batches(self, query, projection, batch_size=None):
+        self.queries.append(query)
+        docs = [project(doc, projection) for doc in self.docs if matches(doc, query)]
+        return [b"".join(bson.encode(doc) for doc in docs)] if docs else []
+
+    def insert(self, timestamp, seconds_ago=0, api="Image API"):
+        object_id = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=seconds_ago))
+        # from_datetime zeroes the counter bytes; keep ids unique within a second.
+        object_id = ObjectId(object_id.binary[:8] + len(self.docs).to_bytes(4, "big"))
+        self.docs.append({"_id": object_id, "api": api, "timestamp": timestamp, "user_id": "user_1",
+                          "status_code": 200, "country": "USA", "api_version": "v1.0",
+                          "endpoint": "/process", "latency_ms": 10.0})
+        return object_id
+
+
+class IncrementalLogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.collection = LogCollection()
+        for day in range(3):
+            self.collection.insert(self.today - timedelta(days=day) + timedelta(hours=1), seconds_ago=300 - day)
+        self.cache = IncrementalLogCache(self.collection)
+
+    def test_refresh_fetches_only_new_logs(self):
+        start, end = (self.today - timedelta(days=2)).date(), self.today.date()
+        self.assertEqual(len(self.cache.get(start, end)), 3)
+
+        self.collection.insert(self.today + timedelta(hours=2))
+        frame = self.cache.get(start, end)
+        self.assertEqual(len(frame), 4)
+        self.assertEqual(self.cache.stats()["last_delta_rows"], 1)
+
+        self.assertEqual(len(self.cache.get(start, end)), 4)
+        self.assertEqual(self.cache.stats()["last_delta_rows"], 0)
+
+    def test_late_visible_log_below_watermark_is_loaded_once(self):
+        start, end = (self.today - timedelta(days=2)).date(), self.today.date()
+        self.collection.insert(self.today + timedelta(hours=2))
+        self.cache.get(start, end)
+
+        # Its _id sorts below the watermark the cache already read.
+        self.collection.insert(self.today + timedelta(hours=3), seconds_ago=10)
+        self.assertEqual(len(self.cache.get(start, end)), 5)
+        self.assertEqual(len(self.cache.get(start, end)), 5)
+        self.assertEqual(self.cache.stats()["last_delta_rows"], 0)
+
+    def test_window_slides_without_reloading_kept_days(self):
+        self.cache.get((self.today - timedelta(days=2)).date(), (self.today - timedelta(days=1)).date())
+        self.collection.queries.clear()
+
+        frame = self.cache.get((self.today - timedelta(days=1)).date(), self.today.date())
+        self.assertEqual(len(frame), 2)
+        self.assertEqual(frame["timestamp"].min(), self.today - timedelta(days=1) + timedelta(hours=1))
+        self.assertEqual(self.cache.stats()["last_delta_rows"], 1)
+        self.assertNotIn({}, self.collection.queries)
+
+
+if __name__ == "__main__":
+    unittest.main()
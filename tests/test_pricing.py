@@ -0,0 +1,59 @@
+import unittest
+
+import pandas as pd
+
+from pricing import price_usage
+
+API_CONFIGS = {
+    "Image API": {
+        "cost_per_call": 1.0,
+        "endpoint_cost_per_call": {"/upscale": 2.0},
+        "price_changes": [
+            {"effective_from": "2025-03-15", "cost_per_call": 0.5},
+            {"effective_from": "2025-03-20", "cost_per_call": 3.0, "endpoint": "/upscale"},
+        ],
+        "volume_tiers": [{"from": 0, "multiplier": 1.0}, {"from": 100, "multiplier": 0.5}],
+    },
+}
+
+
+def usage(rows):
+    return pd.DataFrame(rows, columns=["api", "endpoint", "timestamp", "calls"]).assign(
+        timestamp=lambda df: pd.to_datetime(df["timestamp"])
+    )
+
+
+class PriceUsageTest(unittest.TestCase):
+    def test_price_changes_resolve_by_effective_date_then_endpoint(self):
+        priced = price_usage(usage([
+            ("Image API", "/upscale", "2025-03-10", 1),
+            ("Image API", "/upscale", "2025-03-16", 1),
+            ("Image API", "/upscale", "2025-03-21", 1),
+            ("Image API", "/resize", "2025-03-16", 1),
+        ]), api_configs=API_CONFIGS)
+        # The API-wide change on the 15th replaces the older endpoint price until the endpoint's own change.
+        self.assertEqual(priced["Unit Price"].tolist(), [2.0, 0.5, 3.0, 0.5])
+
+    def test_tiers_split_a_row_that_crosses_the_boundary(self):
+        priced = price_usage(usage([
+            ("Image API", "/resize", "2025-02-01", 90),
+            ("Image API", "/resize", "2025-02-02", 20),
+            ("Image API", "/resize", "2025-03-01", 10),
+        ]), api_configs=API_CONFIGS)
+        # 10 calls at full price and 10 at half, then the count restarts in March.
+        self.assertEqual(priced["Cost"].tolist(), [90.0, 15.0, 10.0])
+
+    def test_prior_calls_continue_the_month_for_a_mid_month_range(self):
+        rows = usage([("Image API", "/resize", "2025-02-10", 20)])
+        prior = pd.DataFrame({"api": ["Image API"], "calls": [95], "month": [pd.Timestamp("2025-02-01")]})
+        self.assertEqual(price_usage(rows, api_configs=API_CONFIGS)["Cost"].tolist(), [20.0])
+        self.assertEqual(price_usage(rows, api_configs=API_CONFIGS, prior_calls=prior)["Cost"].tolist(), [12.5])
+
+    def test_prior_calls_for_another_month_are_ignored(self):
+        rows = usage([("Image API", "/resize", "2025-03-10", 20)])
+        prior = pd.DataFrame({"api": ["Image API"], "calls": [95], "month": [pd.Timestamp("2025-02-01")]})
+        self.assertEqual(price_usage(rows, api_configs=API_CONFIGS, prior_calls=prior)["Cost"].tolist(), [20.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from pagination import DEFAULT_PAGE_SIZE, page_pipeline, split_page
+
+AGING_BUCKETS = {
+    "under_24h": (None, 24),
+    "24_to_72h": (24, 72),
+    "over_72h": (72, None),
+}
+
+
+def hours_open_stage(now):
+    created_at = {"$dateFromString": {"dateString": "$created_at", "onError": None}}
+    return {"$addFields": {
+        "hours_open": {"$round": [{"$divide": [{"$subtract": [now, created_at]}, 3600 * 1000]}, 2]},
+    }}
+
+
+def open_tickets_pipeline(cursor=None, page_size=DEFAULT_PAGE_SIZE, now=None):
+    # created_at is a UTC isoformat string, so oldest-first string order is longest-open-first,
+    # and hours_open is only computed for the page being returned.
+    now = now or datetime.utcnow()
+    return page_pipeline({"status": "open"}, "created_at", cursor, page_size) + [hours_open_stage(now)]
+
+
+def open_tickets_page(collection, cursor=None, page_size=DEFAULT_PAGE_SIZE, now=None):
+    docs = list(collection.aggregate(open_tickets_pipeline(cursor, page_size, now)))
+    return split_page(docs, "created_at", page_size)
+
+
+def ticket_aging_pipeline(now=None):
+    now = now or datetime.utcnow()
+    facets = {}
+    for name, (min_hours, max_hours) in AGING_BUCKETS.items():
+        created_at = {}
+        if max_hours is not None:
+            created_at["$gt"] = (now - timedelta(hours=max_hours)).isoformat()
+        if min_hours is not None:
+            created_at["$lte"] = (now - timedelta(hours=min_hours)).isoformat()
+        facets[name] = [{"$match": {"created_at": created_at}}, {"$count": "count"}]
+    return [
+        {"$match": {"status": "open"}},
+        {"$project": {"_id": 0, "created_at": 1}},
+        {"$facet": facets},
+    ]
+
+
+def ticket_aging_counts(collection, now=None):
+    result = next(collection.aggregate(ticket_aging_pipeline(now)), {})
+    counts = {name: (result.get(name) or [{}])[0].get("count", 0) for name in AGING_BUCKETS}
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+def aging_bucket(hours_open):
+    for name, (min_hours, max_hours) in AGING_BUCKETS.items():
+        if (min_hours is None or hours_open >= min_hours) and (max_hours is None or hours_open < max_hours):
+            return name
+
+
+def ticket_action_update(action, assignee=None, now=None):
+    now = now or datetime.utcnow()
+    if action == "close":
+        return {"status": "open"}, {"$set": {"status": "closed", "closed_at": now.isoformat()}}
+    if action == "reopen":
+        return {"status": "closed"}, {"$set": {"status": "open"}, "$unset": {"closed_at": ""}}
+    if action == "assign":
+        return {}, {"$set": {"assignee": assignee}}
+    raise ValueError(f"Unknown ticket action: {action}")
+
+
+def apply_ticket_action(collection, action, ticket_ids, assignee=None, now=None):
+    if not ticket_ids:
+        return 0
+    query, update = ticket_action_update(action, assignee, now)
+    return collection.update_many({"_id": {"$in": list(ticket_ids)}, **query}, update).modified_count
+
+
+def apply_ticket_action_locally(tickets, action, ticket_ids, assignee=None):
+    # Mirrors apply_ticket_action on an already-loaded page: closed or reopened tickets
+    # leave the list they were on, assigned ones pick up the new assignee.
+    ticket_ids = set(ticket_ids)
+    if action == "assign":
+        return [{**ticket, "assignee": assignee} if ticket["_id"] in ticket_ids else ticket for ticket in tickets]
+    return [ticket for ticket in tickets if ticket["_id"] not in ticket_ids]
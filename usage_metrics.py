@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from api_configs import API_CONFIGS
+from pricing import price_usage
+
+
+def generate_dummy_daily_usage(api_name=None, start_date=None, end_date=None):
+    end_date_default = end_date if end_date else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date_default = start_date if start_date else end_date_default - timedelta(days=29)
+    all_dates = pd.date_range(start=start_date_default, end=end_date_default, freq='D')
+    
+    dummy_counts = []
+    base_value = API_CONFIGS.get(api_name, {}).get("quota_daily", 1000) / 10 if api_name else 500
+    if base_value == 0: base_value = 100
+    
+    for day_idx in range(len(all_dates)):
+        trend_factor = np.sin(day_idx / 5) * (base_value / 2)
+        random_noise = np.random.normal(0, base_value / 4)
+        count = max(0, int(base_value + trend_factor + random_noise))
+        dummy_counts.append(count)
+        
+    return pd.DataFrame({"Date": all_dates, "Count": dummy_counts})
+
+
+def fill_daily_usage(df_daily, start_date=None, end_date=None):
+    end_date_range = df_daily['Date'].max() if not df_daily.empty else datetime.utcnow()
+    start_date_range = df_daily['Date'].min() if not df_daily.empty else end_date_range - timedelta(days=29)
+    
+    if start_date and end_date:
+        start_date_range = datetime.combine(start_date, datetime.min.time())
+        end_date_range = datetime.combine(end_date, datetime.max.time())
+        
+    all_dates = pd.date_range(start=start_date_range, end=end_date_range, freq='D')
+    full_df = pd.DataFrame(all_dates, columns=["Date"])
+    
+    daily_usage = pd.merge(full_df, df_daily, on="Date", how="left").fillna(0)
+    return daily_usage
+
+
+def calculate_daily_usage(df, api_name=None, start_date=None, end_date=None):
+    if df.empty:
+        return generate_dummy_daily_usage(api_name, start_date, end_date)
+
+    df_filtered = df
+    if api_name:
+        df_filtered = df_filtered[df_filtered["api"] == api_name]
+    
+    df_daily = df_filtered.groupby(pd.Grouper(key="timestamp", freq="D")).size().reset_index(name="Count")
+    df_daily.columns = ["Date", "Count"]
+    return fill_daily_usage(df_daily, start_date, end_date)
+
+
+def daily_usage_for_api(daily_counts, api_name, start_date=None, end_date=None):
+    df_daily = daily_counts[daily_counts["api"] == api_name][["timestamp", "Count"]]
+    if df_daily.empty:
+        return generate_dummy_daily_usage(api_name, start_date, end_date)
+    return fill_daily_usage(df_daily.rename(columns={"timestamp": "Date"}), start_date, end_date)
+
+
+def calculate_current_daily_usage(df, api_name):
+    if 'api' not in df.columns or df.empty:
+        return 0
+
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    current_day_usage = df[(df["api"] == api_name) & (df["timestamp"] >= today_start)].shape[0]
+    return current_day_usage
+
+
+def _observed_value_counts(series):
+    counts = series.value_counts()
+    return counts[counts > 0]
+
+
+def api_totals_frame(df):
+    api_totals = df.groupby("api", observed=True).agg(**{"Calls": ("latency_ms", "size"), "Latency Sum": ("latency_ms", "sum")}).reset_index()
+    api_totals = api_totals.rename(columns={"api": "API"}).sort_values("Calls", ascending=False)
+    api_totals["API"] = api_totals["API"].astype(str)
+    return api_totals
+
+
+def top_consumers(df, limit=10):
+    top_users = _observed_value_counts(df["user_id"]).head(limit).reset_index()
+    top_users.columns = ["User ID", "Total Calls"]
+    return top_users
+
+
+def country_counts(df):
+    counts = _observed_value_counts(df["country"]).reset_index()
+    counts.columns = ["Country", "Calls"]
+    return counts
+
+
+def daily_api_counts(df):
+    daily = df.groupby([pd.Grouper(key="timestamp", freq="D"), "api"], observed=True).size().reset_index(name="Count")
+    daily["api"] = daily["api"].astype(str)
+    return daily
+
+
+def daily_endpoint_counts(df):
+    daily = df.groupby([pd.Grouper(key="timestamp", freq="D"), "api", "endpoint"], observed=True).size().reset_index(name="calls")
+    daily["api"] = daily["api"].astype(str)
+    daily["endpoint"] = daily["endpoint"].astype(str)
+    return daily
+
+
+def summarize_usage_frame(df, prior_calls=None):
+    return {
+        "api_totals": api_totals_frame(df),
+        "daily": daily_api_counts(df),
+        "top_users": top_consumers(df),
+        "countries": country_counts(df),
+        "costs": price_usage(daily_endpoint_counts(df), prior_calls=prior_calls),
+    }